@@ -7,6 +7,7 @@ This script is used by GitHub Actions to create test reports.
 import os
 import sys
 import re
+import json
 import shutil
 import nbformat
 import openpyxl
@@ -15,6 +16,10 @@ from datetime import datetime
 from pathlib import Path
 from base64 import b64decode
 
+# Output MIME type written by run_pw when a step function was retried (see scripts/playwright.py)
+STEP_RETRY_MIME_TYPE = 'application/vnd.grdm.step-retry+json'
+# Screenshot MIME types written by run_pw (see scripts/screenshots.py) and their file extensions
+SCREENSHOT_MIME_TYPES = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/webp': '.webp'}
 
 def collect_all_notebooks(result_dir):
     """Recursively collect notebooks with hierarchical sorting."""
@@ -46,6 +51,15 @@ def collect_all_notebooks(result_dir):
     return notebooks
 
 
+def collect_skipped_notebooks(result_dir):
+    """Collect notebooks skipped by failed prerequisite checks (prerequisites.json written by run_tests.py)."""
+    skipped = []
+    for report_path in sorted(Path(result_dir).rglob('prerequisites.json')):
+        with open(report_path, 'r') as f:
+            skipped.extend(json.load(f).get('skipped', []))
+    return skipped
+
+
 def has_header1(cell):
     """Check if cell has level 1 header."""
     if cell['cell_type'] != 'markdown':
@@ -85,21 +99,48 @@ def parse_cells(notebook_path):
     return (cells, test_sets)
 
 
-def save_image(cellindex, image_base64):
+def get_step_retries(outputs):
+    """Extract the retry records of run_pw from cell outputs."""
+    return [
+        o['data'][STEP_RETRY_MIME_TYPE] for o in outputs
+        if o['output_type'] == 'display_data' and STEP_RETRY_MIME_TYPE in o.get('data', {})
+    ]
+
+def format_result(has_error, has_retry):
+    if has_error:
+        return '失敗'
+    return '成功(リトライ後)' if has_retry else '成功'
+
+def save_image(cellindex, image_base64, mime_type='image/png'):
     """Save base64 image to file."""
-    filename = f'/tmp/screenshot-{cellindex}.png'
+    filename = f'/tmp/screenshot-{cellindex}{SCREENSHOT_MIME_TYPES[mime_type]}'
     with open(filename, 'wb') as f:
         f.write(b64decode(image_base64))
+    if mime_type == 'image/webp':
+        # Excel cannot embed WebP images
+        from PIL import Image as PILImage
+        png_filename = f'/tmp/screenshot-{cellindex}.png'
+        with PILImage.open(filename) as image:
+            image.save(png_filename)
+        filename = png_filename
     return filename
 
+def get_screenshot_output(output):
+    """Return (mime type, base64 data) of the screenshot in the output, or None."""
+    data = output.get('data', {})
+    for mime_type in SCREENSHOT_MIME_TYPES:
+        if mime_type in data:
+            return mime_type, data[mime_type]
+    return None
+
 def get_images_from_cell(cellindex, cell):
     """Extract images from cell outputs."""
     if 'outputs' not in cell:
         return None
-    images = [out['data']['image/png'] for out in cell['outputs'] if 'data' in out and 'image/png' in out['data']]
-    return [save_image(f"{cellindex}-{i}", image) for i, image in enumerate(images)]
+    images = [get_screenshot_output(out) for out in cell['outputs'] if get_screenshot_output(out) is not None]
+    return [save_image(f"{cellindex}-{i}", image, mime_type) for i, (mime_type, image) in enumerate(images)]
 
-def create_workbook(all_test_sets, author, ticket_number, result_dir):
+def create_workbook(all_test_sets, author, ticket_number, result_dir, skipped_notebooks=None):
     """Create Excel workbook with test results."""
     wb = openpyxl.Workbook()
     
@@ -217,6 +258,7 @@ def create_workbook(all_test_sets, author, ticket_number, result_dir):
             last_images = None
             row = startrow
             has_error = False
+            has_retry = False
         
             for i in range(end - (start + 1)):
                 cell = cells[i + start + 1]
@@ -229,7 +271,7 @@ def create_workbook(all_test_sets, author, ticket_number, result_dir):
                     screenshot = openpyxl.drawing.image.Image(last_images[0])
                     screenshot.height = itemheight
                     screenshot.width = int(itemheight / 1080 * 1920)
-                    shutil.copy(last_images[0], os.path.join(result_dir, 'screenshots', test_id, '{0:05d}.png'.format(itemindex - 1)))
+                    shutil.copy(last_images[0], os.path.join(result_dir, 'screenshots', test_id, '{0:05d}{1}'.format(itemindex - 1, os.path.splitext(last_images[0])[1])))
                 # 成功したか？
                 output_types = []
                 outputs = []
@@ -244,6 +286,10 @@ def create_workbook(all_test_sets, author, ticket_number, result_dir):
                 output_types = set(output_types)
                 if 'error' in output_types or len(output_types) == 0:
                     has_error = True
+                retries = get_step_retries(outputs)
+                passed_after_retry = len(retries) > 0 and 'error' not in output_types and len(output_types) > 0
+                if passed_after_retry:
+                    has_retry = True
                 line = cell['source'].split('\n')[0]
                 m = re.match(r'##\s+(.+)', line)
                 row = startrow + itemindex
@@ -251,7 +297,14 @@ def create_workbook(all_test_sets, author, ticket_number, result_dir):
                 sheet[f'B{row}'] = m.group(1)
                 sheet[f'C{row}'] = '\n'.join(cell['source'].split('\n')[1:]).strip()
                 sheet[f'D{row}'] = '■' if 'error' not in output_types and len(output_types) > 0 else '□'
-                sheet[f'E{row}'] = '' if 'error' not in output_types else '\n'.join([o['evalue'] if 'evalue' in o else o['ename'] for o in outputs if o['output_type'] == 'error'])
+                if 'error' in output_types:
+                    sheet[f'E{row}'] = '\n'.join([o['evalue'] if 'evalue' in o else o['ename'] for o in outputs if o['output_type'] == 'error'])
+                elif passed_after_retry:
+                    sheet[f'E{row}'] = 'リトライ後に成功 (passed after retry)\n' + '\n'.join(
+                        [f"{r['attempt']}回目: {r['exception']}: {r['message']}" for r in retries]
+                    )
+                else:
+                    sheet[f'E{row}'] = ''
                 sheet[f'F{row}'] = 'Playwright'
                 sheet[f'G{row}'] = datetime.now().strftime('%Y-%m-%d')
                 sheet[f'H{row}'] = ''
@@ -268,9 +321,9 @@ def create_workbook(all_test_sets, author, ticket_number, result_dir):
                 screenshot = openpyxl.drawing.image.Image(last_images[0])
                 screenshot.height = itemheight
                 screenshot.width = int(itemheight / 1080 * 1920)
-                shutil.copy(last_images[0], os.path.join(result_dir, 'screenshots', test_id, '{0:05d}.png'.format(itemindex - 1)))            
+                shutil.copy(last_images[0], os.path.join(result_dir, 'screenshots', test_id, '{0:05d}{1}'.format(itemindex - 1, os.path.splitext(last_images[0])[1])))            
 
-            sheet['D5'] = '失敗' if has_error else '成功'
+            sheet['D5'] = format_result(has_error, has_retry)
 
             summaryrow = index + 1
             summary_sheet[f'A{summaryrow}'] = test_id
@@ -282,13 +335,27 @@ def create_workbook(all_test_sets, author, ticket_number, result_dir):
             summary_sheet[f'G{summaryrow}'] = title
             summary_sheet[f'H{summaryrow}'] = f'参照: {test_id}'
             summary_sheet[f'H{summaryrow}'].hyperlink = f'#{test_id}!A1'
-            summary_sheet[f'I{summaryrow}'] = '成功' if not has_error else '失敗'
+            summary_sheet[f'I{summaryrow}'] = format_result(has_error, has_retry)
             summary_sheet[f'J{summaryrow}'] = ticket_number
             summary_sheet[f'K{summaryrow}'] = author
             summary_sheet[f'L{summaryrow}'] = datetime.now().strftime('%Y-%m-%d')
             for cell in summary_sheet[f'A{summaryrow}:O{summaryrow}'][0]:
                 cell.alignment = Alignment(wrap_text=True, vertical='top')
     
+    # Notebooks skipped by failed prerequisite checks have no sheet; list them in the summary only
+    for skipped in skipped_notebooks or []:
+        index += 1
+        summaryrow = index + 1
+        summary_sheet[f'A{summaryrow}'] = f'{id_prefix}{index:03d}'
+        summary_sheet[f'G{summaryrow}'] = skipped['notebook']
+        summary_sheet[f'I{summaryrow}'] = f"スキップ (blocked by {skipped['blocked_by']})"
+        summary_sheet[f'J{summaryrow}'] = ticket_number
+        summary_sheet[f'K{summaryrow}'] = author
+        summary_sheet[f'L{summaryrow}'] = datetime.now().strftime('%Y-%m-%d')
+        summary_sheet[f'M{summaryrow}'] = skipped.get('reason') or ''
+        for cell in summary_sheet[f'A{summaryrow}:O{summaryrow}'][0]:
+            cell.alignment = Alignment(wrap_text=True, vertical='top')
+    
     return wb
 
 
@@ -316,8 +383,12 @@ def main():
         print(f"  - {notebook_path.relative_to(result_dir)}")
         all_test_sets.append((str(notebook_path), parse_cells(str(notebook_path))))
     
+    skipped_notebooks = collect_skipped_notebooks(result_dir)
+    for skipped in skipped_notebooks:
+        print(f"  - {skipped['notebook']} (skipped, blocked by {skipped['blocked_by']})")
+    
     # Generate Excel workbook
-    wb = create_workbook(all_test_sets, author, ticket_number, str(result_dir))
+    wb = create_workbook(all_test_sets, author, ticket_number, str(result_dir), skipped_notebooks)
     
     # Save workbook
     wb.save(str(output_file))
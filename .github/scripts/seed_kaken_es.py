@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
+import argparse
 import copy
 import hashlib
+import http.client
 import json
 import os
 import sys
+import threading
+import time
 import urllib.request
-from typing import Any, Dict, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+INDEX_NAME = "kaken_researchers"
+INDEX_SETTINGS = {"settings": {"number_of_shards": 1, "number_of_replicas": 0}}
 
 
 def request(method: str, url: str, body: Optional[Dict[str, Any]]) -> None:
@@ -37,28 +46,227 @@ def head_exists(url: str) -> bool:
         raise
 
 
-def main() -> None:
-    if len(sys.argv) != 3:
-        raise SystemExit("Usage: seed_kaken_es.py <json_path> <source_url>")
+def ensure_index(index_url: str) -> None:
+    if not head_exists(index_url):
+        put(index_url, INDEX_SETTINGS)
 
-    json_path = sys.argv[1]
-    source_url = sys.argv[2]
-    base_uri = os.environ["KAKEN_ELASTIC_URI"].rstrip("/")
-
-    with open(json_path, "r", encoding="utf-8") as handle:
-        document = json.load(handle)
 
+def build_payload(document: Dict[str, Any], source_url: str) -> Tuple[str, Dict[str, Any]]:
     payload = copy.deepcopy(document)
     payload["_source_url"] = source_url
-
     doc_id = hashlib.sha256(source_url.encode("utf-8")).hexdigest()
-    index_url = f"{base_uri}/kaken_researchers"
+    return doc_id, payload
 
-    if not head_exists(index_url):
-        put(index_url, {"settings": {"number_of_shards": 1, "number_of_replicas": 0}})
+
+class KeepAliveClient:
+    """HTTP client holding one persistent connection per thread."""
+
+    def __init__(self, base_uri: str, timeout: float = 60.0) -> None:
+        parts = urlsplit(base_uri)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.scheme == "https":
+                conn = http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def request(self, method: str, path: str, data: bytes, content_type: str) -> Tuple[int, bytes]:
+        headers = {"Content-Type": content_type, "Connection": "keep-alive"}
+        # Retry once when the server has closed an idle keep-alive connection
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, self.base_path + path, body=data, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._reset()
+                if attempt > 0:
+                    raise
+        raise AssertionError("unreachable")
+
+
+def iter_documents(source: str, source_url_prefix: Optional[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (source_url, document) from a directory of JSON files, an NDJSON file or stdin ("-")."""
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(source, filename), "r", encoding="utf-8") as handle:
+                document = json.load(handle)
+            yield resolve_source_url(document, source_url_prefix, filename), document
+        return
+
+    handle = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    try:
+        for line_number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            document = json.loads(line)
+            yield resolve_source_url(document, source_url_prefix, None, line_number), document
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def resolve_source_url(
+    document: Dict[str, Any],
+    source_url_prefix: Optional[str],
+    filename: Optional[str],
+    line_number: Optional[int] = None,
+) -> str:
+    if document.get("_source_url"):
+        return document["_source_url"]
+    if source_url_prefix is not None and filename is not None:
+        return source_url_prefix + filename
+    location = filename if filename is not None else f"line {line_number}"
+    raise SystemExit(f"No _source_url in document ({location}); use --source-url-prefix for directories")
+
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_bulk_body(batch: List[Tuple[str, Dict[str, Any]]]) -> bytes:
+    lines = []
+    for source_url, document in batch:
+        doc_id, payload = build_payload(document, source_url)
+        lines.append(json.dumps({"index": {"_index": INDEX_NAME, "_id": doc_id}}))
+        lines.append(json.dumps(payload, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def send_bulk(client: KeepAliveClient, batch: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """Send one _bulk request and return the error messages of failed documents."""
+    status, body = client.request("POST", "/_bulk", build_bulk_body(batch), "application/x-ndjson")
+    if status >= 300:
+        raise RuntimeError(f"_bulk request failed: HTTP {status}: {body[:500]!r}")
+    result = json.loads(body)
+    if not result.get("errors"):
+        return []
+    errors = []
+    for item in result.get("items", []):
+        action = item.get("index", {})
+        if "error" in action:
+            errors.append(f"{action.get('_id')}: {action['error']}")
+    return errors
+
+
+def bulk_seed(
+    base_uri: str,
+    source: str,
+    source_url_prefix: Optional[str] = None,
+    batch_size: int = 500,
+    concurrency: int = 2,
+) -> Tuple[int, List[str]]:
+    """Index all documents from source with _bulk requests, returning the count and the errors."""
+    index_url = f"{base_uri}/{INDEX_NAME}"
+    ensure_index(index_url)
+
+    client = KeepAliveClient(base_uri)
+    indexed = 0
+    errors: List[str] = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        for batch in iter_batches(iter_documents(source, source_url_prefix), batch_size):
+            # Keep a bounded number of batches in flight so that large streams are not read into memory
+            while len(pending) >= concurrency * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    errors.extend(future.result())
+                    indexed += pending.pop(future)
+            pending[executor.submit(send_bulk, client, batch)] = len(batch)
+        for future, count in pending.items():
+            errors.extend(future.result())
+            indexed += count
+
+    post(f"{index_url}/_refresh")
+    return indexed - len(errors), errors
+
+
+def seed_single(base_uri: str, json_path: str, source_url: str) -> None:
+    with open(json_path, "r", encoding="utf-8") as handle:
+        document = json.load(handle)
+
+    doc_id, payload = build_payload(document, source_url)
+    index_url = f"{base_uri}/{INDEX_NAME}"
+
+    ensure_index(index_url)
     put(f"{index_url}/_doc/{doc_id}", payload)
     post(f"{index_url}/_refresh")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Seed KAKEN researcher documents into Elasticsearch ($KAKEN_ELASTIC_URI)",
+        usage=(
+            "seed_kaken_es.py <json_path> <source_url>\n"
+            "       seed_kaken_es.py --bulk <directory|file.ndjson|-> [--source-url-prefix URL] "
+            "[--batch-size N] [--concurrency N]"
+        ),
+    )
+    parser.add_argument("json_path", nargs="?", help="JSON document to index")
+    parser.add_argument("source_url", nargs="?", help="URL the document was fetched from")
+    parser.add_argument(
+        "--bulk",
+        metavar="SOURCE",
+        help="Directory of JSON documents, NDJSON file or '-' for NDJSON on stdin",
+    )
+    parser.add_argument(
+        "--source-url-prefix",
+        help="Prefix joined with the file name as _source_url for documents without one (directories only)",
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per _bulk request")
+    parser.add_argument("--concurrency", type=int, default=2, help="Number of _bulk requests in parallel")
+    args = parser.parse_args()
+
+    base_uri = os.environ["KAKEN_ELASTIC_URI"].rstrip("/")
+
+    if args.bulk is None:
+        if args.json_path is None or args.source_url is None:
+            raise SystemExit("Usage: seed_kaken_es.py <json_path> <source_url>")
+        seed_single(base_uri, args.json_path, args.source_url)
+        return
+
+    started = time.monotonic()
+    indexed, errors = bulk_seed(
+        base_uri,
+        args.bulk,
+        source_url_prefix=args.source_url_prefix,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+    )
+    elapsed = time.monotonic() - started
+    rate = indexed / elapsed if elapsed > 0 else 0
+    print(f"Indexed {indexed} documents in {elapsed:.2f}s ({rate:.1f} docs/sec)")
+    if errors:
+        for error in errors[:10]:
+            print(f"  {error}", file=sys.stderr)
+        raise SystemExit(f"{len(errors)} document(s) failed to index")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,182 @@
+"""
+Create N users with M projects each for scale testing of the admin and dashboard notebooks.
+
+Run in the same way as setup_test_data.py:
+
+    docker-compose exec -T -e SCALE_USERS=200 -e SCALE_PROJECTS_PER_USER=5 web \
+        bash -c "python3 manage.py shell < /tmp/setup_scale_test_data.py"
+
+Parameters are given by environment variables because the script is piped into `manage.py shell`:
+
+- SCALE_USERS: number of users (default: 10)
+- SCALE_PROJECTS_PER_USER: number of projects per user (default: 1)
+- SCALE_CONTRIBUTORS_PER_PROJECT: number of other generated users added to each project (default: 0)
+- SCALE_FILES_PER_PROJECT: number of NII Storage (osfstorage) file entries per project (default: 0)
+- SCALE_PREFIX: prefix of generated usernames and project titles (default: scale)
+- SCALE_PASSWORD: password of generated users (default: scalepass123)
+- SCALE_BATCH_SIZE: number of users committed in one transaction (default: 50)
+
+Names are deterministic, so re-running the script only creates what is missing.
+Generated IDs are printed as `PROJECT_ID_<username>_<index>: <id>` and
+`PROJECT_NAME_<username>_<index>: <title>`.
+"""
+import hashlib
+import os
+
+from django.db import transaction
+from django.utils import timezone
+from framework.auth import Auth
+from osf.models import Email, Node, OSFUser
+
+num_users = int(os.environ.get('SCALE_USERS', '10'))
+projects_per_user = int(os.environ.get('SCALE_PROJECTS_PER_USER', '1'))
+contributors_per_project = int(os.environ.get('SCALE_CONTRIBUTORS_PER_PROJECT', '0'))
+files_per_project = int(os.environ.get('SCALE_FILES_PER_PROJECT', '0'))
+prefix = os.environ.get('SCALE_PREFIX', 'scale')
+password = os.environ.get('SCALE_PASSWORD', 'scalepass123')
+batch_size = int(os.environ.get('SCALE_BATCH_SIZE', '50'))
+
+
+def scale_username(user_index):
+    return f'{prefix}user{user_index:05d}@example.com'
+
+
+def scale_fullname(user_index):
+    return f'{prefix.capitalize()} User {user_index:05d}'
+
+
+def scale_project_title(user_index, project_index):
+    return f'{prefix.upper()}-{user_index:05d}-{project_index:03d}'
+
+
+def create_users(user_indexes):
+    usernames = [scale_username(i) for i in user_indexes]
+    existing = {
+        user.username: user
+        for user in OSFUser.objects.filter(username__in=usernames)
+    }
+    created = []
+    for user_index, username in zip(user_indexes, usernames):
+        if username in existing:
+            continue
+        user = OSFUser(
+            username=username,
+            fullname=scale_fullname(user_index),
+            is_active=True,
+            date_registered=timezone.now()
+        )
+        user.set_password(password)
+        user.save()
+        # Set additional fields after save
+        user.is_registered = True
+        user.date_confirmed = timezone.now()
+        user.have_email = True
+        user.save()
+        existing[username] = user
+        created.append(user)
+    Email.objects.bulk_create([Email(address=user.username, user=user) for user in created])
+    return [existing[username] for username in usernames], len(created)
+
+
+def create_projects(users_by_index):
+    titles = [
+        scale_project_title(user_index, project_index)
+        for user_index in users_by_index
+        for project_index in range(projects_per_user)
+    ]
+    existing = {
+        (node.creator_id, node.title): node
+        for node in Node.objects.filter(
+            creator__in=list(users_by_index.values()),
+            title__in=titles,
+            category='project',
+            is_deleted=False,
+        )
+    }
+    projects = []
+    created_count = 0
+    for user_index, user in users_by_index.items():
+        for project_index in range(projects_per_user):
+            title = scale_project_title(user_index, project_index)
+            project = existing.get((user.id, title))
+            if project is None:
+                project = Node(
+                    title=title,
+                    creator=user,
+                    category='project',
+                    is_public=False
+                )
+                project.save()
+                created_count += 1
+            projects.append((user_index, project_index, user, project))
+    return projects, created_count
+
+
+def add_contributors(project, user_index, all_users):
+    # Deterministically pick the next users in the ring as contributors
+    added = 0
+    creator = all_users[user_index]
+    for offset in range(1, contributors_per_project + 1):
+        contributor = all_users[(user_index + offset) % num_users]
+        if contributor == creator or project.is_contributor(contributor):
+            continue
+        project.add_contributor(contributor, auth=Auth(creator), send_email='false', log=False, save=False)
+        added += 1
+    if added > 0:
+        project.save()
+    return added
+
+
+def add_files(project, user):
+    root = project.get_addon('osfstorage').get_root()
+    existing_names = set(root.children.values_list('name', flat=True))
+    added = 0
+    for file_index in range(files_per_project):
+        name = f'{prefix}-file-{file_index:04d}.txt'
+        if name in existing_names:
+            continue
+        file_node = root.append_file(name)
+        # Placeholder version so that the file has a size and hash in listings
+        content_hash = hashlib.sha256(f'{project._id}/{name}'.encode('utf-8')).hexdigest()
+        file_node.create_version(user, {
+            'service': 'cloud',
+            'folder': 'scale-test',
+            'object': content_hash,
+        }, {
+            'size': 1024,
+            'sha256': content_hash,
+            'contentType': 'text/plain',
+        }).save()
+        added += 1
+    return added
+
+
+all_users = {}
+stats = {'users': 0, 'projects': 0, 'contributors': 0, 'files': 0}
+for batch_start in range(0, num_users, batch_size):
+    user_indexes = list(range(batch_start, min(batch_start + batch_size, num_users)))
+    with transaction.atomic():
+        users, created_count = create_users(user_indexes)
+    stats['users'] += created_count
+    all_users.update(zip(user_indexes, users))
+
+for batch_start in range(0, num_users, batch_size):
+    user_indexes = range(batch_start, min(batch_start + batch_size, num_users))
+    with transaction.atomic():
+        projects, created_count = create_projects({i: all_users[i] for i in user_indexes})
+        stats['projects'] += created_count
+        for user_index, project_index, user, project in projects:
+            if contributors_per_project > 0:
+                stats['contributors'] += add_contributors(project, user_index, all_users)
+            if files_per_project > 0:
+                stats['files'] += add_files(project, user)
+    for user_index, project_index, user, project in projects:
+        # Output for CI config
+        print(f"PROJECT_ID_{user.username}_{project_index}: {project._id}")
+        print(f"PROJECT_NAME_{user.username}_{project_index}: {project.title}")
+
+print(
+    f"Created {stats['users']} users, {stats['projects']} projects, "
+    f"{stats['contributors']} contributors and {stats['files']} files "
+    f"(total: {num_users} users x {projects_per_user} projects)"
+)
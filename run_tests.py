@@ -6,28 +6,125 @@ Manual tests (run_manual_notebook) are skipped.
 """
 
 import os
+import re
 import sys
+import glob
 import yaml
+import statistics
 import argparse
-import tempfile
 import traceback
-import subprocess
-import shutil
+import json
+import time
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 import papermill as pm
 import nbformat
+from scripts import api, artifacts, events, project_pool, resource_sampler, workspace
+
+
+SHARD_SUFFIX_PATTERN = re.compile(r'-shard\d+of\d+$')
+SUB_NOTEBOOK_PATTERN = re.compile(r"run_notebook\(\s*(?:result_dir,\s*)?'([^']+\.ipynb)'")
+
+
+def parse_shard(value):
+    """Parse 'i/N' (1-based) into (i, N)."""
+    m = re.match(r'^(\d+)/(\d+)$', value)
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise argparse.ArgumentTypeError(f'Invalid shard: {value} (expected i/N with 1 <= i <= N)')
+    return int(m.group(1)), int(m.group(2))
+
+
+def get_notebook_duration(notebook_path):
+    """Total cell execution time (seconds) of an executed notebook, or None if unavailable."""
+    from scripts.stat import get_notebook_stats
+    try:
+        stats = get_notebook_stats(notebook_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(stats) == 0 or 'duration' not in stats:
+        return None
+    return float(stats['duration'].sum())
+
+
+def load_duration_history(history_root):
+    """
+    Collect notebook durations from previous result trees under history_root.
+
+    Keys are top-level result IDs and '<result ID>/<sub-notebook result ID>' for coordinator sub-notebooks.
+    Newer result trees override older ones.
+    """
+    durations = {}
+    for tree in sorted(glob.glob(os.path.join(history_root, 'result-*'))):
+        if not os.path.isdir(tree):
+            continue
+        for notebook_path in glob.glob(os.path.join(tree, '*.ipynb')):
+            stem = os.path.splitext(os.path.basename(notebook_path))[0]
+            result_id = SHARD_SUFFIX_PATTERN.sub('', stem)
+            if result_id == stem:
+                duration = get_notebook_duration(notebook_path)
+                if duration is not None:
+                    durations[result_id] = duration
+            for sub_notebook_path in glob.glob(os.path.join(tree, stem, 'notebooks', '*.ipynb')):
+                duration = get_notebook_duration(sub_notebook_path)
+                if duration is not None:
+                    sub_id = os.path.splitext(os.path.basename(sub_notebook_path))[0]
+                    durations[f'{result_id}/{sub_id}'] = duration
+    return durations
+
+
+def assign_shards(units, durations, shard_count):
+    """
+    Split units into shard_count groups with the longest-processing-time-first heuristic.
+
+    Units without history are weighted with the median of the known durations;
+    without any history all units weigh the same, which results in a count-based split.
+    """
+    known = [durations[unit['key']] for unit in units if unit['key'] in durations]
+    default_weight = statistics.median(known) if known else 1.0
+    weights = [durations.get(unit['key'], default_weight) for unit in units]
+    loads = [0.0] * shard_count
+    assignments = [[] for _ in range(shard_count)]
+    for i in sorted(range(len(units)), key=lambda i: (-weights[i], i)):
+        shard = min(range(shard_count), key=lambda k: (loads[k], k))
+        loads[shard] += weights[i]
+        assignments[shard].append(i)
+    return [[units[i] for i in sorted(indexes)] for indexes in assignments], loads, len(known) > 0
 
 
 class TestRunner:
-    def __init__(self, config_path, show_disk_usage=False, failed_result_path=None):
+    def __init__(self, config_path, show_disk_usage=False, failed_result_path=None, shard=None, shard_history='result',
+                 resource_interval=resource_sampler.DEFAULT_INTERVAL, clean_leftover_workspaces=False,
+                 failed_link_mode='auto', failed_archive=None):
         self.config_path = config_path
         self.config = None
-        self.work_dir = tempfile.mkdtemp()
+        # Working directory of this run; each notebook gets a sub-directory that is removed after it finishes
+        self.workspace = None
+        self.work_dir = None
+        self.clean_leftover_workspaces = clean_leftover_workspaces
         self.result_dir = None
         self.result_notebooks = []
         self.local_vars = {}
+        # Sample CPU, memory, open files and disk usage in the background while each notebook runs
         self.show_disk_usage = show_disk_usage
+        self.resource_interval = resource_interval
+        self.resource_peaks = []
+        # Live event stream (events.jsonl) and progress line
+        self.progress_interval = events.DEFAULT_PROGRESS_INTERVAL
+        self.progress_reporter = None
         self.failed_result_path = failed_result_path
+        # How failed artifacts are placed under failed_result_path ('auto' tries hardlink, reflink, then copy)
+        self.failed_link_mode = failed_link_mode
+        # tar.zst archive of only the failed subtrees
+        self.failed_archive = failed_archive
+        
+        # Sharding: (index, count) with 1-based index, and the directory holding previous result trees
+        self.shard = shard
+        self.shard_history = shard_history
+        self.planning = False
+        self.plan = []
+        # result ID -> None (whole notebook) or list of sub-notebooks assigned to this shard
+        self.shard_units = None
+        self.shard_sub_notebooks = {}
         
         # Default configuration values
         self.rdm_url = 'https://rdm.example.com/'
@@ -47,10 +144,46 @@ class TestRunner:
         self.skip_login = False
         self.enable_1gb_file_upload = False
         self.skip_erad_completion_test = False
+        # Upper limit of the working directory in MB, checked before notebooks write large files
+        self.workspace_quota_mb = None
         
         # Exclude notebooks
         self.exclude_notebooks = []
         
+        # Prerequisite checks of each test group. When a check fails, the notebooks of the group are
+        # skipped as "blocked by <check>". '{storage_id}' is replaced with the storage under test.
+        self.prerequisites = {
+            'storage': ['login_smoke'],
+            's3': ['login_smoke', 's3_credentials:{storage_id}'],
+            'metadata': ['login_smoke'],
+            'admin': ['login_smoke'],
+        }
+        self.prerequisite_results = {}
+        self.skipped_notebooks = []
+        
+        # Coordinators whose sub-notebooks are independent and may be split across shards
+        self.shard_split_coordinators = ['取りまとめ-管理者機能.ipynb']
+        
+        # HAR replay: notebook file name (or result ID) -> result directory of a previous run of that notebook
+        self.har_replay = {}
+        # Requests not found in the HAR are aborted ('abort') or sent to the network ('fallback')
+        self.har_replay_not_found = 'abort'
+        
+        # Project pool: lease pre-provisioned projects reset through the RDM API instead of creating and
+        # deleting a project in the UI on every run. Requires rdm_token (a personal access token).
+        self.project_pool = False
+        self.project_pool_size = 1
+        self.project_pool_lease_minutes = project_pool.DEFAULT_LEASE_SECONDS // 60
+        self.rdm_token = None
+        self.rdm_api_url_v2 = None
+        # Project name suffixes leased to each coordinator ('' is the project name itself)
+        self.project_pool_slots = {
+            'storage': ['dashboard', 'filetab', 'metadata'],
+            's3': ['dashboard', 'filetab', 'metadata', 'toomany'],
+            'metadata': ['', '管理者', '非管理者'],
+        }
+        self.project_pool_manager = None
+        
         # Storage configurations
         self.storages_oauth = [
             {'id': 'dropbox', 'name': 'Dropbox'},
@@ -95,8 +228,14 @@ class TestRunner:
         os.makedirs(self.result_dir)
         return self.result_dir
         
-    def run_notebook(self, base_notebook, optional_result_id=None, **optional_params):
-        """Execute a notebook using papermill."""
+    def run_notebook(self, base_notebook, optional_result_id=None, prerequisites=None, pooled_project=None,
+                     **optional_params):
+        """
+        Execute a notebook using papermill.
+
+        pooled_project is (group, pool key, parameter name). When the project pool is enabled, a project set
+        is leased for the notebook and its name is passed as the parameter, with delete_project=False.
+        """
         _, filename = os.path.split(base_notebook)
         
         # Check if notebook should be excluded
@@ -107,6 +246,39 @@ class TestRunner:
         result_id, _ = os.path.splitext(filename)
         if optional_result_id:
             result_id += optional_result_id
+        
+        if self.planning:
+            self.plan.append(dict(
+                notebook=base_notebook,
+                filename=filename,
+                result_id=result_id,
+                exclude_notebooks=list(optional_params.get('exclude_notebooks') or []),
+            ))
+            return None
+        
+        if self.shard_units is not None:
+            if result_id not in self.shard_units:
+                print(f'Skipping notebook assigned to another shard: {base_notebook}')
+                return None
+            shard_sub_notebooks = self.shard_units[result_id]
+            if shard_sub_notebooks is not None:
+                # Run only the sub-notebooks of this shard, under a shard-specific result ID
+                optional_params['exclude_notebooks'] = list(optional_params.get('exclude_notebooks') or []) + [
+                    sub_notebook for sub_notebook in self.shard_sub_notebooks[result_id]
+                    if sub_notebook not in shard_sub_notebooks
+                ]
+                result_id += '-shard{}of{}'.format(*self.shard)
+        
+        har_replay = self.har_replay or {}
+        har_replay_source = har_replay.get(result_id) or har_replay.get(filename)
+        
+        # Prerequisite checks probe the live RDM and storages; replayed notebooks do not need them
+        if har_replay_source and prerequisites:
+            print(f'Skipping prerequisite checks for replayed notebook: {base_notebook}')
+        blocked_by = self.get_blocking_prerequisite(prerequisites) if not har_replay_source else None
+        if blocked_by is not None:
+            self.skip_blocked_notebook(base_notebook, result_id, blocked_by)
+            return None
             
         result_notebook = os.path.join(self.result_dir, result_id + '.ipynb')
         result_path = os.path.join(self.result_dir, result_id)
@@ -127,32 +299,412 @@ class TestRunner:
         )
         params.update(optional_params)
         
+        if har_replay_source:
+            params.update(self.get_replayed_params(har_replay_source))
+        
+        lease = self.lease_pooled_project(pooled_project) if not har_replay_source else None
+        if lease is not None:
+            params[pooled_project[2]] = lease.prefix
+            params['delete_project'] = False
+        
         print(f'Running notebook: {base_notebook}')
         print(f'  Result: {result_notebook}')
+        if har_replay_source:
+            print(f'  HAR replay: {har_replay_source}')
         
-        # Show disk usage before test if enabled
-        if self.show_disk_usage:
-            subprocess.run(['df', '-h'])
+        events.emit('notebook_started', notebook=base_notebook, result_id=result_id, result_path=result_path)
+        started = time.time()
+        status = 'failed'
+        sampler = self.start_resource_sampler(result_path)
+        scope = self.workspace.scope(result_id) if self.workspace is not None else nullcontext()
         
         try:
-            pm.execute_notebook(
-                base_notebook,
-                result_notebook,
-                parameters=params
-            )
+            with scope, self.har_replay_env(har_replay_source, result_path):
+                pm.execute_notebook(
+                    base_notebook,
+                    result_notebook,
+                    parameters=params
+                )
+            status = 'passed'
             print(f'  Status: SUCCESS')
         except pm.PapermillExecutionError:
             if not self.skip_failed_test:
                 raise
             print(f'  Status: FAILED (continuing)')
             traceback.print_exc()
+        finally:
+            self.release_pooled_project(lease)
+            self.stop_resource_sampler(sampler, result_id)
+            events.emit(
+                'notebook_finished',
+                notebook=base_notebook,
+                result_id=result_id,
+                result_path=result_path,
+                status=status,
+                duration=time.time() - started,
+            )
+            if os.path.exists(result_notebook):
+                events.emit('artifact', kind='notebook', path=result_notebook)
         
-        # Show disk usage after test if enabled
-        if self.show_disk_usage:
-            subprocess.run(['df', '-h'])
+        if har_replay_source:
+            self.report_har_replay(result_path)
             
         return result_notebook
         
+    def lease_pooled_project(self, pooled_project):
+        """Lease a project set from the pool, or return None to create projects in the UI as usual."""
+        if pooled_project is None or not self.project_pool:
+            return None
+        group, key, _ = pooled_project
+        try:
+            if self.project_pool_manager is None:
+                client = api.RDMClient(self.rdm_url, self.rdm_token, api_url=self.rdm_api_url_v2)
+                self.project_pool_manager = project_pool.ProjectPool(
+                    client,
+                    size=self.project_pool_size,
+                    lease_seconds=self.project_pool_lease_minutes * 60,
+                )
+            return self.project_pool_manager.acquire(key, self.project_pool_slots[group])
+        except Exception as e:
+            print(f'  Project pool: {type(e).__name__}: {e}'.split('\n')[0])
+            print('  Project pool: falling back to creating projects in the UI')
+            return None
+        
+    def release_pooled_project(self, lease):
+        if lease is None:
+            return
+        try:
+            self.project_pool_manager.release(lease)
+        except Exception:
+            print(f'  Project pool: failed to release {lease.prefix}; it will be released when the lease expires')
+            traceback.print_exc()
+        
+    def open_workspace(self):
+        """Report leftovers of crashed runs and create the working directory of this run."""
+        workspace.report_leftovers(remove=self.clean_leftover_workspaces)
+        quota_bytes = int(self.workspace_quota_mb * 1024 * 1024) if self.workspace_quota_mb else None
+        self.workspace = workspace.Workspace(label='run', quota_bytes=quota_bytes)
+        self.work_dir = self.workspace.path
+        workspace.install_signal_handlers()
+        print(f'Working directory: {self.work_dir}')
+        
+    def close_workspace(self):
+        if self.workspace is None:
+            return
+        self.workspace.cleanup()
+        self.workspace = None
+        
+    def start_progress(self):
+        """Write events to events.jsonl in the result directory and print progress with an ETA from previous runs."""
+        events_path = os.path.join(self.result_dir, 'events.jsonl')
+        os.environ[events.EVENT_LOG_ENV] = os.path.abspath(events_path)
+        
+        units = self.collect_plan()
+        durations = load_duration_history(self.shard_history)
+        planned = []
+        estimates = {}
+        for unit in units:
+            if self.shard_units is not None:
+                if unit['result_id'] not in self.shard_units:
+                    continue
+                if unit['sub_notebook'] is not None and unit['sub_notebook'] not in self.shard_units[unit['result_id']]:
+                    continue
+            result_id = unit['result_id']
+            if self.shard_units is not None and self.shard_units[result_id] is not None:
+                result_id += '-shard{}of{}'.format(*self.shard)
+            if result_id not in planned:
+                planned.append(result_id)
+                estimates[result_id] = None
+            duration = durations.get(unit['key'])
+            if duration is not None:
+                estimates[result_id] = (estimates[result_id] or 0.0) + duration
+        
+        events.emit('run_started', result_dir=self.result_dir, planned=planned, estimates=estimates)
+        print(f'Events: {events_path}')
+        self.progress_reporter = events.ProgressReporter(
+            events_path,
+            planned,
+            estimates,
+            events.load_step_history(self.shard_history),
+            interval=self.progress_interval,
+        )
+        self.progress_reporter.start()
+        
+    def stop_progress(self):
+        if self.progress_reporter is None:
+            return
+        events.emit('run_finished', result_dir=self.result_dir)
+        self.progress_reporter.stop()
+        self.progress_reporter = None
+        os.environ.pop(events.EVENT_LOG_ENV, None)
+        
+    def start_resource_sampler(self, result_path):
+        """Start recording the resource usage of the notebook to resource-usage.csv in its result directory."""
+        if not self.show_disk_usage:
+            return None
+        sampler = resource_sampler.ResourceSampler(
+            {'work_dir': self.work_dir, 'result_dir': self.result_dir},
+            interval=self.resource_interval,
+        )
+        sampler.start(os.path.join(result_path, 'resource-usage.csv'), track_dir=result_path)
+        return sampler
+        
+    def stop_resource_sampler(self, sampler, result_id):
+        """Stop the sampler and add the peak usage of the notebook to resource-peaks.csv."""
+        if sampler is None:
+            return
+        peaks = sampler.stop()
+        print(resource_sampler.format_peaks(peaks))
+        self.resource_peaks.append(dict(result_id=result_id, **peaks))
+        resource_sampler.write_peak_summary(os.path.join(self.result_dir, 'resource-peaks.csv'), self.resource_peaks)
+        
+    @contextmanager
+    def har_replay_env(self, har_replay_source, result_path):
+        """Pass the HAR replay settings to the kernel (and sub-notebooks) through environment variables."""
+        if not har_replay_source:
+            yield
+            return
+        env = {
+            'GRDM_HAR_REPLAY_FROM': os.path.abspath(har_replay_source),
+            'GRDM_HAR_REPLAY_ROOT': os.path.abspath(result_path),
+            'GRDM_HAR_REPLAY_NOT_FOUND': self.har_replay_not_found,
+        }
+        os.environ.update(env)
+        try:
+            yield
+        finally:
+            for key in env:
+                os.environ.pop(key, None)
+        
+    def get_replayed_params(self, har_replay_source):
+        """Reuse run-specific parameters (such as project name prefixes) of the recorded run so that URLs match."""
+        recorded_notebook = har_replay_source.rstrip(os.sep) + '.ipynb'
+        if not os.path.exists(recorded_notebook):
+            return {}
+        with open(recorded_notebook, 'r') as f:
+            nb = nbformat.read(f, as_version=nbformat.NO_CONVERT)
+        recorded_params = nb.metadata.get('papermill', {}).get('parameters', {})
+        return {
+            key: recorded_params[key]
+            for key in ['rdm_project_prefix']
+            if recorded_params.get(key) is not None
+        }
+        
+    def report_har_replay(self, result_path):
+        """Summarize requests that were not found in the replayed HAR files."""
+        total = 0
+        for dirpath, _, filenames in os.walk(result_path):
+            if 'har-replay-unmatched.json' not in filenames:
+                continue
+            with open(os.path.join(dirpath, 'har-replay-unmatched.json'), 'r') as f:
+                report = json.load(f)
+            unmatched = report.get('unmatched', [])
+            total += len(unmatched)
+            if unmatched:
+                print(f'  HAR replay: {len(unmatched)} unmatched request(s) in {os.path.relpath(dirpath, result_path)}')
+        if total > 0:
+            print(f'  HAR replay: recording may be stale ({total} unmatched request(s) in total)')
+        return total
+        
+    def get_prerequisites(self, group, **context):
+        """Resolve the prerequisite checks of a test group."""
+        return [name.format(**context) for name in (self.prerequisites or {}).get(group, [])]
+        
+    def run_prerequisite_check(self, name):
+        """Run a prerequisite check once and cache its result."""
+        if name in self.prerequisite_results:
+            return self.prerequisite_results[name]
+        check_id, _, arg = name.partition(':')
+        check = getattr(self, f'check_{check_id}', None)
+        if check is None:
+            raise ValueError(f'Unknown prerequisite check: {name}')
+        print(f'Checking prerequisite: {name}')
+        started = time.monotonic()
+        try:
+            if arg:
+                check(arg)
+            else:
+                check()
+            result = dict(name=name, status='passed')
+            print(f'  Prerequisite {name}: passed')
+        except Exception as e:
+            traceback.print_exc()
+            result = dict(name=name, status='failed', message=f'{type(e).__name__}: {e}'.split('\n')[0])
+            print(f'  Prerequisite {name}: FAILED ({result["message"]})')
+        result['duration'] = time.monotonic() - started
+        self.prerequisite_results[name] = result
+        self.write_prerequisite_report()
+        return result
+        
+    def get_blocking_prerequisite(self, prerequisites):
+        """Return the first failed prerequisite check, or None if all of them passed."""
+        for name in prerequisites or []:
+            if self.run_prerequisite_check(name)['status'] != 'passed':
+                return name
+        return None
+        
+    def skip_blocked_notebook(self, base_notebook, result_id, blocked_by):
+        print(f'Skipping notebook (blocked by {blocked_by}): {base_notebook}')
+        self.skipped_notebooks.append(dict(
+            notebook=base_notebook,
+            result_id=result_id,
+            status=f'skipped (blocked by {blocked_by})',
+            blocked_by=blocked_by,
+            reason=self.prerequisite_results[blocked_by].get('message'),
+        ))
+        self.write_prerequisite_report()
+        events.emit(
+            'notebook_skipped',
+            notebook=base_notebook,
+            result_id=result_id,
+            result_path=os.path.join(self.result_dir, result_id),
+            blocked_by=blocked_by,
+        )
+        
+    def write_prerequisite_report(self):
+        """Save prerequisite results and skipped notebooks to prerequisites.json in the result directory."""
+        if self.result_dir is None:
+            return
+        with open(os.path.join(self.result_dir, 'prerequisites.json'), 'w') as f:
+            json.dump({
+                'checks': list(self.prerequisite_results.values()),
+                'skipped': self.skipped_notebooks,
+            }, f, ensure_ascii=False, indent=1)
+        
+    def check_login_smoke(self):
+        """
+        Check that login is likely to work, without an extra browser login.
+
+        When テスト手順-ログイン.ipynb ran earlier in this run, its result is reused. Otherwise the RDM top page
+        is fetched and, if rdm_token is configured, the API is called as the token's user.
+        """
+        login_notebook = os.path.join(self.result_dir, 'テスト手順-ログイン.ipynb')
+        if login_notebook in self.result_notebooks and os.path.exists(login_notebook):
+            errors = self.check_notebook_errors(login_notebook)
+            if errors:
+                raise RuntimeError('テスト手順-ログイン.ipynb failed at cell {cell}: {ename}: {evalue}'.format(**errors[0]))
+            return
+        timeout = self.transition_timeout / 1000
+        api.check_reachable(self.rdm_url, timeout=timeout)
+        token = getattr(self, 'rdm_token', None) or os.environ.get('GRDM_RDM_TOKEN')
+        if token:
+            api.RDMClient(
+                self.rdm_url, token, api_url=getattr(self, 'rdm_api_url_v2', None), timeout=timeout,
+            ).me()
+        
+    def check_s3_credentials(self, storage_id):
+        """Check that the S3 credentials are configured and, if boto3 is available, that the test buckets are accessible."""
+        accounts = [1] + ([2] if getattr(self, f'{storage_id}_access_key_2', None) else [])
+        for n in accounts:
+            missing = [
+                key for key in [
+                    f'{storage_id}_access_key_{n}',
+                    f'{storage_id}_secret_access_key_{n}',
+                    f'{storage_id}_test_bucket_name_{n}',
+                ]
+                if not getattr(self, key, None)
+            ]
+            if missing:
+                raise ValueError(f'Missing S3 settings: {", ".join(missing)}')
+        try:
+            import boto3
+        except ImportError:
+            print('  boto3 is not installed; only the presence of the S3 settings was checked')
+            return
+        for n in accounts:
+            endpoint_url = getattr(self, f'{storage_id}_endpoint_url_{n}', None)
+            if storage_id != 's3' and endpoint_url is None:
+                print(f'  {storage_id}_endpoint_url_{n} is not set; skipping the bucket access check')
+                continue
+            client = boto3.client(
+                's3',
+                aws_access_key_id=getattr(self, f'{storage_id}_access_key_{n}'),
+                aws_secret_access_key=getattr(self, f'{storage_id}_secret_access_key_{n}'),
+                region_name=getattr(self, f'{storage_id}_default_region_{n}', None),
+                endpoint_url=endpoint_url,
+            )
+            client.head_bucket(Bucket=getattr(self, f'{storage_id}_test_bucket_name_{n}'))
+        
+    def get_sub_notebooks(self, coordinator_notebook, exclude_notebooks):
+        """List sub-notebooks run by a coordinator, or None if they cannot be split by file name."""
+        with open(coordinator_notebook, 'r') as f:
+            nb = nbformat.read(f, as_version=nbformat.NO_CONVERT)
+        sub_notebooks = []
+        for cell in nb.cells:
+            if cell.cell_type == 'code':
+                sub_notebooks.extend(SUB_NOTEBOOK_PATTERN.findall(cell.source))
+        if len(sub_notebooks) == 0 or len(set(sub_notebooks)) != len(sub_notebooks):
+            # exclude_notebooks matches file names, so a notebook run twice cannot be split
+            return None
+        return [sub_notebook for sub_notebook in sub_notebooks if sub_notebook not in exclude_notebooks]
+        
+    def collect_plan(self):
+        """Collect the notebooks run_all_tests would run, without executing them."""
+        self.planning = True
+        self.plan = []
+        try:
+            self.run_test_groups()
+        finally:
+            self.planning = False
+            self.result_notebooks = []
+        units = []
+        for entry in self.plan:
+            sub_notebooks = None
+            if entry['filename'] in self.shard_split_coordinators:
+                sub_notebooks = self.get_sub_notebooks(entry['notebook'], entry['exclude_notebooks'])
+            if not sub_notebooks:
+                units.append(dict(key=entry['result_id'], result_id=entry['result_id'], sub_notebook=None))
+                continue
+            self.shard_sub_notebooks[entry['result_id']] = sub_notebooks
+            for sub_notebook in sub_notebooks:
+                units.append(dict(
+                    key='{}/{}'.format(entry['result_id'], os.path.splitext(sub_notebook)[0]),
+                    result_id=entry['result_id'],
+                    sub_notebook=sub_notebook,
+                ))
+        return units
+        
+    def plan_shard(self):
+        """Decide the notebooks of this shard, balanced by historical durations."""
+        shard_index, shard_count = self.shard
+        units = self.collect_plan()
+        durations = load_duration_history(self.shard_history)
+        assignments, loads, has_history = assign_shards(units, durations, shard_count)
+        
+        self.shard_units = {}
+        for unit in assignments[shard_index - 1]:
+            if unit['sub_notebook'] is None:
+                self.shard_units[unit['result_id']] = None
+            else:
+                self.shard_units.setdefault(unit['result_id'], []).append(unit['sub_notebook'])
+        
+        print(f'\n=== Shard {shard_index}/{shard_count} ===')
+        print('Balanced by {}'.format(
+            f'historical durations from {self.shard_history}' if has_history else 'notebook count (no history)'
+        ))
+        for i, (assignment, load) in enumerate(zip(assignments, loads)):
+            marker = '*' if i == shard_index - 1 else ' '
+            print(f'{marker} shard {i + 1}: {len(assignment)} unit(s), estimated {load:.0f}' + (' sec' if has_history else ''))
+        for unit in assignments[shard_index - 1]:
+            print(f"    {unit['key']}")
+        
+        manifest_path = os.path.join(self.result_dir, f'shard-{shard_index}-of-{shard_count}.json')
+        with open(manifest_path, 'w') as f:
+            json.dump({
+                'shard': shard_index,
+                'shards': shard_count,
+                'balanced_by': 'duration' if has_history else 'count',
+                'assignments': [
+                    {
+                        'shard': i + 1,
+                        'estimated_load': load,
+                        'units': [unit['key'] for unit in assignment],
+                    }
+                    for i, (assignment, load) in enumerate(zip(assignments, loads))
+                ],
+            }, f, ensure_ascii=False, indent=1)
+        return self.shard_units
+        
     def run_login_tests(self):
         """Run login-related tests."""
         print('\n=== Login Tests ===')
@@ -190,6 +742,8 @@ class TestRunner:
             self.result_notebooks.append(
                 self.run_notebook(
                     '取りまとめ-NIIストレージ.ipynb',
+                    prerequisites=self.get_prerequisites('storage'),
+                    pooled_project=('storage', 'NIISTORAGE', 'rdm_project_prefix'),
                     enable_1gb_file_upload=self.enable_1gb_file_upload,
                     skip_failed_test=self.skip_failed_test,
                     skip_preview_check=self.skip_preview_check,
@@ -220,14 +774,18 @@ class TestRunner:
                 self.run_notebook(
                     '取りまとめ-S3共通.ipynb',
                     optional_result_id=f'-{storage_name}',
+                    prerequisites=self.get_prerequisites('s3', storage_id=storage_id),
+                    pooled_project=('s3', storage_id.upper(), 'rdm_project_prefix'),
                     s3_access_key_1=getattr(self, f'{storage_id}_access_key_1', None),
                     s3_secret_access_key_1=getattr(self, f'{storage_id}_secret_access_key_1', None),
                     s3_default_region_1=getattr(self, f'{storage_id}_default_region_1', None),
                     s3_test_bucket_name_1=getattr(self, f'{storage_id}_test_bucket_name_1', None),
+                    s3_endpoint_url_1=getattr(self, f'{storage_id}_endpoint_url_1', None),
                     s3_access_key_2=getattr(self, f'{storage_id}_access_key_2', None),
                     s3_secret_access_key_2=getattr(self, f'{storage_id}_secret_access_key_2', None),
                     s3_default_region_2=getattr(self, f'{storage_id}_default_region_2', None),
                     s3_test_bucket_name_2=getattr(self, f'{storage_id}_test_bucket_name_2', None),
+                    s3_endpoint_url_2=getattr(self, f'{storage_id}_endpoint_url_2', None),
                     rdm_project_prefix=rdm_project_prefixes[storage_id],
                     exclude_notebooks=self.exclude_notebooks,
                     target_storage_name=storage_name,
@@ -253,6 +811,8 @@ class TestRunner:
             self.result_notebooks.append(
                 self.run_notebook(
                     '取りまとめ-Metadataアドオン.ipynb',
+                    prerequisites=self.get_prerequisites('metadata'),
+                    pooled_project=('metadata', 'METADATA', 'rdm_project_name'),
                     idp_name_2=getattr(self, 'idp_name_2', None),
                     idp_username_2=getattr(self, 'idp_username_2', None),
                     idp_password_2=getattr(self, 'idp_password_2', None),
@@ -270,6 +830,7 @@ class TestRunner:
             self.result_notebooks.append(
                 self.run_notebook(
                     '取りまとめ-管理者機能.ipynb',
+                    prerequisites=self.get_prerequisites('admin'),
                     admin_rdm_url=self.admin_rdm_url,
                     idp_name_2=getattr(self, 'idp_name_2', None),
                     idp_username_2=getattr(self, 'idp_username_2', None),
@@ -296,6 +857,13 @@ class TestRunner:
                 )
             )
             
+    def run_test_groups(self):
+        """Run all test groups in order."""
+        self.run_login_tests()
+        self.run_storage_tests()
+        self.run_metadata_tests()
+        self.run_admin_tests()
+            
     def check_notebook_errors(self, notebook_path):
         """Check a notebook and all its sub-notebooks recursively for execution errors."""
         all_errors = []
@@ -338,13 +906,13 @@ class TestRunner:
         return all_errors
     
     def extract_failed_notebooks(self):
-        """Extract and copy failed notebooks to a separate directory."""
-        if self.failed_result_path is None:
+        """Extract failed notebooks to a separate directory and/or a tar.zst archive."""
+        if self.failed_result_path is None and self.failed_archive is None:
             return 0
         
-        os.makedirs(self.failed_result_path, exist_ok=True)
-        
-        failed_count = 0
+        base_dir = os.path.dirname(self.result_dir)
+        # Files and directories of the failed notebooks, relative to the parent of the result directory
+        failed_paths = []
         
         # Check all executed notebooks
         for notebook_path in self.result_notebooks:
@@ -356,28 +924,40 @@ class TestRunner:
             notebook_errors = self.check_notebook_errors(notebook_path)
             
             if notebook_errors:
-                # Get the base path without extension
+                failed_paths.append(notebook_path)
+                # The associated directory holds videos, HAR, screenshots and sub-notebooks
                 base_path = os.path.splitext(notebook_path)[0]
-                notebook_name = os.path.basename(notebook_path)
-                
-                # Copy the notebook file
-                rel_path = os.path.relpath(notebook_path, os.path.dirname(self.result_dir))
-                dest_path = os.path.join(self.failed_result_path, rel_path)
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                shutil.copy2(notebook_path, dest_path)
-                print(f'  Copied failed notebook: {notebook_name}')
-                
-                # Copy the associated directory if it exists
                 if os.path.exists(base_path) and os.path.isdir(base_path):
-                    rel_dir_path = os.path.relpath(base_path, os.path.dirname(self.result_dir))
-                    dest_dir_path = os.path.join(self.failed_result_path, rel_dir_path)
-                    shutil.copytree(base_path, dest_dir_path, dirs_exist_ok=True)
-                    print(f'  Copied associated directory: {os.path.basename(base_path)}/')
-                
-                failed_count += 1
+                    failed_paths.append(base_path)
+        failed_count = len([path for path in failed_paths if path.endswith('.ipynb')])
+        
+        prerequisite_report = os.path.join(self.result_dir, 'prerequisites.json')
+        if len(self.skipped_notebooks) > 0 and os.path.exists(prerequisite_report):
+            failed_paths.append(prerequisite_report)
+            print(f'  Prerequisite report: {len(self.skipped_notebooks)} notebook(s) skipped')
+        
+        if self.failed_result_path is not None:
+            os.makedirs(self.failed_result_path, exist_ok=True)
+            stats = artifacts.LinkStats()
+            for path in failed_paths:
+                dest_path = os.path.join(self.failed_result_path, os.path.relpath(path, base_dir))
+                if os.path.isdir(path):
+                    artifacts.link_tree(path, dest_path, mode=self.failed_link_mode, stats=stats)
+                    print(f'  Extracted associated directory: {os.path.basename(path)}/')
+                else:
+                    artifacts.link_file(path, dest_path, mode=self.failed_link_mode, stats=stats)
+                    print(f'  Extracted: {os.path.basename(path)}')
+            if len(failed_paths) > 0:
+                print(f'  Extracted files: {stats.format()}')
+        
+        if self.failed_archive is not None and len(failed_paths) > 0:
+            with artifacts.open_tar_zst(self.failed_archive) as tar:
+                for path in failed_paths:
+                    tar.add(path, arcname=os.path.relpath(path, base_dir))
+            print(f'  Archive: {self.failed_archive} ({os.path.getsize(self.failed_archive) / 1024 / 1024:.1f} MB)')
         
         if failed_count > 0:
-            print(f'\nExtracted {failed_count} failed notebook(s) to: {self.failed_result_path}')
+            print(f'\nExtracted {failed_count} failed notebook(s) to: {self.failed_result_path or self.failed_archive}')
         else:
             print('\nNo failed notebooks found')
         
@@ -389,16 +969,23 @@ class TestRunner:
         print(f'Configuration: {self.config_path}')
         print(f'Result directory: {self.result_dir}')
         
-        self.run_login_tests()
-        self.run_storage_tests()
-        self.run_metadata_tests()
-        self.run_admin_tests()
+        if self.shard is not None:
+            self.plan_shard()
+        self.start_progress()
+        try:
+            self.run_test_groups()
+        finally:
+            self.stop_progress()
         
         result_notebooks = [result_notebook for result_notebook in self.result_notebooks if result_notebook is not None]
         
         print(f'\nTest run completed at {datetime.now()}')
         print(f'Total notebooks executed: {len(result_notebooks)}')
         print(f'Results saved to: {self.result_dir}')
+        if len(self.skipped_notebooks) > 0:
+            print(f'Skipped notebooks: {len(self.skipped_notebooks)}')
+            for skipped in self.skipped_notebooks:
+                print(f"  {skipped['notebook']}: {skipped['status']}")
         
         # Extract failed notebooks for easier debugging
         self.extract_failed_notebooks()
@@ -449,19 +1036,63 @@ def main():
     parser.add_argument(
         '--show-disk-usage',
         action='store_true',
-        help='Show disk usage before and after each test'
+        help='Record CPU, memory, open files and disk usage while each notebook runs (resource-usage.csv, resource-peaks.csv)'
+    )
+    parser.add_argument(
+        '--resource-interval',
+        type=float,
+        default=resource_sampler.DEFAULT_INTERVAL,
+        help='Sampling interval in seconds for --show-disk-usage (default: %(default)s)'
     )
     parser.add_argument(
         '--failed-result-path',
         help='Path to directory where failed notebooks will be copied (if not specified, failed notebooks are not extracted)'
     )
+    parser.add_argument(
+        '--failed-link-mode',
+        choices=artifacts.LINK_MODES,
+        default='auto',
+        help='How failed notebooks are placed in --failed-result-path: auto tries hardlink, reflink, then copy (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--failed-archive',
+        metavar='PATH',
+        help='Also write the failed notebooks and their result directories to a tar.zst archive'
+    )
+    parser.add_argument(
+        '--clean-leftover-workspaces',
+        action='store_true',
+        help='Remove working directories left by previous crashed runs before starting'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        metavar='i/N',
+        help='Run only the i-th of N groups of notebooks, balanced by historical durations'
+    )
+    parser.add_argument(
+        '--shard-history',
+        default='result',
+        help='Directory containing previous result trees (result-*) used to balance shards and estimate the ETA (default: result)'
+    )
     
     args = parser.parse_args()
     
     # Create and run tests
-    runner = TestRunner(args.config, show_disk_usage=args.show_disk_usage, failed_result_path=args.failed_result_path)
+    runner = TestRunner(
+        args.config,
+        show_disk_usage=args.show_disk_usage,
+        resource_interval=args.resource_interval,
+        clean_leftover_workspaces=args.clean_leftover_workspaces,
+        failed_result_path=args.failed_result_path,
+        failed_link_mode=args.failed_link_mode,
+        failed_archive=args.failed_archive,
+        shard=args.shard,
+        shard_history=args.shard_history,
+    )
     runner.load_config()
     runner.make_result_dir()
+    runner.open_workspace()
     
     try:
         runner.run_all_tests()
@@ -472,6 +1103,8 @@ def main():
         print(f'\nTest run failed with error: {e}')
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        runner.close_workspace()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,47 @@
+# テスト手順Notebookから利用するユーティリティ関数群
+#
+# 各モジュールは読み込みを軽くするため、pandas・openpyxl・nbformat・IPython.display などの重い依存モジュールを
+# 利用する関数の中で読み込む。読み込み時間は python -m scripts.import_benchmark で確認できる。
+
+import importlib
+import os
+import sys
+
+# モジュール名 -> このプロセスで最後に reload したときのソースの (mtime, サイズ)
+_source_stamps = {}
+
+
+def _source_stamp(module):
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _is_unchanged(module):
+    stamp = _source_stamp(module)
+    # このプロセスで記録していない場合は、読み込み後にソースが変更されたか分からないため再読み込みする
+    # (バイトコードは他のプロセスが書き換えている場合があり、読み込み時のソースを表すとは限らない)
+    return stamp is not None and _source_stamps.get(module.__name__) == stamp
+
+
+def reload(module, force=False):
+    """
+    importlib.reload と同様にモジュールを再読み込みする。ただし、ソースが前回の reload から変更されていない場合は何もしない。
+    プロセスで最初の呼び出しでは、常に再読み込みする。
+
+    :param module: 再読み込みするモジュール
+    :param force: ソースが変更されていなくても再読み込みする
+    :return: モジュール
+    """
+    if not force and sys.modules.get(module.__name__) is module and _is_unchanged(module):
+        return module
+    # 読み込み中にソースが変更された場合に次回再読み込みされるよう、読み込み前の値を記録する
+    stamp = _source_stamp(module)
+    module = importlib.reload(module)
+    _source_stamps[module.__name__] = stamp
+    return module
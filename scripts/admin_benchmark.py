@@ -0,0 +1,633 @@
+# 管理者機能(ユーザ管理・ノード管理・利用統計・証跡管理)の画面の表示時間を、データ量ごとに計測するためのユーティリティ関数群
+#
+# 環境変数 GRDM_BENCHMARK_ADMIN=1 を指定するか、enable() を呼ぶと有効になる。
+# measure() で囲んだ操作(検索の実行から結果の表示まで、ダウンロードの完了まで など)の所要時間を記録する:
+#
+#   async with admin_benchmark.measure(page, 'users.search_guid'):
+#       await page.locator('//input[@type = "submit"]').click()
+#       await expect(page.locator(f'//td[contains(text(), "{search_user_name}")]')).to_be_visible(timeout=transition_timeout)
+#
+# 記録した結果は finish_pw_context 時に結果ディレクトリの admin-benchmark.jsonl に追記される。
+# run_pw のステップ内の計測はセッション(Session)ごとに記録され、各セッションの結果ディレクトリに保存される。
+# 計測時のデータ量の区分(ティア)の名前は環境変数 GRDM_BENCHMARK_TIER で指定する。
+#
+# コマンドラインからは run_tests.py と同じ設定ファイルを使い、ティアごとにデータを用意してから各画面を計測できる。
+# ティアは「名前:ノード数:ファイル数[:ユーザー数]」で指定し、データは小さいティアから順に追加される(既に存在する分は作成しない):
+#
+#   python -m scripts.admin_benchmark run ci.config.yaml --tier small:100:100:100 --tier large:5000:2000:5000 --repeat 5
+#   python -m scripts.admin_benchmark report result/admin-benchmark-*
+#
+# ノード(TEST-ADMINBENCH-NNNNN)と、タイムスタンプが付与されるファイル(TEST-ADMINBENCH-FILES のNII Storage)は
+# rdm_token(パーソナルアクセストークン)のユーザーでAPIから作成する。
+# ユーザーはAPIから作成できないため、.github/scripts/setup_scale_test_data.py を設定ファイルの
+# admin_benchmark_seed_users_command (RDMの manage.py shell を実行するコマンド)の標準入力に渡して作成する。
+# コマンドが指定されていない場合は、計測時点のユーザー数を記録するのみとする。
+
+import argparse
+import asyncio
+import contextvars
+import csv
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime, timedelta
+from urllib.parse import urljoin
+
+from scripts import api
+
+NODE_PREFIX = 'TEST-ADMINBENCH'
+FILES_PROJECT = f'{NODE_PREFIX}-FILES'
+DEFAULT_TIERS = ['small:100:100:100', 'medium:1000:500:1000', 'large:5000:2000:5000']
+# 作成するユーザーのユーザー名の接頭辞(adminbenchuserNNNNN@example.com)
+USER_PREFIX = 'adminbench'
+SEED_USERS_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.github', 'scripts', 'setup_scale_test_data.py',
+)
+DEFAULT_REPEAT = 3
+DEFAULT_WORKERS = 8
+# 証跡管理の日付の絞り込みの期間(日)
+DEFAULT_FILTER_DAYS = 30
+# 計測の前に一覧を空にするための、ファイルが存在しない期間
+EMPTY_FILTER_DATES = ('2000-01-01', '2000-01-02')
+
+summary_columns = ['tier', 'scenario', 'nodes', 'files', 'users', 'count', 'errors', 'p50_s', 'p90_s', 'p95_s', 'max_s']
+
+_recorder = None
+# Session が use() で設定する、実行中のセッションの記録先
+_session_recorder = contextvars.ContextVar('admin_benchmark_session_recorder')
+
+
+class AdminBenchmarkRecorder:
+    """measure() で囲んだ操作ごとの所要時間を、ティアとデータ量とともに記録する"""
+
+    def __init__(self, tier=None):
+        self.samples = []
+        self.tier = {'tier': tier, 'nodes': None, 'files': None, 'users': None}
+
+    def set_tier(self, name, nodes=None, files=None, users=None):
+        self.tier = {'tier': name, 'nodes': nodes, 'files': files, 'users': users}
+
+    @asynccontextmanager
+    async def measure(self, page, scenario):
+        sample = dict(self.tier, scenario=scenario)
+        error = None
+        started = time.monotonic()
+        try:
+            yield sample
+        except BaseException as e:
+            error = f'{type(e).__name__}: {e}'.split('\n')[0]
+            raise
+        finally:
+            sample.update({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'url': page.url,
+                'seconds': time.monotonic() - started,
+                'error': error,
+            })
+            self.samples.append(sample)
+            print(format_sample(sample))
+
+    def write_report(self, result_dir):
+        if len(self.samples) == 0:
+            return None
+        os.makedirs(result_dir, exist_ok=True)
+        path = os.path.join(result_dir, 'admin-benchmark.jsonl')
+        # 1つのNotebookの中で finish_pw_context が複数回呼ばれることがあるため追記する
+        with open(path, 'a') as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+        self.samples = []
+        return path
+
+
+def format_sample(sample):
+    status = 'failed' if sample['error'] is not None else 'ok'
+    return f"Admin benchmark: {sample['scenario']} [{sample['tier'] or '-'}] {sample['seconds']:.2f}s {status}"
+
+
+def enable(tier=None):
+    global _recorder
+    _recorder = AdminBenchmarkRecorder(tier=tier)
+    return _recorder
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def is_enabled():
+    return _recorder is not None
+
+
+def new_recorder():
+    """有効な場合は、セッションごとの記録先を enable() と同じティアで新しく作成する"""
+    if _recorder is None:
+        return None
+    recorder = AdminBenchmarkRecorder()
+    recorder.tier = dict(_recorder.tier)
+    return recorder
+
+
+@contextmanager
+def use(recorder):
+    """囲んだ範囲の measure() の記録先を recorder にする。None の場合は計測しない"""
+    token = _session_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _session_recorder.reset(token)
+
+
+def _current():
+    return _session_recorder.get(_recorder)
+
+
+@asynccontextmanager
+async def measure(page, scenario):
+    """
+    囲んだ操作の所要時間を計測する。無効な場合は何もしない。
+
+    :param page: 操作するページ
+    :param scenario: '<画面>.<操作>' の形式の名前(例: 'users.search_guid', 'timestamp.filter')
+    """
+    recorder = _current()
+    if recorder is None:
+        yield {}
+        return
+    async with recorder.measure(page, scenario) as sample:
+        yield sample
+
+
+def write_report(result_dir, recorder=None):
+    recorder = recorder or _current()
+    if recorder is None or result_dir is None:
+        return None
+    path = recorder.write_report(result_dir)
+    if path is not None:
+        print(f'Admin benchmark: {path}')
+    return path
+
+
+# 証跡管理のファイル一覧で、表示されている行がすべて期間内の日付を含むか
+_DATE_FILTER_APPLIED = '''([start, end, minRows]) => {
+    const check = document.querySelector('#addTimestampAllCheck');
+    const table = check === null ? null : check.closest('table');
+    if (table === null) {
+        return false;
+    }
+    const rows = Array.from(table.querySelectorAll('tbody tr')).filter((tr) => tr.offsetParent !== null);
+    return rows.length >= minRows && rows.every((tr) => (tr.innerText.match(/\\d{4}[-\\/]\\d{2}[-\\/]\\d{2}/g) || [])
+        .map((value) => value.replace(/\\//g, '-'))
+        .some((value) => value >= start && value <= end));
+}'''
+
+
+async def wait_for_date_filter(page, start_date, end_date, min_rows=0, timeout=30000):
+    """
+    証跡管理の日付の絞り込みが反映され、期間内の行のみが表示されるまで待つ。
+
+    :param start_date: 開始日('YYYY-MM-DD' または date)
+    :param end_date: 終了日('YYYY-MM-DD' または date)
+    :param min_rows: 表示されているべき行の最小数
+    """
+    await page.wait_for_function(
+        _DATE_FILTER_APPLIED, arg=[str(start_date), str(end_date), min_rows], timeout=timeout,
+    )
+
+
+async def fill_date_filter(page, start_date, end_date):
+    """証跡管理の絞り込みの開始日と終了日を入力する"""
+    await page.locator('#startDateFilter').fill(str(start_date))
+    await page.locator('#endDateFilter').fill(str(end_date))
+    await page.locator('h3').click()
+
+
+async def clear_date_filter(page, timeout=30000):
+    """該当するファイルがない期間で絞り込み、一覧が空になるまで待つ。絞り込みの計測の前に呼ぶ"""
+    await fill_date_filter(page, EMPTY_FILTER_DATES[0], EMPTY_FILTER_DATES[1])
+    await page.locator('#applyFiltersButton').click()
+    await wait_for_date_filter(page, EMPTY_FILTER_DATES[0], EMPTY_FILTER_DATES[1], timeout=timeout)
+
+
+def node_title(index):
+    return f'{NODE_PREFIX}-{index:05d}'
+
+
+def file_name(index):
+    return f'adminbench-{index:05d}.txt'
+
+
+def _run_parallel(func, items, workers):
+    """items を並行して func に渡し、失敗した件数を返す"""
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f'Failed to seed: {type(e).__name__}: {e}'.split('\n')[0], file=sys.stderr)
+    return failed
+
+
+def seed_nodes(client, count, workers=DEFAULT_WORKERS):
+    """
+    TEST-ADMINBENCH-00001 〜 のプロジェクトを count 個まで作成する。既に存在するものは作成しない。
+
+    :return: (作成した数, 検索に使うプロジェクト)
+    """
+    existing = {
+        project['attributes']['title']: project
+        for project in client.list_projects(title=NODE_PREFIX + '-')
+    }
+    missing = [node_title(i) for i in range(1, count + 1) if node_title(i) not in existing]
+    failed = _run_parallel(client.create_project, missing, workers)
+    target = existing.get(node_title(count)) or next(
+        iter(client.list_projects(title=node_title(count))), None
+    )
+    return len(missing) - failed, target
+
+
+def seed_files(client, count, workers=DEFAULT_WORKERS, content=b'admin benchmark\n'):
+    """
+    TEST-ADMINBENCH-FILES のNII Storageにファイルを count 個まで作成する。アップロードしたファイルにはタイムスタンプが付与される。
+
+    :return: (作成した数, ファイルのプロジェクト)
+    """
+    projects = [p for p in client.list_projects(title=FILES_PROJECT) if p['attributes']['title'] == FILES_PROJECT]
+    project = projects[0] if len(projects) > 0 else client.create_project(FILES_PROJECT)
+    existing = set(item['attributes']['name'] for item in client.list_files(project['id'], 'osfstorage'))
+    missing = [file_name(i) for i in range(1, count + 1) if file_name(i) not in existing]
+    if len(missing) == 0:
+        return 0, project
+    upload_url = client.upload_links(project['id'])['osfstorage']
+    failed = _run_parallel(lambda name: client.upload_file(upload_url, name, content), missing, workers)
+    return len(missing) - failed, project
+
+
+def seed_users(command, count, prefix=USER_PREFIX):
+    """
+    setup_scale_test_data.py を command の標準入力に渡し、ユーザーを count 人まで作成する。既に存在するものは作成しない。
+
+    :param command: RDMの manage.py shell を実行するシェルコマンド。{users} と {prefix} は作成する人数と接頭辞に置き換える
+    :return: 作成した数
+    """
+    with open(SEED_USERS_SCRIPT, 'r') as f:
+        script = f.read()
+    env = dict(os.environ, SCALE_USERS=str(count), SCALE_PREFIX=prefix, SCALE_PROJECTS_PER_USER='0')
+    proc = subprocess.run(
+        command.format(users=count, prefix=prefix), shell=True, input=script, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    m = re.search(r'Created ([0-9]+) users', proc.stdout)
+    if m is None:
+        raise RuntimeError(f'Unexpected output from the user generator: {proc.stdout[-200:]}')
+    return int(m.group(1))
+
+
+def parse_tier(value):
+    """'名前:ノード数:ファイル数[:ユーザー数]' を (名前, ノード数, ファイル数, ユーザー数) に変換する"""
+    try:
+        name, nodes, files, *users = value.split(':')
+        if len(users) > 1:
+            raise ValueError(value)
+        return name, int(nodes), int(files), int(users[0]) if users else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Tier must be NAME:NODES:FILES[:USERS]: {value}')
+
+
+class AdminScenarios:
+    """管理者機能の各画面の操作を計測する。各操作は Notebook(テスト手順-管理者機能-*)の手順と同じ"""
+
+    def __init__(self, page, recorder, config):
+        self.page = page
+        self.recorder = recorder
+        self.admin_rdm_url = config['admin_rdm_url']
+        self.timeout = config.get('transition_timeout', 60000)
+        self.organization = config.get('admin_target_organization', config.get('idp_name_1'))
+        self.search_user_name = config.get('admin_search_user_name')
+        self.search_user_by_id = config.get('admin_search_user_by_id')
+        self.search_user_by_name = config.get('admin_search_user_by_name')
+        self.search_user_by_email = config.get('admin_search_user_by_email')
+        self.download_dir = None
+        self._timestamp_url = None
+
+    async def login(self, config):
+        from playwright.async_api import expect
+        from scripts import grdm
+
+        await self.page.goto(self.admin_rdm_url)
+        await expect(self.page.locator('.login-logo')).to_be_visible(timeout=self.timeout)
+        await grdm.login_as_admin(
+            self.page, config.get('idp_name_1'), config['idp_username_1'], config.get('idp_password_1'),
+            transition_timeout=self.timeout,
+        )
+        await expect(self.page.locator(
+            '//*[contains(@class, "btn-danger") and contains(text(), "ログアウト")]'
+        )).to_be_enabled(timeout=self.timeout)
+
+    async def _search(self, scenario, path, field, value, expected):
+        from playwright.async_api import expect
+
+        await self.page.goto(urljoin(self.admin_rdm_url, path))
+        await expect(self.page.locator(f'//input[@name = "{field}"]')).to_be_visible(timeout=self.timeout * 5)
+        await self.page.locator(f'//input[@name = "{field}"]').fill(value)
+        async with self.recorder.measure(self.page, scenario):
+            await self.page.locator('//input[@type = "submit"]').click()
+            await expect(self.page.locator(expected)).to_be_visible(timeout=self.timeout)
+
+    async def users(self):
+        if self.search_user_name is None or self.search_user_by_id is None:
+            print('admin_search_user_name or admin_search_user_by_id is not set; skipping users')
+            return
+        await self._search('users.search_guid', 'users/', 'guid', self.search_user_by_id,
+                           f'//td[contains(text(), "{self.search_user_name}")]')
+        if self.search_user_by_name is not None:
+            await self._search('users.search_name', 'users/', 'name', self.search_user_by_name,
+                               f'//a[contains(text(), "{self.search_user_by_id}")]')
+        if self.search_user_by_email is not None:
+            await self._search('users.search_email', 'users/', 'email', self.search_user_by_email,
+                               f'//td[contains(text(), "{self.search_user_name}")]')
+
+    async def nodes(self, node):
+        if node is None:
+            print('No node to search; skipping nodes')
+            return
+        await self._search('nodes.search_guid', 'nodes/', 'guid', node['id'],
+                           f'//td[contains(text(), "{node["attributes"]["title"]}")]')
+
+    async def statistics(self):
+        from playwright.async_api import expect
+        from scripts import download_verify
+
+        page = self.page
+        await page.goto(urljoin(self.admin_rdm_url, 'statistics/'))
+        await expect(page.locator('//input[@type = "search"]')).to_be_visible(timeout=self.timeout * 5)
+        await page.locator('//input[@type = "search"]').fill(self.organization)
+        organization_link = page.locator(f'//a[contains(text(), "{self.organization}")]')
+        await expect(organization_link).to_be_visible()
+        async with self.recorder.measure(page, 'statistics.institution'):
+            await organization_link.click()
+            await expect(page.locator('//*[text() = "PDFダウンロード"]')).to_be_enabled(timeout=self.timeout * 5)
+        for scenario, label in [('statistics.csv', 'CSVダウンロード'), ('statistics.pdf', 'PDFダウンロード')]:
+            try:
+                async with self.recorder.measure(page, scenario):
+                    async with page.expect_download(timeout=self.timeout * 5) as download_info:
+                        await page.locator(f'//*[text() = "{label}"]').click(timeout=self.timeout * 5)
+                    download = await download_info.value
+                    downloaded = await download_verify.save_download(download, os.path.join(self.download_dir, ''))
+            except Exception:
+                traceback.print_exc()
+                continue
+            download_verify.verify_file(downloaded)
+
+    async def timestamp(self, files_project, start_date, end_date):
+        from playwright.async_api import expect
+
+        page = self.page
+        next_page = page.locator('//a[i[contains(@class, "fa-angle-right")]]')
+        await page.goto(urljoin(self.admin_rdm_url, 'timestampadd/'))
+        await expect(page.locator('//h2[text() = "機関のリスト"]')).to_be_visible(timeout=self.timeout)
+        link = page.locator(f'//a[text() = "{self.organization}"]')
+        while await link.count() == 0:
+            # 次のページかもしれない
+            await next_page.click()
+            await expect(page.locator('//h2[text() = "機関のリスト"]')).to_be_visible(timeout=self.timeout)
+        async with self.recorder.measure(page, 'timestamp.node_list'):
+            await link.click()
+            await expect(page.locator(
+                f'//h2[contains(text(), "{self.organization}のノードリスト")]'
+            )).to_be_visible(timeout=self.timeout)
+
+        if files_project is None:
+            return
+        if self._timestamp_url is None:
+            title = files_project['attributes']['title']
+            node_link = page.locator(f'//tr/td[2]/a[text() = "{title}"]')
+            while await node_link.count() == 0:
+                if await next_page.count() == 0:
+                    print(f'{title} is not listed in the node list of {self.organization}; skipping the filter')
+                    return
+                await next_page.click()
+                await page.wait_for_load_state('networkidle')
+            await node_link.click()
+            await expect(page.locator('//h3[contains(text(), "証跡管理")]')).to_be_visible(timeout=self.timeout)
+            self._timestamp_url = page.url
+        else:
+            await page.goto(self._timestamp_url)
+            await expect(page.locator('//h3[contains(text(), "証跡管理")]')).to_be_visible(timeout=self.timeout)
+        # 期間外の日付で絞り込んで一覧を空にしてから、計測する期間で絞り込む
+        await clear_date_filter(page, timeout=self.timeout)
+        await fill_date_filter(page, start_date, end_date)
+        async with self.recorder.measure(page, 'timestamp.filter'):
+            await page.locator('#applyFiltersButton').click()
+            await wait_for_date_filter(page, start_date, end_date, min_rows=1, timeout=self.timeout)
+
+
+async def run_benchmark(config, tiers, repeat=DEFAULT_REPEAT, result_dir=None, workers=DEFAULT_WORKERS,
+                        seed=True, headless=True, filter_days=DEFAULT_FILTER_DAYS, seed_users_command=None):
+    """
+    ティアごとにデータを用意し、管理者機能の各画面を repeat 回ずつ計測する。
+
+    :param tiers: (名前, ノード数, ファイル数, ユーザー数) のリスト。小さい順に指定する。ユーザー数は None でもよい
+    :param seed: False の場合はデータを作成せず、既存のデータで計測する
+    :param seed_users_command: ユーザーを作成するコマンド(seed_users を参照)。省略時は設定ファイルの
+        admin_benchmark_seed_users_command。指定がない場合、ユーザーは作成しない
+    :return: AdminBenchmarkRecorder
+    """
+    from playwright.async_api import async_playwright
+
+    client = api.RDMClient(
+        config.get('rdm_url', 'https://rdm.example.com/'),
+        config.get('rdm_token') or os.environ.get('GRDM_RDM_TOKEN'),
+        api_url=config.get('rdm_api_url_v2'),
+        pool_size=workers,
+    )
+    seed_users_command = seed_users_command or config.get('admin_benchmark_seed_users_command')
+    if seed and seed_users_command is None and any(tier[3] is not None for tier in tiers):
+        print('admin_benchmark_seed_users_command is not set; users are not seeded', file=sys.stderr)
+    recorder = AdminBenchmarkRecorder()
+    end_date = date.today()
+    start_date = end_date - timedelta(days=filter_days)
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(
+            headless=headless,
+            args=["--no-sandbox", "--disable-dev-shm-usage", "--lang=ja"],
+        )
+        try:
+            context = await browser.new_context(locale='ja-JP', accept_downloads=True)
+            page = await context.new_page()
+            scenarios = AdminScenarios(page, recorder, config)
+            scenarios.download_dir = os.path.join(result_dir or '.', 'downloaded')
+            await scenarios.login(config)
+            for name, node_count, file_count, user_count in tiers:
+                started = time.monotonic()
+                if seed:
+                    created_users = 0
+                    if seed_users_command is not None and user_count is not None:
+                        created_users = await asyncio.to_thread(seed_users, seed_users_command, user_count)
+                    created_nodes, node = await asyncio.to_thread(seed_nodes, client, node_count, workers)
+                    created_files, files_project = await asyncio.to_thread(seed_files, client, file_count, workers)
+                    print(f'Tier {name}: created {created_users} user(s), {created_nodes} node(s) '
+                          f'and {created_files} file(s) in {time.monotonic() - started:.1f}s')
+                else:
+                    node = next(iter(client.list_projects(title=node_title(node_count))), None)
+                    files_project = next(iter(client.list_projects(title=FILES_PROJECT)), None)
+                users = await asyncio.to_thread(client.count_users)
+                recorder.set_tier(name, nodes=node_count, files=file_count, users=users)
+                for _ in range(repeat):
+                    for scenario in [
+                        lambda: scenarios.users(),
+                        lambda: scenarios.nodes(node),
+                        lambda: scenarios.statistics(),
+                        lambda: scenarios.timestamp(files_project, start_date, end_date),
+                    ]:
+                        try:
+                            await scenario()
+                        except Exception:
+                            # 失敗は記録済み。次の画面の計測を続ける
+                            traceback.print_exc()
+        finally:
+            await browser.close()
+    if result_dir is not None:
+        path = recorder.write_report(result_dir)
+        print(f'Samples: {path}')
+    return recorder
+
+
+def load_samples(paths):
+    """ファイルまたはディレクトリ(以下の admin-benchmark.jsonl)から計測結果を読み込む"""
+    samples = []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else glob.glob(
+            os.path.join(path, '**', 'admin-benchmark.jsonl'), recursive=True,
+        )
+        for file in files:
+            with open(file, 'r') as f:
+                samples.extend(json.loads(line) for line in f if line.strip())
+    return samples
+
+
+def _percentile(sorted_values, p):
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """ティア・操作ごとの所要時間のパーセンタイル(秒)。失敗した操作は errors に数え、パーセンタイルには含めない"""
+    groups = {}
+    for sample in samples:
+        groups.setdefault((sample.get('tier'), sample['scenario']), []).append(sample)
+    rows = []
+    for (tier, scenario), group in groups.items():
+        durations = sorted(s['seconds'] for s in group if s.get('error') is None)
+        last = group[-1]
+        rows.append({
+            'tier': tier,
+            'scenario': scenario,
+            'nodes': last.get('nodes'),
+            'files': last.get('files'),
+            'users': last.get('users'),
+            'count': len(group),
+            'errors': len(group) - len(durations),
+            'p50_s': _percentile(durations, 50) if durations else None,
+            'p90_s': _percentile(durations, 90) if durations else None,
+            'p95_s': _percentile(durations, 95) if durations else None,
+            'max_s': durations[-1] if durations else None,
+        })
+    return sorted(rows, key=lambda row: (row['scenario'], row['nodes'] or 0, row['files'] or 0, str(row['tier'])))
+
+
+def _format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
+
+
+def print_summary(rows, out=None):
+    out = out or sys.stdout
+    print('\t'.join(summary_columns), file=out)
+    for row in rows:
+        print('\t'.join(_format_value(row[c]) for c in summary_columns), file=out)
+
+
+def write_summary(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=summary_columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the admin console pages (users, nodes, statistics, timestamps) per data volume'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Seed each tier and measure the admin pages')
+    run_parser.add_argument('config', help='Path to configuration YAML file (same format as run_tests.py)')
+    run_parser.add_argument('--tier', action='append', type=parse_tier, default=[], metavar='NAME:NODES:FILES[:USERS]',
+                            help='Data volume tier; may be repeated, smallest first (default: {})'.format(
+                                ' '.join(DEFAULT_TIERS)))
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help='Measurements per page and tier (default: %(default)s)')
+    run_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help='Concurrent API requests while seeding (default: %(default)s)')
+    run_parser.add_argument('--skip-seed', action='store_true', help='Measure with the existing data only')
+    run_parser.add_argument('--seed-users-command',
+                            help='Shell command running the RDM manage.py shell; setup_scale_test_data.py is piped '
+                                 'to it to seed the users of each tier (default: admin_benchmark_seed_users_command '
+                                 'in the config)')
+    run_parser.add_argument('--result-dir', help='Directory to save the report (default: result/admin-benchmark-<timestamp>)')
+    report_parser = subparsers.add_parser('report', help='Summarize the measurements as percentiles')
+    report_parser.add_argument('paths', nargs='+', help='admin-benchmark.jsonl files or directories containing them')
+    report_parser.add_argument('--csv', help='Write the summary to the CSV file')
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        rows = summarize(load_samples(args.paths))
+        print_summary(rows)
+        if args.csv is not None:
+            write_summary(rows, args.csv)
+        return 0
+
+    import yaml
+
+    with open(args.config) as f:
+        config = yaml.load(f.read(), yaml.SafeLoader)
+    if not config.get('admin_rdm_url'):
+        print('admin_rdm_url is not set', file=sys.stderr)
+        return 1
+    result_dir = args.result_dir or os.path.join(
+        'result', 'admin-benchmark-{}'.format(datetime.now().strftime('%Y%m%d-%H%M%S'))
+    )
+    asyncio.run(run_benchmark(
+        config,
+        args.tier or [parse_tier(tier) for tier in DEFAULT_TIERS],
+        repeat=args.repeat,
+        result_dir=result_dir,
+        workers=args.workers,
+        seed=not args.skip_seed,
+        seed_users_command=args.seed_users_command,
+    ))
+    rows = summarize(load_samples([os.path.join(result_dir, 'admin-benchmark.jsonl')]))
+    print_summary(rows)
+    write_summary(rows, os.path.join(result_dir, 'admin-benchmark-summary.csv'))
+    return 1 if any(row['errors'] > 0 for row in rows) else 0
+
+
+if os.environ.get('GRDM_BENCHMARK_ADMIN', '').lower() in ('1', 'true', 'yes'):
+    enable(tier=os.environ.get('GRDM_BENCHMARK_TIER'))
+
+if __name__ == '__main__':
+    sys.exit(main())
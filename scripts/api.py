@@ -22,3 +22,169 @@ async def execute_rdmclient(rdm_api_url_v2, rdm_token, project_url, args):
     if proc.returncode != 0:
         raise Exception(f'rdmclientの実行に失敗しました。 exitcode={proc.returncode}')
     return stdout, stderr
+
+
+def api_url_from_rdm_url(rdm_url):
+    """GRDMのURL(例: https://rdm.example.com/)から、APIのURL(例: https://api.rdm.example.com/v2/)を求める"""
+    parsed = urlparse(rdm_url)
+    return f'{parsed.scheme}://api.{parsed.netloc}/v2/'
+
+
+class RDMAPIError(Exception):
+    def __init__(self, method, url, status, body):
+        super().__init__(f'{method} {url} failed with {status}: {body[:200]}')
+        self.method = method
+        self.url = url
+        self.status = status
+        self.body = body
+
+
+def check_reachable(url, timeout=60):
+    """URLが応答する(リダイレクト後のステータスが400未満である)ことを確認する"""
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    if response.status_code >= 400:
+        raise RDMAPIError('GET', url, response.status_code, response.text)
+    return response
+
+
+class RDMClient:
+    """
+    パーソナルアクセストークンでGRDMのAPI(v2、一部のv1、WaterButler)を呼び出すクライアント。
+
+    接続は requests.Session でプールし、複数のスレッドから同時に呼び出せる。
+
+    :param rdm_url: GRDMのURL
+    :param token: パーソナルアクセストークン(osf.full_write スコープ)
+    :param api_url: APIのURL。Noneの場合は rdm_url から求める
+    :param pool_size: 同じホストへの接続の最大数
+    """
+
+    def __init__(self, rdm_url, token, api_url=None, timeout=60, pool_size=8):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if not token:
+            raise ValueError('A personal access token is required to use the RDM API')
+        self.rdm_url = rdm_url if rdm_url.endswith('/') else rdm_url + '/'
+        self.api_url = api_url or api_url_from_rdm_url(rdm_url)
+        if not self.api_url.endswith('/'):
+            self.api_url += '/'
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/vnd.api+json',
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.api_url + path.lstrip('/')
+
+    def request(self, method, path, params=None, data=None):
+        """APIを呼び出し、レスポンスのJSON(本文がない場合はNone)を返す"""
+        url = self._url(path)
+        headers = {'Content-Type': 'application/vnd.api+json'} if data is not None else None
+        response = self.session.request(method, url, params=params, json=data, headers=headers, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise RDMAPIError(method, url, response.status_code, response.text)
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    def paginate(self, path, params=None):
+        """一覧APIの全ページの要素を順に返す"""
+        result = self.request('GET', path, params=params)
+        while True:
+            yield from result.get('data', [])
+            next_url = (result.get('links') or {}).get('next')
+            if not next_url:
+                return
+            result = self.request('GET', next_url)
+
+    def me(self):
+        return self.request('GET', 'users/me/')['data']
+
+    def list_projects(self, title=None):
+        """
+        ログインユーザーが参加しているプロジェクト(最上位のノード)を返す。
+
+        :param title: 指定した場合、タイトルにこの文字列を含むプロジェクトのみを返す
+        """
+        params = {'filter[parent]': 'null', 'page[size]': 100}
+        if title:
+            params['filter[title]'] = title
+        return list(self.paginate('users/me/nodes/', params=params))
+
+    def create_project(self, title, tags=None):
+        attributes = {'title': title, 'category': 'project'}
+        if tags:
+            attributes['tags'] = list(tags)
+        return self.request('POST', 'nodes/', data={'data': {'type': 'nodes', 'attributes': attributes}})['data']
+
+    def get_project(self, node_id):
+        return self.request('GET', f'nodes/{node_id}/')['data']
+
+    def update_project(self, node_id, **attributes):
+        return self.request('PATCH', f'nodes/{node_id}/', data={
+            'data': {'type': 'nodes', 'id': node_id, 'attributes': attributes},
+        })['data']
+
+    def delete_project(self, node_id):
+        self.request('DELETE', f'nodes/{node_id}/')
+
+    def list_files(self, node_id, provider='osfstorage'):
+        """ストレージ provider の最上位のファイル・フォルダを返す"""
+        return list(self.paginate(f'nodes/{node_id}/files/{provider}/', params={'page[size]': 100}))
+
+    def delete_file(self, item):
+        """list_files が返したファイル・フォルダを削除する(フォルダは中身ごと削除される)"""
+        self.request('DELETE', item['links']['delete'])
+
+    def upload_links(self, node_id):
+        """ストレージごとの、最上位のフォルダへのアップロードのURL(WaterButler)"""
+        return {
+            item['attributes']['provider']: item['links']['upload']
+            for item in self.paginate(f'nodes/{node_id}/files/')
+        }
+
+    def upload_file(self, upload_url, name, content):
+        """upload_links が返したURLのフォルダにファイルを作成する"""
+        response = self.session.put(
+            upload_url, params={'kind': 'file', 'name': name}, data=content, timeout=self.timeout,
+        )
+        if response.status_code >= 400:
+            raise RDMAPIError('PUT', upload_url, response.status_code, response.text)
+        return response.json()
+
+    def count_users(self):
+        """GRDMのユーザー数"""
+        result = self.request('GET', 'users/', params={'page[size]': 1})
+        meta = result.get('meta') or (result.get('links') or {}).get('meta') or {}
+        return meta.get('total')
+
+    def list_addons(self, node_id):
+        return list(self.paginate(f'nodes/{node_id}/addons/'))
+
+    def remove_addon(self, node_id, addon_id):
+        """プロジェクトのアドオンを無効にする(設定も削除される)"""
+        self.request('DELETE', f'nodes/{node_id}/addons/{addon_id}/')
+
+    def list_contributors(self, node_id):
+        return list(self.paginate(f'nodes/{node_id}/contributors/', params={'page[size]': 100}))
+
+    def remove_contributor(self, node_id, user_id):
+        self.request('DELETE', f'nodes/{node_id}/contributors/{user_id}/')
+
+    def get_project_metadata(self, node_id):
+        """Metadataアドオンのプロジェクトのメタデータ(v1 API)を返す"""
+        return self.request('GET', f'{self.rdm_url}api/v1/project/{node_id}/metadata/project')
+
+    def delete_file_metadata(self, node_id, path):
+        """Metadataアドオンのファイルのメタデータ(v1 API)を削除する。path は 'osfstorage/...' の形式"""
+        self.request('DELETE', f'{self.rdm_url}api/v1/project/{node_id}/metadata/files/{path}')
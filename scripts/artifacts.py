@@ -0,0 +1,217 @@
+# 結果ディレクトリの成果物(Notebook・動画・HAR・スクリーンショットなど)を複製・アーカイブするためのユーティリティ関数群
+#
+# 同じファイルシステム上への複製はハードリンク(作成できない場合は reflink)で行い、ファイルの内容をコピーしない。
+# ファイルシステムが異なる場合など、リンクを作成できない場合はコピーする:
+#
+#   stats = artifacts.LinkStats()
+#   artifacts.link_tree('result/result-xxx/テスト手順-未ログイン', 'result-failed/result-xxx/テスト手順-未ログイン', stats=stats)
+#   print(stats.format())
+#
+# tar.zst は zstandard モジュールがあればそれを、なければ zstd コマンドを使い、一時ファイルを作らずに書き出す
+# (結果ディレクトリ全体のアーカイブは scripts/package_results.py を参照):
+#
+#   with artifacts.open_tar_zst('result-failed.tar.zst') as tar:
+#       tar.add('result/result-xxx/テスト手順-未ログイン', arcname='result-xxx/テスト手順-未ログイン')
+
+import os
+import shutil
+import subprocess
+import tarfile
+from contextlib import contextmanager
+
+LINK_MODES = ('auto', 'hardlink', 'reflink', 'copy')
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+_MB = 1024 * 1024
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def link_or_copy(src, dst, mode='auto'):
+    """
+    ファイル src を dst に複製する。dst が存在する場合は置き換える。
+
+    :param mode: 'auto' はハードリンク、reflink、コピーの順に試す。'hardlink', 'reflink' はその方法のみ、'copy' は常にコピーする
+    :return: 実際に使った方法('hardlink', 'reflink', 'copy')
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f'Unknown link mode: {mode} (expected one of {LINK_MODES})')
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode in ('auto', 'hardlink'):
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            if mode == 'hardlink':
+                raise
+    if mode in ('auto', 'reflink'):
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except (OSError, ImportError):
+            if mode == 'reflink':
+                raise
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+class LinkStats:
+    """複製の方法ごとのファイル数とバイト数"""
+
+    def __init__(self):
+        self.files = {}
+        self.bytes = {}
+
+    def add(self, method, size):
+        self.files[method] = self.files.get(method, 0) + 1
+        self.bytes[method] = self.bytes.get(method, 0) + size
+
+    @property
+    def copied_bytes(self):
+        return self.bytes.get('copy', 0)
+
+    def format(self):
+        if len(self.files) == 0:
+            return 'no files'
+        return ', '.join(
+            f'{method} {self.files[method]} file(s) ({self.bytes[method] / _MB:.1f} MB)'
+            for method in LINK_MODES if method in self.files
+        )
+
+
+def link_file(src, dst, mode='auto', stats=None):
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    method = link_or_copy(src, dst, mode=mode)
+    if stats is not None:
+        stats.add(method, os.path.getsize(dst))
+    return method
+
+
+def link_tree(src_dir, dst_dir, mode='auto', stats=None):
+    """
+    ディレクトリ src_dir 以下を dst_dir に複製する。shutil.copytree(..., dirs_exist_ok=True) と同様に既存のファイルは置き換える。
+
+    :return: LinkStats
+    """
+    stats = stats if stats is not None else LinkStats()
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        rel_dir = os.path.relpath(dirpath, src_dir)
+        dest_dir = os.path.normpath(os.path.join(dst_dir, rel_dir))
+        os.makedirs(dest_dir, exist_ok=True)
+        shutil.copystat(dirpath, dest_dir)
+        for filename in filenames:
+            link_file(os.path.join(dirpath, filename), os.path.join(dest_dir, filename), mode=mode, stats=stats)
+    return stats
+
+
+class ZstdFrameWriter:
+    """
+    zstdのフレームを連結して書き出すファイルオブジェクト。set_level() でフレームを区切り、以降の圧縮レベルを変更できる。
+
+    連結したフレームは zstd -d (tar --zstd) で1つのストリームとして展開できる。
+    zstandard モジュールがあればそれを、なければ zstd コマンドを使う。
+
+    :param fileobj: 書き出し先(バイナリモードで開いたファイル)
+    :param level: zstdの圧縮レベル。負の値は高速なレベル(--fast)
+    :param threads: 圧縮スレッド数。0 の場合は論理CPU数
+    """
+
+    def __init__(self, fileobj, level=3, threads=0):
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+        self._zstandard = zstandard
+        self._command = shutil.which('zstd') if zstandard is None else None
+        if zstandard is None and self._command is None:
+            raise RuntimeError('Writing zstd requires the zstandard module or the zstd command')
+        self.fileobj = fileobj
+        self.threads = threads
+        self.level = level
+        self._writer = None
+        self._process = None
+        self._position = 0
+
+    def set_level(self, level):
+        if level == self.level:
+            return
+        self.end_frame()
+        self.level = level
+
+    def _start_frame(self):
+        if self._zstandard is not None:
+            compressor = self._zstandard.ZstdCompressor(
+                level=self.level,
+                threads=self.threads if self.threads > 0 else -1,
+            )
+            self._writer = compressor.stream_writer(self.fileobj, closefd=False)
+            return
+        level = f'-{self.level}' if self.level > 0 else f'--fast={max(-self.level, 1)}'
+        self.fileobj.flush()
+        self._process = subprocess.Popen(
+            [self._command, level, f'-T{self.threads}', '-q', '-c'],
+            stdin=subprocess.PIPE,
+            stdout=self.fileobj,
+        )
+        self._writer = self._process.stdin
+
+    def write(self, data):
+        if self._writer is None:
+            self._start_frame()
+        self._writer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        """書き込んだ(圧縮前の)バイト数"""
+        return self._position
+
+    def end_frame(self):
+        """現在のフレームを終了し、書き出し先に反映する"""
+        if self._writer is None:
+            return
+        writer, process = self._writer, self._process
+        self._writer = None
+        self._process = None
+        writer.close()
+        if process is not None:
+            returncode = process.wait()
+            if returncode != 0:
+                raise RuntimeError(f'zstd exited with {returncode}')
+        self.fileobj.flush()
+
+    def close(self):
+        self.end_frame()
+
+
+@contextmanager
+def open_tar_zst(path, level=3, threads=0):
+    """
+    tar.zst をストリーミングで書き出す tarfile.TarFile を返す。
+
+    tar.fileobj は ZstdFrameWriter で、メンバーごとに set_level() で圧縮レベルを変更できる。
+
+    :param level: zstdの圧縮レベル
+    :param threads: 圧縮スレッド数。0 の場合は論理CPU数
+    """
+    with open(path, 'wb') as f:
+        writer = ZstdFrameWriter(f, level=level, threads=threads)
+        try:
+            # 'w' は書き込みのみで seek しないため、圧縮ストリームにそのまま書き出せる
+            with tarfile.open(fileobj=writer, mode='w') as tar:
+                yield tar
+        finally:
+            writer.close()
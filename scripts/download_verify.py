@@ -0,0 +1,211 @@
+# ダウンロードしたファイルを検証するためのユーティリティ関数群
+#
+# ファイルは固定サイズのチャンクごとに読み込んでハッシュを計算し、ZIPファイルはメンバーを展開せずに
+# セントラルディレクトリのサイズ・CRC32とアップロード元のファイル(フィクスチャ)を比較するため、
+# 数GBのアーカイブでもメモリ使用量は一定である:
+#
+#   from scripts import download_verify
+#
+#   async with page.expect_download() as download_info:
+#       await page.locator('...').click()
+#   downloaded = await download_verify.save_download(await download_info.value, download_dir)
+#   download_verify.verify_zip(downloaded.path, {
+#       f'{yyyymmdd}_フォルダ1/{yyyymmdd}_アップロードテスト_1kB.txt': os.path.join(work_dir, filename),
+#   })
+
+import hashlib
+import os
+import zipfile
+import zlib
+from dataclasses import dataclass
+
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_ALGORITHM = 'sha256'
+
+# ファイル形式ごとの先頭のバイト列
+MAGIC_NUMBERS = {
+    'pdf': b'%PDF-',
+    'zip': b'PK\x03\x04',
+}
+
+
+class DownloadVerificationError(AssertionError):
+    """ダウンロードしたファイルが期待した内容と一致しない"""
+
+
+@dataclass
+class DownloadedFile:
+    """
+    検証済みのダウンロードファイル。
+
+    path: 保存先のパス
+    size: サイズ(バイト)
+    digest: ハッシュ値(16進数)
+    algorithm: ハッシュのアルゴリズム
+    """
+    path: str
+    size: int
+    digest: str
+    algorithm: str = DEFAULT_ALGORITHM
+
+
+@dataclass
+class ZipMember:
+    """ZIPファイルのメンバー(セントラルディレクトリの情報)"""
+    name: str
+    size: int
+    crc: int
+    compressed_size: int
+
+
+def _iter_chunks(f, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM, chunk_size=CHUNK_SIZE):
+    """ファイルをチャンクごとに読み込んで (ハッシュ値, サイズ) を返す"""
+    digest = hashlib.new(algorithm)
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in _iter_chunks(f, chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def crc32_file(path, chunk_size=CHUNK_SIZE):
+    """ファイルをチャンクごとに読み込んで (CRC32, サイズ) を返す"""
+    crc = 0
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in _iter_chunks(f, chunk_size):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return crc, size
+
+
+async def save_download(download, dest, algorithm=DEFAULT_ALGORITHM):
+    """
+    PlaywrightのDownloadを保存し、ハッシュ値を計算する。
+
+    :param download: page.expect_download() で得られたDownload
+    :param dest: 保存先のディレクトリ(存在しない場合は作成する)、またはファイルのパス
+    :return: DownloadedFile
+    :raises DownloadVerificationError: ダウンロードに失敗した場合
+    """
+    if os.path.isdir(dest) or dest.endswith(os.sep):
+        path = os.path.join(dest, download.suggested_filename)
+    else:
+        path = dest
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    await download.save_as(path)
+    failure = await download.failure()
+    if failure is not None:
+        raise DownloadVerificationError(f'Download failed: {download.suggested_filename}: {failure}')
+    digest, size = hash_file(path, algorithm=algorithm)
+    print(f'Downloaded: {path} ({size} bytes, {algorithm}:{digest})')
+    return DownloadedFile(path=path, size=size, digest=digest, algorithm=algorithm)
+
+
+def verify_file(path, source=None, digest=None, algorithm=DEFAULT_ALGORITHM, min_size=1, file_type=None):
+    """
+    ダウンロードしたファイルを検証する。
+
+    :param path: 検証するファイル(または DownloadedFile)
+    :param source: 内容が一致すべきアップロード元のファイル
+    :param digest: 期待するハッシュ値
+    :param min_size: 最小のサイズ(バイト)
+    :param file_type: 先頭のバイト列を確認するファイル形式('pdf', 'zip')
+    :return: DownloadedFile
+    :raises DownloadVerificationError: 検証に失敗した場合
+    """
+    if isinstance(path, DownloadedFile):
+        path = path.path
+    actual, size = hash_file(path, algorithm=algorithm)
+    if min_size is not None and size < min_size:
+        raise DownloadVerificationError(f'{path}: {size} bytes is smaller than {min_size} bytes')
+    if file_type is not None:
+        magic = MAGIC_NUMBERS[file_type]
+        with open(path, 'rb') as f:
+            head = f.read(len(magic))
+        if head != magic:
+            raise DownloadVerificationError(f'{path}: not a {file_type} file (starts with {head!r})')
+    if source is not None:
+        source_digest, source_size = hash_file(source, algorithm=algorithm)
+        if source_size != size:
+            raise DownloadVerificationError(f'{path}: {size} bytes, but {source} has {source_size} bytes')
+        if actual != source_digest:
+            raise DownloadVerificationError(f'{path}: {algorithm} mismatch with {source}: {actual} != {source_digest}')
+    if digest is not None and actual != digest:
+        raise DownloadVerificationError(f'{path}: {algorithm} mismatch: {actual} != {digest}')
+    return DownloadedFile(path=path, size=size, digest=actual, algorithm=algorithm)
+
+
+def list_zip(path, ignore_dirs=False):
+    """ZIPファイルを展開せずに、メンバーのリストを格納順に返す。ignore_dirs の場合はディレクトリを除く"""
+    with zipfile.ZipFile(path, 'r') as zf:
+        return [
+            ZipMember(name=info.filename, size=info.file_size, crc=info.CRC, compressed_size=info.compress_size)
+            for info in zf.infolist()
+            if not (ignore_dirs and info.is_dir())
+        ]
+
+
+def test_zip(path, chunk_size=CHUNK_SIZE):
+    """
+    ZIPファイルの各メンバーを展開せずにチャンクごとに読み込み、CRC32を検証する。
+
+    :raises DownloadVerificationError: 破損したメンバーがある場合
+    """
+    with zipfile.ZipFile(path, 'r') as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            try:
+                # ZipExtFile はメンバーの末尾まで読み込んだ時点でCRC32を検証する
+                with zf.open(info, 'r') as f:
+                    for _ in _iter_chunks(f, chunk_size):
+                        pass
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                raise DownloadVerificationError(f'{path}: {info.filename} is corrupted: {e}') from e
+
+
+def verify_zip(path, expected, test=True, ignore_dirs=False):
+    """
+    ZIPファイルのメンバーを、アップロード元のファイルのサイズ・CRC32と比較する。
+
+    :param path: 検証するZIPファイル(または DownloadedFile)
+    :param expected: メンバー名 -> アップロード元のファイルのパス。ZIPのメンバー(ディレクトリを含む)と、
+                     格納順も含めて一致する必要がある。パスが None の場合はメンバーが存在することのみ確認する
+    :param test: メンバーを読み込んでCRC32を検証するか
+    :param ignore_dirs: ディレクトリのメンバーを比較の対象から除くか
+    :return: ZipMember のリスト
+    :raises DownloadVerificationError: メンバーの構成または内容が一致しない場合
+    """
+    if isinstance(path, DownloadedFile):
+        path = path.path
+    try:
+        members = list_zip(path, ignore_dirs=ignore_dirs)
+    except zipfile.BadZipFile as e:
+        raise DownloadVerificationError(f'{path}: not a valid ZIP file: {e}') from e
+    names = [member.name for member in members]
+    if names != list(expected.keys()):
+        raise DownloadVerificationError(f'{path}: unexpected members: {names} != {list(expected.keys())}')
+    for member in members:
+        source = expected[member.name]
+        if source is None:
+            continue
+        crc, size = crc32_file(source)
+        if member.size != size:
+            raise DownloadVerificationError(f'{path}: {member.name} has {member.size} bytes, but {source} has {size} bytes')
+        if member.crc != crc:
+            raise DownloadVerificationError(f'{path}: {member.name} CRC32 {member.crc:08x} != {crc:08x} ({source})')
+    if test:
+        test_zip(path)
+    print(f'Verified: {path} ({len(members)} members)')
+    return members
@@ -0,0 +1,310 @@
+# テスト実行の進行状況をイベントとして記録・表示するためのユーティリティ関数群
+#
+# 環境変数 GRDM_EVENT_LOG にファイルパスが指定されている場合、emit() はイベントを1行のJSONとして追記する。
+# run_tests.py は結果ディレクトリの events.jsonl を指定し、カーネル(子Notebookを含む)からのイベントを
+# ProgressReporter で読み取って、進行状況と過去の実行結果から求めた残り時間を表示する。
+#
+#   tail -f result/result-20250101-000000/events.jsonl
+#
+# イベントの種類:
+#
+#   run_started / run_finished              テスト実行全体の開始・終了
+#   notebook_started / notebook_finished    Notebook(子Notebookを含む)の開始・終了
+#   notebook_skipped                        前提条件の失敗によりスキップしたNotebook
+#   step_started / step_passed / step_failed  run_pw のステップの開始・成功・失敗
+#   artifact                                スクリーンショット・動画・HARなどの保存
+
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+EVENT_LOG_ENV = 'GRDM_EVENT_LOG'
+
+DEFAULT_PROGRESS_INTERVAL = 30.0
+
+# 過去の所要時間に対してこの倍率を超えて実行中のステップを「遅い」と表示する
+SLOW_STEP_FACTOR = 2.0
+SLOW_STEP_MIN_SECONDS = 30.0
+
+_header_pattern = re.compile(r'#+\s+(\S.*)$')
+_shard_suffix_pattern = re.compile(r'-shard\d+of\d+$')
+
+
+def emit(event, **fields):
+    """イベントをイベントログに追記する。GRDM_EVENT_LOG が指定されていない場合は何もしない"""
+    path = os.environ.get(EVENT_LOG_ENV)
+    if not path:
+        return
+    record = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'ts': time.time(),
+        'event': event,
+        'pid': os.getpid(),
+    }
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+    # 複数のカーネルから追記されるため、1行を1回の write で書き込む
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+    except OSError:
+        traceback.print_exc()
+
+
+def current_cell():
+    """実行中のセルの実行番号を返す。IPythonの外では None"""
+    if 'IPython' not in sys.modules:
+        return None
+    from IPython import get_ipython
+    shell = get_ipython()
+    return getattr(shell, 'execution_count', None) if shell is not None else None
+
+
+def _read_steps(notebook_path):
+    """実行済みNotebookのコードセルごとの (実行番号, 見出し, 所要時間) のリストを返す"""
+    with open(notebook_path, 'r') as f:
+        notebook = json.load(f)
+    steps = []
+    header = None
+    for cell in notebook['cells']:
+        source = cell['source'] if isinstance(cell['source'], str) else ''.join(cell['source'])
+        if cell['cell_type'] == 'markdown':
+            for line in source.split('\n'):
+                m = _header_pattern.match(line.strip())
+                if m:
+                    header = m.group(1)
+            continue
+        if cell['cell_type'] != 'code' or cell.get('execution_count') is None:
+            continue
+        duration = cell.get('metadata', {}).get('papermill', {}).get('duration')
+        steps.append((cell['execution_count'], header, duration or 0))
+    return steps
+
+
+def load_step_history(history_root):
+    """
+    history_root 以下の過去の結果ツリー(result-*)から、Notebookごとのステップの所要時間を収集する。
+
+    キーは run_tests.load_duration_history と同じく、結果IDと '<結果ID>/<子Notebookの結果ID>'。新しい結果ツリーが優先される。
+    """
+    history = {}
+    for tree in sorted(glob.glob(os.path.join(history_root, 'result-*'))):
+        if not os.path.isdir(tree):
+            continue
+        for notebook_path in glob.glob(os.path.join(tree, '*.ipynb')):
+            stem = os.path.splitext(os.path.basename(notebook_path))[0]
+            result_id = _shard_suffix_pattern.sub('', stem)
+            paths = [(result_id, notebook_path)] if result_id == stem else []
+            for sub_notebook_path in glob.glob(os.path.join(tree, stem, 'notebooks', '*.ipynb')):
+                sub_id = os.path.splitext(os.path.basename(sub_notebook_path))[0]
+                paths.append((f'{result_id}/{sub_id}', sub_notebook_path))
+            for key, path in paths:
+                try:
+                    history[key] = _read_steps(path)
+                except (OSError, ValueError, KeyError):
+                    continue
+    return history
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+    return str(timedelta(seconds=int(seconds)))
+
+
+class ProgressReporter:
+    """
+    イベントログを読み取り、進行状況と残り時間を表示する。
+
+    :param path: イベントログのパス
+    :param planned: 実行予定のNotebookの結果IDのリスト
+    :param estimates: 結果ID -> 過去の所要時間(秒)。不明な場合は None
+    :param step_history: load_step_history の結果
+    :param interval: 進行状況を表示する間隔(秒)
+    """
+
+    def __init__(self, path, planned, estimates, step_history, interval=DEFAULT_PROGRESS_INTERVAL, out=None):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.planned = planned
+        self.estimates = estimates
+        self.step_history = step_history
+        self.interval = interval
+        self.out = out or sys.stdout
+        self.started = time.time()
+        self.finished = set()
+        # 実行中のNotebook: (結果ID, 開始時刻)
+        self.current = None
+        # 実行中の子Notebookまたはステップのキー -> 状態
+        self.current_sub = None
+        self.current_step = None
+        self.failed_steps = 0
+        self._offset = 0
+        self._buffer = ''
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_printed = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='progress-reporter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.poll()
+
+    def _run(self):
+        while not self._stop_event.wait(1.0):
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+
+    def poll(self):
+        """イベントログの新しい行を読み取り、必要に応じて進行状況を表示する"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(self._offset)
+            data = f.read()
+            self._offset = f.tell()
+        self._buffer += data
+        lines = self._buffer.split('\n')
+        self._buffer = lines[-1]
+        important = False
+        for line in lines[:-1]:
+            if not line.strip():
+                continue
+            try:
+                important = self.handle(json.loads(line)) or important
+            except ValueError:
+                continue
+        if important or time.time() - self._last_printed >= self.interval:
+            self.print_progress()
+
+    def _unit_of(self, result_path):
+        """イベントの結果パスから、ステップ履歴のキー(結果IDまたは結果ID/子Notebook)を求める"""
+        if not result_path:
+            return None
+        rel = os.path.relpath(os.path.abspath(result_path), self.base_dir)
+        parts = rel.split(os.sep)
+        if parts[0] == '..':
+            return None
+        key = _shard_suffix_pattern.sub('', parts[0])
+        if len(parts) >= 3 and parts[1] == 'notebooks':
+            key += '/' + parts[2]
+        return key
+
+    def _is_planned(self, event):
+        """run_tests.py が直接実行するNotebookのイベントかどうか"""
+        if event.get('result_id') not in self.planned or not event.get('result_path'):
+            return False
+        return os.path.dirname(os.path.abspath(event['result_path'])) == self.base_dir
+
+    def handle(self, event):
+        """イベントを反映する。すぐに表示すべきイベントの場合は True を返す"""
+        kind = event.get('event')
+        ts = event.get('ts', time.time())
+        if kind == 'notebook_started' and self._is_planned(event):
+            self.current = (event['result_id'], ts)
+            self.current_sub = None
+            self.current_step = None
+            return True
+        if kind in ('notebook_finished', 'notebook_skipped') and self._is_planned(event):
+            self.finished.add(event['result_id'])
+            self.current = None
+            self.current_sub = None
+            self.current_step = None
+            return True
+        if kind == 'notebook_started':
+            self.current_sub = (self._unit_of(event.get('result_path')), ts)
+            self.current_step = None
+            return False
+        if kind == 'step_started':
+            self.current_step = {
+                'unit': self._unit_of(event.get('result_path')),
+                'cell': event.get('cell'),
+                'step': event.get('step'),
+                'started': ts,
+            }
+            return False
+        if kind in ('step_passed', 'step_failed'):
+            self.current_step = None
+            if kind == 'step_failed':
+                self.failed_steps += 1
+                return True
+        return False
+
+    def _step_info(self, unit, cell):
+        """過去の実行における、ステップの見出し・所要時間と、それ以降のステップの所要時間の合計"""
+        steps = self.step_history.get(unit)
+        if not steps or cell is None:
+            return None, None, None
+        for i, (execution_count, header, duration) in enumerate(steps):
+            if execution_count == cell:
+                return header, duration, sum(d for _, _, d in steps[i + 1:])
+        return None, None, None
+
+    def eta(self, now=None):
+        """残り時間(秒)の推定値。過去の所要時間が不明なNotebookは含まない"""
+        now = now or time.time()
+        remaining = 0.0
+        for result_id in self.planned:
+            if result_id in self.finished:
+                continue
+            estimate = self.estimates.get(result_id)
+            if self.current is not None and result_id == self.current[0]:
+                elapsed = now - self.current[1]
+                current_remaining = max(estimate - elapsed, 0.0) if estimate is not None else 0.0
+                if self.current_step is not None:
+                    # 実行中のNotebookについては、ステップ単位の履歴による推定値と比べて大きい方を使う
+                    _, duration, after = self._step_info(self.current_step['unit'], self.current_step['cell'])
+                    if after is not None:
+                        step_elapsed = now - self.current_step['started']
+                        current_remaining = max(current_remaining, after + max((duration or 0) - step_elapsed, 0.0))
+                remaining += current_remaining
+                continue
+            remaining += estimate or 0.0
+        return remaining
+
+    def progress_line(self, now=None):
+        now = now or time.time()
+        done = len(self.finished)
+        parts = [f'[progress] {done}/{len(self.planned)} notebooks']
+        if self.current is not None:
+            location = self.current[0]
+            if self.current_sub is not None and self.current_sub[0] and '/' in self.current_sub[0]:
+                location += ' > ' + self.current_sub[0].split('/', 1)[1]
+            if self.current_step is not None:
+                header, duration, _ = self._step_info(self.current_step['unit'], self.current_step['cell'])
+                step_elapsed = now - self.current_step['started']
+                label = header or f"cell {self.current_step['cell']}"
+                location += f': {label} ({step_elapsed:.0f}s)'
+                if duration is not None and step_elapsed > max(duration * SLOW_STEP_FACTOR, SLOW_STEP_MIN_SECONDS):
+                    location += f' SLOW (usually {duration:.0f}s)'
+            parts.append(location)
+        if self.failed_steps > 0:
+            parts.append(f'{self.failed_steps} failed step(s)')
+        parts.append(f'elapsed {format_duration(now - self.started)}')
+        if any(estimate is not None for estimate in self.estimates.values()):
+            remaining = self.eta(now)
+            finish = datetime.fromtimestamp(now + remaining).strftime('%H:%M')
+            parts.append(f'ETA {format_duration(remaining)} (~{finish})')
+        return ' | '.join(parts)
+
+    def print_progress(self):
+        self._last_printed = time.time()
+        print(self.progress_line(), file=self.out, flush=True)
@@ -4,10 +4,11 @@ import asyncio
 import base64
 import os
 import re
-import time
 import traceback
 from playwright.async_api import expect
 
+from scripts import selector_profile
+
 
 async def login_cas(page, username, password):
     # find_element_by_xpath_with_retry(driver, '').send_keys(username)
@@ -90,7 +91,7 @@ async def login(page, idp_name, idp_username, idp_password, transition_timeout=3
         # IdPが要素として作成されることを確認
         locator = page.locator(f'//*[@class = "list_idp" and text() = "{idp_name}"]')
         await expect(locator).to_be_visible(timeout=transition_timeout)
-        time.sleep(5)
+        await asyncio.sleep(5)
         await locator.click()
 
         # 選択ボタンが有効になったことを確認
@@ -185,7 +186,7 @@ async def ensure_project_exists(page, project_name, transition_timeout=30000):
 
         # プロジェクト名フィールドが表示される
         await expect(page.locator('//input[contains(@class, "project-name")]')).to_be_editable(timeout=transition_timeout)
-        time.sleep(1)
+        await asyncio.sleep(1)
 
         # プロジェクト名を入力
         await page.locator('//input[contains(@class, "project-name")]').fill(project_name)
@@ -216,7 +217,7 @@ async def delete_project(page, transition_timeout=30000):
     confirmation = await confirmation_label.text_content()
     print(confirmation)
 
-    time.sleep(1)
+    await asyncio.sleep(1)
     confirmation_input = page.locator('//*[@data-bind = "editableHTML: {observable: confirmInput, onUpdate: handleEditableUpdate}"]')
     await confirmation_input.fill(confirmation)
 
@@ -224,26 +225,84 @@ async def delete_project(page, transition_timeout=30000):
     await expect(delete_button).to_be_visible()
     await delete_button.click()
 
+# ファイル一覧(Treebeard)の要素を特定するロケータの方式
+# - xpath: ページ全体に対してXPathを評価する(既定)
+# - scoped: #tb-tbody 内の行をCSSで絞り込み、行の中の要素をCSSとテキストの擬似クラスで特定する
+LOCATOR_STRATEGIES = ('xpath', 'scoped')
+locator_strategy = os.environ.get('GRDM_LOCATOR_STRATEGY', 'xpath')
+
+_TB_ROW = '#tb-tbody .tb-row'
+
+def _css_string(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _css_title_is(name):
+    return f'.title-text :text-is({_css_string(name)})'
+
+def _css_title_starts_with(provider):
+    return f'.title-text :text-matches({_css_string("^" + re.escape(provider))})'
+
+def _css_folder_toggle(name, expanded=False, collapsed=False):
+    selector = f'{_TB_ROW}:has({_css_title_is(name)}) .tb-td-first .tb-toggle-icon'
+    if expanded:
+        return f'{selector} i.fa-minus'
+    if collapsed:
+        return f'{selector} i.fa-plus'
+    return selector
+
+# scoped方式のCSSセレクタ。Treebeardの行には data-test 属性がないため、クラスとスタイルで行を絞り込み、
+# 行の中のタイトルのテキストで要素を特定する。
+# folder_droppable, folder_draggable, file_draggable はタイトルから祖先の要素をたどる必要があり、
+# CSSでは同じ要素を指定できないため、scoped方式でもXPathを使う
+_TB_ROW_CSS = {
+    'storage_title': lambda provider: f'{_TB_ROW}:has([style*="/static/addons/"]) {_css_title_starts_with(provider)}',
+    'expanded_storage_title': lambda provider: (
+        f'{_TB_ROW}:has(.fa-minus):has([style*="/static/addons/"]) {_css_title_starts_with(provider)}'
+    ),
+    'folder_title': lambda name: f'{_TB_ROW}:has(.tb-expand-icon-holder i.fa-folder) {_css_title_is(name)}',
+    'folder_toggle': _css_folder_toggle,
+    'file_title': lambda name: f'{_TB_ROW}:has(.tb-expand-icon-holder .file-extension) {_css_title_is(name)}',
+    'file_extension': lambda name: f'{_TB_ROW}:has({_css_title_is(name)}) .tb-td-first .file-extension',
+}
+
+def get_select_locator(page, kind, *args, strategy=None, **kwargs):
+    """
+    get_select_{kind}_xpath に対応するロケータを、指定された方式(省略時は locator_strategy)で生成する。
+
+    scoped方式では、行をCSSで絞り込んだ上で、行の中の要素をCSSとテキスト(:text-is, :text-matches)で特定する。
+    テキストの比較は要素のテキスト全体に対して行うため、XPathの text() との一致数は selector_profile で確認する。
+    祖先の要素をたどる種類(_TB_ROW_CSS にないもの)は、scoped方式でもXPathで特定する。
+    """
+    strategy = strategy or locator_strategy
+    if strategy not in LOCATOR_STRATEGIES:
+        raise ValueError(f'Unknown locator strategy: {strategy}')
+    if strategy == 'scoped' and kind in _TB_ROW_CSS:
+        locator = page.locator(_TB_ROW_CSS[kind](*args, **kwargs))
+    else:
+        locator = page.locator(globals()[f'get_select_{kind}_xpath'](*args, **kwargs))
+    selector_profile.record(page, kind, args, kwargs, strategy, locator)
+    return locator
+
 def get_select_storage_title_locator(page, provider):
-    return page.locator(get_select_storage_title_xpath(provider))
+    return get_select_locator(page, 'storage_title', provider)
 
 def get_select_storage_title_xpath(provider):
     return f'//*[contains(@class, "tb-td-first")]//*[contains(@style, "/static/addons/")]/../../following-sibling::*[contains(@class, "title-text")]//*[starts-with(text(), "{provider}")]'
 
 def get_select_expanded_storage_title_locator(page, provider):
-    return page.locator(get_select_expanded_storage_title_xpath(provider))
+    return get_select_locator(page, 'expanded_storage_title', provider)
 
 def get_select_expanded_storage_title_xpath(provider):
     return f'//*[contains(@class, "fa-minus")]/../..//*[contains(@style, "/static/addons/")]/../../following-sibling::*[contains(@class, "title-text")]//*[starts-with(text(), "{provider}")]'
 
 def get_select_folder_title_locator(page, provider):
-    return page.locator(get_select_folder_title_xpath(provider))
+    return get_select_locator(page, 'folder_title', provider)
 
 def get_select_folder_title_xpath(name):
     return f'//*[contains(@class, "tb-expand-icon-holder")]//i[contains(@class, "fa-folder")]/../../following-sibling::*[contains(@class, "title-text")]//*[text() = "{name}"]'
 
 def get_select_folder_toggle_locator(page, provider, expanded=False, collapsed=False):
-    return page.locator(get_select_folder_toggle_xpath(provider, expanded=expanded, collapsed=collapsed))
+    return get_select_locator(page, 'folder_toggle', provider, expanded=expanded, collapsed=collapsed)
 
 def get_select_folder_toggle_xpath(name, expanded=False, collapsed=False):
     base_xpath = f'//*[contains(@class, "title-text")]//*[text() = "{name}"]/../preceding-sibling::*[contains(@class, "tb-td-first")]//*[contains(@class, "tb-toggle-icon")]'
@@ -254,31 +313,31 @@ def get_select_folder_toggle_xpath(name, expanded=False, collapsed=False):
     return base_xpath
 
 def get_select_folder_droppable_locator(page, provider):
-    return page.locator(get_select_folder_droppable_xpath(provider))
+    return get_select_locator(page, 'folder_droppable', provider)
 
 def get_select_folder_droppable_xpath(name):
     return f'//*[contains(@class, "tb-expand-icon-holder")]//i[contains(@class, "fa-folder")]/../../following-sibling::*[contains(@class, "title-text")]//*[text() = "{name}"]/../../..'
 
 def get_select_folder_draggable_locator(page, provider):
-    return page.locator(get_select_folder_draggable_xpath(provider))
+    return get_select_locator(page, 'folder_draggable', provider)
 
 def get_select_folder_draggable_xpath(name):
     return f'//*[contains(@class, "tb-expand-icon-holder")]//i[contains(@class, "fa-folder")]/../../following-sibling::*[contains(@class, "title-text")]//*[text() = "{name}"]/../..'
 
 def get_select_file_title_locator(page, provider):
-    return page.locator(get_select_file_title_xpath(provider))
+    return get_select_locator(page, 'file_title', provider)
 
 def get_select_file_title_xpath(name):
     return f'//*[contains(@class, "tb-expand-icon-holder")]//*[contains(@class, "file-extension")]/../../following-sibling::*[contains(@class, "title-text")]//*[text() = "{name}"]'
 
 def get_select_file_extension_locator(page, provider):
-    return page.locator(get_select_file_extension_xpath(provider))
+    return get_select_locator(page, 'file_extension', provider)
 
 def get_select_file_extension_xpath(name):
     return f'//*[contains(@class, "title-text")]//*[text() = "{name}"]/../preceding-sibling::*[contains(@class, "tb-td-first")]//*[contains(@class, "file-extension")]'
 
 def get_select_file_draggable_locator(page, provider):
-    return page.locator(get_select_file_draggable_xpath(provider))
+    return get_select_locator(page, 'file_draggable', provider)
 
 def get_select_file_draggable_xpath(name):
     return f'//*[contains(@class, "tb-expand-icon-holder")]//*[contains(@class, "file-extension")]/../../following-sibling::*[contains(@class, "title-text")]//*[text() = "{name}"]/../..'
@@ -297,6 +356,13 @@ async def upload_file(page, path):
     await page.locator('//i[contains(@class, "fa-upload")]/../*[text() = "アップロード"]').click()
     await page.set_input_files('//input[@type = "file" and @class = "dz-hidden-input"]', path)
 
+def expect_upload_response(page, timeout=30000):
+    # アップロード(WaterButlerへのPUT)の応答を待つ。page.expect_response と同様に async with で使う
+    return page.expect_response(
+        lambda response: response.request.method == 'PUT' and '/v1/resources/' in response.url,
+        timeout=timeout,
+    )
+
 async def upload_folder(page, path):
     # フォルダのアップロード ボタンを使ってファイルをアップロード
     await page.locator('//i[contains(@class, "fa-plus")]/../*[text() = "フォルダのアップロード"]').click()
@@ -0,0 +1,137 @@
+# scripts パッケージの各モジュールの読み込み時間を計測し、予算を超えていないか確認する
+#
+# 各モジュールを新しいPythonプロセスで python -X importtime により読み込み、累積の読み込み時間の中央値を求める。
+# 読み込み時に重い依存モジュール(pandas, openpyxl, nbformat, IPython など)が読み込まれた場合や、
+# 読み込み時間が予算を超えた場合は終了コード1で終了する:
+#
+#   python -m scripts.import_benchmark
+#   python -m scripts.import_benchmark --module scripts.stat --budget-ms 100 --repeat 10
+
+import argparse
+import importlib
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# モジュール -> 読み込み時間の予算(ミリ秒)。Playwrightを読み込むモジュールはその分を含む
+DEFAULT_BUDGETS_MS = {
+    'scripts': 50,
+    'scripts.stat': 100,
+    'scripts.workbook': 100,
+    'scripts.resultAnalyzer': 100,
+    'scripts.workspace': 100,
+    'scripts.resource_sampler': 100,
+    'scripts.static_cache': 100,
+    'scripts.selector_profile': 100,
+    'scripts.artifacts': 100,
+    'scripts.package_results': 100,
+    'scripts.screenshots': 100,
+    'scripts.download_verify': 100,
+    'scripts.transfer_benchmark': 100,
+    'scripts.project_pool': 100,
+    'scripts.janitor': 100,
+    'scripts.s3_fixtures': 100,
+    'scripts.admin_benchmark': 100,
+    'scripts.grdm': 1000,
+    'scripts.playwright': 1000,
+}
+
+# 読み込み時に読み込まれてはならない重い依存モジュール
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'nbformat', 'IPython', 'matplotlib', 'papermill']
+
+# python -X importtime の出力: "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def measure_import(module, repeat=5):
+    """
+    モジュールを新しいプロセスで読み込み、累積の読み込み時間(ミリ秒)のリストと、読み込まれたモジュールの集合を返す。
+    """
+    durations = []
+    imported = set()
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f'Failed to import {module}:\n{result.stderr}')
+        cumulative = None
+        for line in result.stderr.splitlines():
+            m = _IMPORTTIME_PATTERN.match(line)
+            if m is None:
+                continue
+            imported.add(m.group(4))
+            if m.group(4) == module:
+                cumulative = int(m.group(2))
+        if cumulative is None:
+            raise RuntimeError(f'No import time was reported for {module}')
+        durations.append(cumulative / 1000)
+    return durations, imported
+
+
+def measure_reload(module, repeat=100):
+    """変更されていないモジュールの scripts.reload に要する時間(ミリ秒)の中央値を返す"""
+    import scripts
+    target = importlib.import_module(module)
+    scripts.reload(target)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scripts.reload(target)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure import time of the scripts package and check it against the startup budget'
+    )
+    parser.add_argument('--module', action='append', default=[],
+                        help='Module to measure (default: all modules with a budget)')
+    parser.add_argument('--budget-ms', type=float, help='Budget in milliseconds for all measured modules')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measurements per module')
+    parser.add_argument('--skip-missing', action='store_true',
+                        help='Skip modules whose dependencies (e.g. playwright) are not installed')
+    args = parser.parse_args()
+
+    modules = args.module or list(DEFAULT_BUDGETS_MS.keys())
+    failed = False
+    print('\t'.join(['module', 'p50_ms', 'max_ms', 'budget_ms', 'reload_ms', 'heavy_imports', 'status']))
+    for module in modules:
+        budget = args.budget_ms if args.budget_ms is not None else DEFAULT_BUDGETS_MS.get(module)
+        try:
+            durations, imported = measure_import(module, repeat=args.repeat)
+        except RuntimeError as e:
+            if args.skip_missing and 'ModuleNotFoundError' in str(e):
+                print('\t'.join([module, '-', '-', str(budget), '-', '-', 'SKIPPED']))
+                continue
+            raise
+        heavy = sorted(name for name in imported if name in HEAVY_MODULES)
+        p50 = statistics.median(durations)
+        reload_ms = measure_reload(module) if module != 'scripts' else None
+        status = 'OK'
+        if len(heavy) > 0:
+            status = 'HEAVY_IMPORT'
+        elif budget is not None and p50 > budget:
+            status = 'OVER_BUDGET'
+        failed = failed or status != 'OK'
+        print('\t'.join([
+            module,
+            f'{p50:.1f}',
+            f'{max(durations):.1f}',
+            str(budget),
+            f'{reload_ms:.3f}' if reload_ms is not None else '-',
+            ','.join(heavy) or '-',
+            status,
+        ]))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
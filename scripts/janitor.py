@@ -0,0 +1,278 @@
+# 異常終了した実行が残したテスト用のプロジェクトとストレージのオブジェクトを一括で削除する
+#
+# run_tests.py と同じ設定ファイルを使い、以下を並行して削除する:
+#
+# - RDM APIで、タイトルがテストのプロジェクト名(TEST-S3-YYYYMMDD-HHMMSS-dashboard, TEST-NIISTORAGE-..., TEST-LOADTEST-... など)
+#   に一致するプロジェクトを検索し、ワーカー数を制限したスレッドプールで削除する。プロジェクトプール(TEST-POOL-...)は対象外
+# - S3・S3互換ストレージのテスト用バケット(<storage_id>_test_bucket_name_N)から、テストがアップロードした
+#   オブジェクト(YYYYMMDD_ で始まるキー)を DeleteObjects で最大1000件ずつ削除する
+#
+# 実行中のテストのものを削除しないよう、作成から --min-age-hours 時間以上経過したもののみを対象とする:
+#
+#   python -m scripts.janitor ci.config.yaml --dry-run
+#   python -m scripts.janitor ci.config.yaml --min-age-hours 6 --workers 8
+#
+# プロジェクトの削除には rdm_token(パーソナルアクセストークン)が、オブジェクトの削除には boto3 が必要。
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from scripts import api, project_pool
+
+# テストが作成するプロジェクトのタイトル: TEST-[<構成>-]YYYYMMDD-HHMMSS[-<接尾辞>]
+DEFAULT_PROJECT_PATTERN = r'^TEST-(?:[A-Z0-9]+-)?\d{8}-\d{6}(?:-.*)?$'
+# テストがバケットにアップロードするオブジェクトのキー(先頭のパスの要素が YYYYMMDD_ で始まる)
+DEFAULT_KEY_PATTERNS = ['[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_*']
+DEFAULT_MIN_AGE_HOURS = 6
+DEFAULT_WORKERS = 8
+# DeleteObjects で1回に削除できるオブジェクトの最大数
+DELETE_BATCH_SIZE = 1000
+STORAGE_IDS = ['s3', 's3compat']
+
+_MB = 1024 * 1024
+
+
+def _parse_api_datetime(value):
+    """APIの日時(例: 2024-01-01T00:00:00.123456、UTC)を aware な datetime に変換する"""
+    parsed = datetime.fromisoformat(value.rstrip('Z'))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def find_projects(client, pattern=DEFAULT_PROJECT_PATTERN, min_age=timedelta(hours=DEFAULT_MIN_AGE_HOURS)):
+    """削除の対象となるプロジェクトを返す"""
+    regex = re.compile(pattern)
+    threshold = datetime.now(timezone.utc) - min_age
+    projects = []
+    for project in client.list_projects(title='TEST-'):
+        attributes = project['attributes']
+        title = attributes['title']
+        if title.startswith(project_pool.POOL_PREFIX + '-') or not regex.match(title):
+            continue
+        created = attributes.get('date_created')
+        if created and _parse_api_datetime(created) > threshold:
+            continue
+        projects.append(project)
+    return projects
+
+
+def delete_projects(client, projects, workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    プロジェクトを並行して削除する。
+
+    :return: {'deleted': [タイトル], 'failed': [(タイトル, エラー)]}
+    """
+    result = {'deleted': [], 'failed': []}
+    if dry_run:
+        result['deleted'] = [project['attributes']['title'] for project in projects]
+        return result
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(client.delete_project, project['id']): project for project in projects}
+        for future in as_completed(futures):
+            title = futures[future]['attributes']['title']
+            try:
+                future.result()
+                result['deleted'].append(title)
+            except Exception as e:
+                result['failed'].append((title, f'{type(e).__name__}: {e}'.split('\n')[0]))
+    result['deleted'].sort()
+    return result
+
+
+def bucket_configs(config):
+    """設定ファイルから (ストレージID, バケット名, boto3.client の引数) のリストを作成する。同じバケットは1度だけ返す"""
+    buckets = []
+    seen = set()
+    for storage_id in STORAGE_IDS:
+        for n in (1, 2):
+            bucket = config.get(f'{storage_id}_test_bucket_name_{n}')
+            access_key = config.get(f'{storage_id}_access_key_{n}')
+            if not bucket or not access_key:
+                continue
+            endpoint_url = config.get(f'{storage_id}_endpoint_url_{n}')
+            if storage_id != 's3' and endpoint_url is None:
+                print(f'{storage_id}_endpoint_url_{n} is not set; skipping bucket {bucket}')
+                continue
+            if (endpoint_url, bucket) in seen:
+                continue
+            seen.add((endpoint_url, bucket))
+            buckets.append((storage_id, bucket, dict(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=config.get(f'{storage_id}_secret_access_key_{n}'),
+                region_name=config.get(f'{storage_id}_default_region_{n}'),
+                endpoint_url=endpoint_url,
+            )))
+    return buckets
+
+
+def _matches(key, patterns):
+    head = key.split('/', 1)[0]
+    return any(fnmatch.fnmatch(key, pattern) or fnmatch.fnmatch(head, pattern) for pattern in patterns)
+
+
+def purge_bucket(s3, bucket, patterns=None, min_age=timedelta(hours=DEFAULT_MIN_AGE_HOURS),
+                 workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    バケットからキーが patterns に一致するオブジェクトを削除する。
+
+    一覧の取得と並行して、DELETE_BATCH_SIZE 件ごとの DeleteObjects をスレッドプールで実行する。
+
+    :param s3: boto3 のS3クライアント(スレッド間で共有する)
+    :return: {'objects', 'bytes', 'errors'}
+    """
+    patterns = patterns or DEFAULT_KEY_PATTERNS
+    threshold = datetime.now(timezone.utc) - min_age
+    result = {'objects': 0, 'bytes': 0, 'errors': []}
+
+    def _delete(batch):
+        response = s3.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key, _ in batch], 'Quiet': True},
+        )
+        errors = {error['Key']: error.get('Message', error.get('Code')) for error in response.get('Errors', [])}
+        deleted = [(key, size) for key, size in batch if key not in errors]
+        return deleted, list(errors.items())
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+
+        def _flush(batch):
+            if dry_run:
+                result['objects'] += len(batch)
+                result['bytes'] += sum(size for _, size in batch)
+                return
+            futures.append(executor.submit(_delete, batch))
+
+        batch = []
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket):
+            for obj in page.get('Contents', []):
+                if not _matches(obj['Key'], patterns) or obj['LastModified'] > threshold:
+                    continue
+                batch.append((obj['Key'], obj.get('Size', 0)))
+                if len(batch) == DELETE_BATCH_SIZE:
+                    _flush(batch)
+                    batch = []
+        if batch:
+            _flush(batch)
+        for future in futures:
+            try:
+                deleted, errors = future.result()
+            except Exception as e:
+                result['errors'].append(('*', f'{type(e).__name__}: {e}'.split('\n')[0]))
+                continue
+            result['objects'] += len(deleted)
+            result['bytes'] += sum(size for _, size in deleted)
+            result['errors'].extend(errors)
+    return result
+
+
+def purge_buckets(config, patterns=None, min_age=timedelta(hours=DEFAULT_MIN_AGE_HOURS),
+                  workers=DEFAULT_WORKERS, dry_run=False):
+    """設定ファイルのすべてのテスト用バケットを purge_bucket し、バケット名 -> 結果 を返す"""
+    import boto3
+    from botocore.config import Config
+
+    results = {}
+    for storage_id, bucket, client_args in bucket_configs(config):
+        s3 = boto3.client('s3', config=Config(max_pool_connections=workers), **client_args)
+        try:
+            results[f'{storage_id}:{bucket}'] = purge_bucket(
+                s3, bucket, patterns=patterns, min_age=min_age, workers=workers, dry_run=dry_run,
+            )
+        except Exception as e:
+            traceback.print_exc()
+            results[f'{storage_id}:{bucket}'] = {
+                'objects': 0, 'bytes': 0, 'errors': [('*', f'{type(e).__name__}: {e}'.split('\n')[0])],
+            }
+    return results
+
+
+def format_report(project_result, bucket_results, elapsed=None, dry_run=False):
+    verb = 'Would delete' if dry_run else 'Deleted'
+    lines = []
+    if project_result is not None:
+        lines.append(f'{verb} {len(project_result["deleted"])} project(s)')
+        for title in project_result['deleted']:
+            lines.append(f'  {title}')
+        for title, error in project_result['failed']:
+            lines.append(f'  FAILED {title}: {error}')
+    if bucket_results is not None:
+        lines.append('\t'.join(['bucket', 'objects', 'mb', 'errors']))
+        for name, result in bucket_results.items():
+            lines.append('\t'.join([name, str(result['objects']), f'{result["bytes"] / _MB:.1f}', str(len(result['errors']))]))
+            for key, error in result['errors'][:10]:
+                lines.append(f'  FAILED {key}: {error}')
+    if elapsed is not None:
+        lines.append(f'Finished in {elapsed:.1f}s')
+    return '\n'.join(lines)
+
+
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(
+        description='Delete leftover TEST-* projects and uploaded test objects in the S3 test buckets'
+    )
+    parser.add_argument('config', help='Path to configuration YAML file (same format as run_tests.py)')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be deleted without deleting it')
+    parser.add_argument('--min-age-hours', type=float, default=DEFAULT_MIN_AGE_HOURS,
+                        help='Only delete projects and objects older than this (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Number of concurrent deletions (default: %(default)s)')
+    parser.add_argument('--project-pattern', default=DEFAULT_PROJECT_PATTERN,
+                        help='Regular expression of project titles to delete (default: %(default)s)')
+    parser.add_argument('--key-pattern', action='append', default=[], metavar='PATTERN',
+                        help='Glob pattern of object keys to delete; may be repeated (default: YYYYMMDD_*)')
+    parser.add_argument('--skip-projects', action='store_true', help='Do not delete projects')
+    parser.add_argument('--skip-buckets', action='store_true', help='Do not delete objects in the S3 test buckets')
+    parser.add_argument('--report', help='Save the result as JSON to this file')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.load(f.read(), yaml.SafeLoader)
+    min_age = timedelta(hours=args.min_age_hours)
+    started = time.monotonic()
+
+    project_result = None
+    if not args.skip_projects:
+        client = api.RDMClient(
+            config.get('rdm_url', 'https://rdm.example.com/'),
+            config.get('rdm_token') or os.environ.get('GRDM_RDM_TOKEN'),
+            api_url=config.get('rdm_api_url_v2'),
+            pool_size=args.workers,
+        )
+        projects = find_projects(client, pattern=args.project_pattern, min_age=min_age)
+        project_result = delete_projects(client, projects, workers=args.workers, dry_run=args.dry_run)
+
+    bucket_results = None
+    if not args.skip_buckets:
+        try:
+            bucket_results = purge_buckets(
+                config, patterns=args.key_pattern or None, min_age=min_age, workers=args.workers, dry_run=args.dry_run,
+            )
+        except ImportError:
+            print('boto3 is not installed; skipping the S3 test buckets')
+
+    print(format_report(project_result, bucket_results, elapsed=time.monotonic() - started, dry_run=args.dry_run))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({
+                'dry_run': args.dry_run,
+                'projects': project_result,
+                'buckets': bucket_results,
+            }, f, ensure_ascii=False, indent=1)
+    failed = (project_result is not None and len(project_result['failed']) > 0) or any(
+        len(result['errors']) > 0 for result in (bucket_results or {}).values()
+    )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
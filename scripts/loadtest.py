@@ -0,0 +1,320 @@
+# 複数の仮想ユーザーによるGRDMの負荷試験のためのユーティリティ関数群
+#
+# Notebookからは以下のように実行する:
+#
+#   from scripts import loadtest
+#   users = loadtest.make_virtual_users(10, rdm_url, idp_name_1, [(idp_username_1, idp_password_1)])
+#   recorder = await loadtest.run_load_test(users, ramp_up=30)
+#   recorder.summary()
+#
+# コマンドラインからは run_tests.py と同じ設定ファイルを使って実行できる:
+#
+#   python -m scripts.loadtest ci.config.yaml --users 10 --ramp-up 30
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from playwright.async_api import async_playwright, expect
+
+from scripts import grdm
+
+summary_columns = ['action', 'count', 'errors', 'error_rate', 'p50', 'p90', 'p95', 'p99', 'max']
+
+
+@dataclass
+class VirtualUser:
+    index: int
+    rdm_url: str
+    idp_name: str | None
+    username: str
+    password: str | None
+    project_name: str
+    work_dir: str
+    transition_timeout: int = 60000
+
+
+def percentile(sorted_values, p):
+    """最近接順位法によるパーセンタイル"""
+    if len(sorted_values) == 0:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadTestRecorder:
+    """仮想ユーザーの操作ごとのレイテンシとエラーを記録する"""
+
+    def __init__(self):
+        self.samples = []
+
+    @asynccontextmanager
+    async def measure(self, user_index, action):
+        start = time.monotonic()
+        sample = {
+            'user': user_index,
+            'action': action,
+            'start_time': datetime.now().isoformat(),
+            'duration': None,
+            'error': None,
+        }
+        try:
+            yield
+        except Exception as e:
+            sample['error'] = f'{type(e).__name__}: {e}'.splitlines()[0]
+            raise
+        finally:
+            sample['duration'] = time.monotonic() - start
+            self.samples.append(sample)
+
+    def summary(self):
+        """
+        操作ごとのレイテンシ(秒)のパーセンタイルとエラー率を集計する。
+
+        :return: summary_columns をキーとする辞書のリスト
+        """
+        actions = []
+        for sample in self.samples:
+            if sample['action'] not in actions:
+                actions.append(sample['action'])
+        rows = []
+        for action in actions:
+            samples = [s for s in self.samples if s['action'] == action]
+            durations = sorted(s['duration'] for s in samples if s['error'] is None)
+            errors = len([s for s in samples if s['error'] is not None])
+            rows.append({
+                'action': action,
+                'count': len(samples),
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'p50': percentile(durations, 50),
+                'p90': percentile(durations, 90),
+                'p95': percentile(durations, 95),
+                'p99': percentile(durations, 99),
+                'max': durations[-1] if len(durations) > 0 else None,
+            })
+        return rows
+
+    def format_summary(self):
+        def _format(value):
+            if value is None:
+                return '-'
+            if isinstance(value, float):
+                return f'{value:.3f}'
+            return str(value)
+        lines = ['\t'.join(summary_columns)]
+        for row in self.summary():
+            lines.append('\t'.join(_format(row[column]) for column in summary_columns))
+        return '\n'.join(lines)
+
+    def write_report(self, result_dir):
+        """全サンプル(loadtest-samples.jsonl)と集計結果(loadtest-summary.csv)を保存する"""
+        os.makedirs(result_dir, exist_ok=True)
+        samples_path = os.path.join(result_dir, 'loadtest-samples.jsonl')
+        with open(samples_path, 'w') as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+        summary_path = os.path.join(result_dir, 'loadtest-summary.csv')
+        with open(summary_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=summary_columns)
+            writer.writeheader()
+            writer.writerows(self.summary())
+        return samples_path, summary_path
+
+
+def make_virtual_users(
+    num_users,
+    rdm_url,
+    idp_name,
+    credentials,
+    project_prefix=None,
+    work_dir=None,
+    transition_timeout=60000,
+):
+    """
+    仮想ユーザーを生成する。
+
+    :param num_users: 仮想ユーザー数
+    :param rdm_url: GRDMのURL
+    :param idp_name: ログインに用いるIdP名
+    :param credentials: (ユーザー名, パスワード) のリスト。仮想ユーザー数より少ない場合は順に使い回す
+    :param project_prefix: 仮想ユーザーごとに作成するプロジェクト名の接頭辞
+    :param work_dir: アップロードするファイルを作成するディレクトリ
+    :param transition_timeout: 画面表示を伴う操作における、画面表示完了のタイムアウト時間
+    :return: VirtualUser のリスト
+    """
+    if len(credentials) == 0:
+        raise ValueError('At least one credential is required')
+    project_prefix = project_prefix or 'TEST-LOADTEST-{}'.format(datetime.now().strftime('%Y%m%d-%H%M%S'))
+    work_dir = work_dir or tempfile.mkdtemp()
+    users = []
+    for i in range(num_users):
+        username, password = credentials[i % len(credentials)]
+        users.append(VirtualUser(
+            index=i,
+            rdm_url=rdm_url,
+            idp_name=idp_name,
+            username=username,
+            password=password,
+            project_name=f'{project_prefix}-{i:03d}',
+            work_dir=work_dir,
+            transition_timeout=transition_timeout,
+        ))
+    return users
+
+
+async def default_scenario(page, user, recorder, iteration, upload_size=1000, delete_project=True):
+    """ログイン、プロジェクト作成、ファイル一覧表示、アップロードを行うシナリオ"""
+    timeout = user.transition_timeout
+
+    async with recorder.measure(user.index, 'open_top'):
+        await page.goto(user.rdm_url)
+        await expect(page.locator('//button[text() = "同意する"]')).to_be_visible(timeout=timeout)
+        await page.locator('//button[text() = "同意する"]').click()
+
+    async with recorder.measure(user.index, 'login'):
+        await grdm.login(page, user.idp_name, user.username, user.password, transition_timeout=timeout)
+        await expect(page.locator('//*[text() = "プロジェクト管理者"]')).to_be_visible(timeout=timeout)
+
+    async with recorder.measure(user.index, 'ensure_project_exists'):
+        await grdm.ensure_project_exists(page, user.project_name, transition_timeout=timeout)
+
+    async with recorder.measure(user.index, 'open_file_browser'):
+        await page.locator(f'//*[@data-test-dashboard-item-title and text()="{user.project_name}"]').click()
+        await expect(page.locator('//a[text() = "アドオン"]')).to_be_visible(timeout=timeout)
+        await page.locator('#projectNavFiles a').click()
+        await expect(grdm.get_select_expanded_storage_title_locator(page, 'NII Storage')).to_be_visible(timeout=timeout)
+
+    filename = f'loadtest-{user.index:03d}-{iteration:03d}.txt'
+    filepath = os.path.join(user.work_dir, filename)
+    with open(filepath, 'w') as f:
+        f.write('x' * upload_size)
+
+    async with recorder.measure(user.index, 'upload_file'):
+        await grdm.get_select_storage_title_locator(page, 'NII Storage').click()
+        await grdm.upload_file(page, filepath)
+        await grdm.wait_for_uploaded(page, filename)
+
+    if not delete_project:
+        return
+    async with recorder.measure(user.index, 'delete_project'):
+        await grdm.delete_project(page, transition_timeout=timeout)
+        await expect(page.locator('//*[@data-test-create-project-modal-button]')).to_have_count(1, timeout=timeout)
+
+
+async def _run_virtual_user(browser, user, scenario, recorder, start_delay, iterations):
+    await asyncio.sleep(start_delay)
+    for iteration in range(iterations):
+        # 反復ごとに新しい研究者のセッションとして、新規コンテキストで開始する
+        context = await browser.new_context(locale='ja-JP')
+        try:
+            page = await context.new_page()
+            await scenario(page, user, recorder, iteration)
+        except Exception:
+            print(f'[VU {user.index}] iteration {iteration} failed', file=sys.stderr)
+            traceback.print_exc()
+        finally:
+            await context.close()
+
+
+async def run_load_test(users, scenario=None, ramp_up=0, iterations=1, result_dir=None, headless=True):
+    """
+    仮想ユーザーごとに独立したブラウザコンテキストでシナリオを並行に実行する。
+
+    :param users: make_virtual_users で生成した仮想ユーザーのリスト
+    :param scenario: page, user, recorder, iteration を受け取るasync関数(省略時は default_scenario)
+    :param ramp_up: 全仮想ユーザーが開始するまでの秒数。開始時刻は均等にずらされる
+    :param iterations: 仮想ユーザーごとのシナリオの反復回数
+    :param result_dir: レポートの保存先(Noneの場合は保存しない)
+    :param headless: ヘッドレスモードで実行するか
+    :return: LoadTestRecorder
+    """
+    scenario = scenario or default_scenario
+    recorder = LoadTestRecorder()
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(
+            headless=headless,
+            args=["--no-sandbox", "--disable-dev-shm-usage", "--lang=ja"],
+        )
+        try:
+            await asyncio.gather(*[
+                _run_virtual_user(
+                    browser, user, scenario, recorder,
+                    ramp_up * i / len(users) if len(users) > 0 else 0,
+                    iterations,
+                )
+                for i, user in enumerate(users)
+            ])
+        finally:
+            await browser.close()
+    if result_dir is not None:
+        samples_path, summary_path = recorder.write_report(result_dir)
+        print(f'Samples: {samples_path}')
+        print(f'Summary: {summary_path}')
+    return recorder
+
+
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(
+        description='Run a load test against GRDM with concurrent virtual users'
+    )
+    parser.add_argument('config', help='Path to configuration YAML file (same format as run_tests.py)')
+    parser.add_argument('--users', type=int, default=5, help='Number of concurrent virtual users')
+    parser.add_argument('--ramp-up', type=float, default=0, help='Seconds until all virtual users have started')
+    parser.add_argument('--iterations', type=int, default=1, help='Scenario iterations per virtual user')
+    parser.add_argument('--upload-size', type=int, default=1000, help='Size of the uploaded file in bytes')
+    parser.add_argument('--keep-projects', action='store_true', help='Do not delete the projects created by virtual users')
+    parser.add_argument('--result-dir', help='Directory to save the report (default: result/loadtest-<timestamp>)')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.load(f.read(), yaml.SafeLoader)
+
+    # loadtest_users が指定されていない場合は idp_username_1 を全仮想ユーザーで共有する
+    credentials = [
+        (u['username'], u.get('password'))
+        for u in config.get('loadtest_users') or []
+    ] or [(config['idp_username_1'], config.get('idp_password_1'))]
+    users = make_virtual_users(
+        args.users,
+        config.get('rdm_url', 'https://rdm.example.com/'),
+        config.get('idp_name_1'),
+        credentials,
+        transition_timeout=config.get('transition_timeout', 60000),
+    )
+    result_dir = args.result_dir or os.path.join(
+        'result', 'loadtest-{}'.format(datetime.now().strftime('%Y%m%d-%H%M%S'))
+    )
+
+    async def _scenario(page, user, recorder, iteration):
+        await default_scenario(
+            page, user, recorder, iteration,
+            upload_size=args.upload_size,
+            delete_project=not args.keep_projects,
+        )
+
+    recorder = asyncio.run(run_load_test(
+        users,
+        scenario=_scenario,
+        ramp_up=args.ramp_up,
+        iterations=args.iterations,
+        result_dir=result_dir,
+    ))
+    print(recorder.format_summary())
+    return 1 if any(s['error'] is not None for s in recorder.samples) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
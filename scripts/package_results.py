@@ -0,0 +1,165 @@
+# 結果ディレクトリを、CIのArtifactとしてアップロードするための tar.zst にまとめる
+#
+# 結果ツリーを一時ファイルを作らずにマルチスレッドのzstdで圧縮しながらtarに書き出す。
+# Notebookとサマリを先頭に置くため、アーカイブの先頭部分だけを展開しても結果を確認できる。
+# PNG・WebM・har.zip など圧縮済みの形式は高速なレベルの別フレームとし、再圧縮に時間をかけない:
+#
+#   python -m scripts.package_results result -o result.tar.zst
+#   tar --zstd -xf result.tar.zst
+#
+# 終了時に、成果物の種類ごとのファイル数・圧縮前後のサイズを表示する。
+
+import argparse
+import fnmatch
+import os
+import sys
+import time
+
+from scripts import artifacts
+
+DEFAULT_LEVEL = 3
+# 圧縮済みの形式に使う圧縮レベル(zstd --fast=5 相当)
+STORED_LEVEL = -5
+
+# 成果物の種類: (名前, ファイル名のパターン)。アーカイブにはこの順に格納する
+CATEGORIES = [
+    ('notebook', ['*.ipynb']),
+    ('summary', ['test-summary-*.xlsx', '*.csv', 'prerequisites.json', 'transfers.jsonl', '*-summary.*']),
+    ('log', ['*.json', '*.jsonl', '*.log', '*.txt', '*.html', '*.har', '*.yaml', '*.yml']),
+    ('screenshot', ['*.png', '*.jpg', '*.jpeg', '*.webp', '*.gif']),
+    ('har', ['har.zip', 'har-*.zip']),
+    ('video', ['*.webm', '*.mp4']),
+    ('other', ['*']),
+]
+
+# 圧縮済みのため再圧縮しない形式
+COMPRESSED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.webp', '.gif', '.webm', '.mp4',
+    '.zip', '.xlsx', '.docx', '.gz', '.tgz', '.zst', '.xz', '.bz2', '.7z',
+}
+
+_MB = 1024 * 1024
+
+
+def categorize(path):
+    name = os.path.basename(path)
+    for category, patterns in CATEGORIES:
+        if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            return category
+    return 'other'
+
+
+def is_compressed(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def collect_files(root, exclude=None):
+    """
+    root 以下のファイルを、アーカイブに格納する順に並べて返す。
+
+    種類の順(CATEGORIES)、同じ種類の中では圧縮する形式・圧縮済みの形式の順、それぞれパスの順に並べる。
+    """
+    exclude = exclude or []
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, root)
+            if any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(filename, pattern) for pattern in exclude):
+                continue
+            if not os.path.isfile(path) or os.path.islink(path):
+                continue
+            files.append(path)
+    order = {category: i for i, (category, _) in enumerate(CATEGORIES)}
+    return sorted(files, key=lambda path: (order[categorize(path)], is_compressed(path), path))
+
+
+def package(root, output, level=DEFAULT_LEVEL, threads=0, exclude=None):
+    """
+    root 以下を output に tar.zst として書き出し、種類ごとの {'files', 'input_bytes', 'output_bytes'} を返す。
+
+    アーカイブ内のパスは root のディレクトリ名から始まる(例: result/result-xxx/...)。
+    """
+    root = os.path.abspath(root)
+    base_dir = os.path.dirname(root)
+    files = collect_files(root, exclude=exclude)
+    breakdown = {}
+    with artifacts.open_tar_zst(output, level=level, threads=threads) as tar:
+        writer = tar.fileobj
+        current = None
+        frame_start = 0
+        for path in files:
+            key = (categorize(path), is_compressed(path))
+            if key != current:
+                # フレームを区切り、区切りまでの出力サイズを直前の種類に計上する
+                writer.end_frame()
+                if current is not None:
+                    breakdown[current[0]]['output_bytes'] += writer.fileobj.tell() - frame_start
+                frame_start = writer.fileobj.tell()
+                writer.set_level(STORED_LEVEL if key[1] else level)
+                current = key
+            stats = breakdown.setdefault(key[0], {'files': 0, 'input_bytes': 0, 'output_bytes': 0})
+            stats['files'] += 1
+            stats['input_bytes'] += os.path.getsize(path)
+            tar.add(path, arcname=os.path.relpath(path, base_dir), recursive=False)
+        # アーカイブ末尾のブロックは最後の種類に含める
+        tar.close()
+        writer.end_frame()
+        if current is not None:
+            breakdown[current[0]]['output_bytes'] += writer.fileobj.tell() - frame_start
+    return breakdown
+
+
+def format_breakdown(breakdown, elapsed=None):
+    lines = ['\t'.join(['type', 'files', 'input_mb', 'output_mb', 'ratio'])]
+    total = {'files': 0, 'input_bytes': 0, 'output_bytes': 0}
+    for category, _ in CATEGORIES:
+        if category not in breakdown:
+            continue
+        stats = breakdown[category]
+        for key in total:
+            total[key] += stats[key]
+        lines.append(_format_row(category, stats))
+    lines.append(_format_row('total', total))
+    if elapsed is not None and elapsed > 0:
+        lines.append(f'Packaged {total["input_bytes"] / _MB:.1f} MB in {elapsed:.1f}s ({total["input_bytes"] / _MB / elapsed:.1f} MB/s)')
+    return '\n'.join(lines)
+
+
+def _format_row(name, stats):
+    ratio = stats['output_bytes'] / stats['input_bytes'] if stats['input_bytes'] > 0 else 0
+    return '\t'.join([
+        name,
+        str(stats['files']),
+        f"{stats['input_bytes'] / _MB:.1f}",
+        f"{stats['output_bytes'] / _MB:.1f}",
+        f'{ratio:.2f}',
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Package a result tree into a multi-threaded zstd tar archive for artifact upload'
+    )
+    parser.add_argument('result_dir', nargs='?', default='result', help='Result directory to package (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='Output file (default: <result_dir>.tar.zst)')
+    parser.add_argument('--level', type=int, default=DEFAULT_LEVEL, help='zstd level for compressible files (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=0, help='Compression threads; 0 uses all CPUs (default: %(default)s)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                        help='Exclude files matching the glob pattern (relative path or file name)')
+    args = parser.parse_args()
+
+    output = args.output or os.path.normpath(args.result_dir) + '.tar.zst'
+    if not os.path.isdir(args.result_dir):
+        print(f'Result directory not found: {args.result_dir}', file=sys.stderr)
+        return 1
+    started = time.time()
+    breakdown = package(args.result_dir, output, level=args.level, threads=args.threads, exclude=args.exclude)
+    print(f'Archive: {output}')
+    print(format_breakdown(breakdown, elapsed=time.time() - started))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,15 @@
 # PapermillによるJupyter Notebookの実行およびその事前準備をサポートするためのユーティリティ関数群
 
 import os
+import time
 import traceback
 from typing import Callable
 import papermill as pm
 import shutil
 import yaml
 
+from scripts import events
+
 def run_notebook(
     result_dir: str,
     base_notebook: str,
@@ -46,13 +49,26 @@ def run_notebook(
     if extra_params:
         params.update(extra_params)
 
+    events.emit('notebook_started', notebook=base_notebook, result_id=result_id, result_path=result_path)
+    started = time.time()
+    status = 'failed'
     try:
         pm.execute_notebook(base_notebook, result_notebook, parameters=params)
+        status = 'passed'
     except pm.PapermillExecutionError:
         if not skip_failed_test:
             raise
         print('失敗しました。テストは続行します...')
         traceback.print_exc()
+    finally:
+        events.emit(
+            'notebook_finished',
+            notebook=base_notebook,
+            result_id=result_id,
+            result_path=result_path,
+            status=status,
+            duration=time.time() - started,
+        )
     return result_notebook
 
 def gen_run_notebook(
@@ -1,188 +1,485 @@
 # ユーティリティ関数群
+import asyncio
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
+import json
 import os
 import shutil
 import sys
-import tempfile
 import time
 import traceback
 
-from IPython.display import Image
-from playwright.async_api import async_playwright, expect
-
-playwright = None
-current_session_id = None
-current_browser = None
-current_contexts = None
-default_last_path = None
-context_close_on_fail = True
-temp_dir = None
-
-async def run_pw(f, last_path=default_last_path, screenshot=True, permissions=None, new_context=False, new_page=False):
-    global current_browser
-    if current_browser is None:
-        current_browser = await playwright.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--lang=ja"],
-        )
-        # , "--timeout=25000"
-    
-    global current_contexts
-    if current_contexts is None or len(current_contexts) == 0 or new_context:
-        videos_dir = os.path.join(temp_dir, 'videos/')
-        os.makedirs(videos_dir, exist_ok=True)
-        har_path = os.path.join(temp_dir, 'har.zip')
-
-        context = await current_browser.new_context(
-            locale="ja-JP",  # Playwrightでは直接ロケールを設定可能
-            record_video_dir=videos_dir,
-            record_har_path=har_path,
-        )
-        if current_contexts is None:
-            current_contexts = [(context, [])]
-        else:
-            current_contexts.append((context, []))
-
-    current_context, current_pages = current_contexts[-1]
-    if len(current_pages) == 0 or new_page:
-        current_pages.append(await current_context.new_page())
-
-    current_time = time.time()
-    print(f'Start epoch: {current_time} seconds')
-    if permissions is not None:
-        await current_context.grant_permissions(permissions)
-    next_page = None
-    if f is not None:
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright, expect
+
+from scripts import admin_benchmark, events, selector_profile, transfer_benchmark, workspace
+from scripts.screenshots import ScreenshotOptions, StepScreenshots
+from scripts.static_cache import DEFAULT_MAX_BYTES as DEFAULT_STATIC_CACHE_MAX_BYTES, StaticAssetCache
+
+
+# ステップの再試行を記録する出力のMIMEタイプ。Excelサマリで「リトライ後に成功」と表示するために使われる
+STEP_RETRY_MIME_TYPE = 'application/vnd.grdm.step-retry+json'
+
+
+@dataclass
+class RetryPolicy:
+    """
+    run_pw のステップ関数の再試行方法。
+
+    attempts: 最初の実行を含む最大試行回数
+    exceptions: 再試行の対象とする例外(既定は expect の失敗とPlaywrightのタイムアウト)
+    reload: 再試行の前にページを再読み込みするか
+    backoff: 1回目の再試行までの待ち時間(秒)。以降は backoff_factor 倍ずつ伸ばす
+    """
+    attempts: int = 2
+    exceptions: tuple = (AssertionError, PlaywrightTimeoutError)
+    reload: bool = False
+    backoff: float = 1.0
+    backoff_factor: float = 2.0
+
+    def delay(self, attempt):
+        return self.backoff * (self.backoff_factor ** (attempt - 1))
+
+
+def _to_retry_policy(retry):
+    if retry is None or isinstance(retry, RetryPolicy):
+        return retry
+    return RetryPolicy(attempts=int(retry))
+
+
+class Session:
+    """
+    Playwrightのドライバ、ブラウザ、コンテキスト/ページのスタック、成果物の保存先を保持するセッション。
+
+    セッション同士は状態を共有しないため、1つのasyncioループ上で複数のセッションを並行に操作できる。
+    """
+
+    def __init__(self, close_on_fail=True, last_path=None, static_cache=None, har_replay_dir=None, har_replay_not_found='abort'):
+        self.playwright = None
+        self.session_id = None
+        self.browser = None
+        # (context, [page, ...]) のスタック
+        self.contexts = None
+        self.close_on_fail = close_on_fail
+        self.initial_last_path = last_path
+        self.last_path = last_path
+        self.temp_dir = None
+        # 静的アセットのキャッシュ(StaticAssetCache)。Noneの場合は使用しない
+        self.static_cache = static_cache
+        # 再生するHAR(har.zip, har-2.zip, ...)を含むディレクトリ。Noneの場合は実際のRDMに接続する
+        self.har_replay_dir = har_replay_dir
+        # HARに記録されていないリクエストの扱い('abort' または 'fallback')
+        self.har_replay_not_found = har_replay_not_found
+        self.unmatched_requests = []
+        # retry が指定されないステップに適用する再試行方法(RetryPolicy)。Noneの場合は再試行しない
+        self.default_retry = None
+        self.retries = []
+        self.step_index = 0
+        # ステップごとのスクリーンショットの取得方法(ScreenshotOptions)。Noneの場合は表示領域全体をPNGで取得する
+        self.screenshot_options = None
+        self.screenshots = None
+        # 計測が有効な場合の、このセッション専用の記録先。他のセッションのサンプルは含まない
+        self.selector_profiler = None
+        self.transfer_recorder = None
+        self.admin_recorder = None
+
+    async def start(self):
+        if self.contexts is not None:
+            for context, _ in self.contexts:
+                await context.close()
+        self.contexts = None
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+        self.playwright = await async_playwright().start()
+        self.session_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.last_path = self.initial_last_path or os.path.join(os.path.expanduser('~/last-screenshots'), self.session_id)
+        self.temp_dir = workspace.mkdtemp('playwright-')
+        self.unmatched_requests = []
+        self.retries = []
+        self.step_index = 0
+        options = self.screenshot_options
+        self.screenshots = StepScreenshots(options) if options is not None and not options.is_default() else None
+        self.selector_profiler = selector_profile.new_profiler()
+        self.transfer_recorder = transfer_benchmark.new_recorder()
+        self.admin_recorder = admin_benchmark.new_recorder()
+        return (self.session_id, self.temp_dir)
+
+    @contextmanager
+    def _use_recorders(self):
+        # ステップ内の grdm / transfer_benchmark / admin_benchmark の計測を、このセッションの記録先に記録する
+        with selector_profile.use(self.selector_profiler), \
+                transfer_benchmark.use(self.transfer_recorder), \
+                admin_benchmark.use(self.admin_recorder):
+            yield
+
+    async def _measure_selectors(self):
+        if self.selector_profiler is not None:
+            await self.selector_profiler.measure_pending()
+
+    def _har_path(self, context_index):
+        if context_index == 0:
+            return os.path.join(self.temp_dir, 'har.zip')
+        return os.path.join(self.temp_dir, f'har-{context_index + 1}.zip')
+
+    async def run(self, f, last_path=None, screenshot=True, permissions=None, new_context=False, new_page=False, retry=None):
+        if self.browser is None:
+            self.browser = await self.playwright.chromium.launch(
+                headless=True,
+                args=["--no-sandbox", "--disable-dev-shm-usage", "--lang=ja"],
+            )
+            # , "--timeout=25000"
+
+        if self.contexts is None or len(self.contexts) == 0 or new_context:
+            videos_dir = os.path.join(self.temp_dir, 'videos/')
+            os.makedirs(videos_dir, exist_ok=True)
+            context_index = 0 if self.contexts is None else len(self.contexts)
+            har_path = self._har_path(context_index)
+
+            context = await self.browser.new_context(
+                locale="ja-JP",  # Playwrightでは直接ロケールを設定可能
+                record_video_dir=videos_dir,
+                record_har_path=har_path,
+            )
+            if self.har_replay_dir is not None:
+                await self._replay_har(context, context_index)
+            elif self.static_cache is not None:
+                await self.static_cache.attach(context)
+            if self.contexts is None:
+                self.contexts = [(context, [])]
+            else:
+                self.contexts.append((context, []))
+
+        current_context, current_pages = self.contexts[-1]
+        if len(current_pages) == 0 or new_page:
+            current_pages.append(await current_context.new_page())
+
+        current_time = time.time()
+        print(f'Start epoch: {current_time} seconds')
+        if permissions is not None:
+            await current_context.grant_permissions(permissions)
+        next_page = None
+        if f is not None:
+            self.step_index += 1
+            step_event = dict(result_path=self.last_path, step=self.step_index, cell=events.current_cell())
+            events.emit('step_started', **step_event)
+            try:
+                with self._use_recorders():
+                    next_page = await self._run_step(f, current_pages[-1], _to_retry_policy(retry) or self.default_retry)
+            except:
+                e = sys.exc_info()[1]
+                events.emit(
+                    'step_failed',
+                    duration=time.time() - current_time,
+                    exception=type(e).__name__,
+                    message=str(e).split('\n')[0],
+                    **step_event,
+                )
+                await self._measure_selectors()
+                if self.close_on_fail:
+                    await self.finish(screenshot=screenshot, last_path=last_path)
+                    raise
+                if screenshot:
+                    await self._save_screenshot()
+                raise
+            events.emit('step_passed', duration=time.time() - current_time, **step_event)
+        await self._measure_selectors()
+        if next_page is not None:
+            current_pages.append(next_page)
+        if self.screenshots is not None:
+            return await self.screenshots.capture_step(current_pages[-1])
+        screenshot_path = os.path.join(self.temp_dir, 'screenshot.png')
+        await current_pages[-1].screenshot(path=screenshot_path)
+        from IPython.display import Image
+        return Image(screenshot_path)
+
+    async def _run_step(self, f, page, retry):
+        attempt = 1
+        while True:
+            try:
+                return await f(page)
+            except Exception as e:
+                if retry is None or attempt >= retry.attempts or not isinstance(e, retry.exceptions):
+                    raise
+                delay = retry.delay(attempt)
+                record = {
+                    'attempt': attempt,
+                    'attempts': retry.attempts,
+                    'exception': type(e).__name__,
+                    'message': str(e).split('\n')[0],
+                    'reload': retry.reload,
+                    'delay': delay,
+                }
+                self.retries.append(record)
+                print(f"Retrying step (attempt {attempt + 1}/{retry.attempts}) after {type(e).__name__}: {record['message']}", file=sys.stderr)
+                from IPython.display import display
+                display({
+                    STEP_RETRY_MIME_TYPE: record,
+                    'text/plain': f"Step retried after attempt {attempt}: {type(e).__name__}",
+                }, raw=True)
+                await asyncio.sleep(delay)
+                if retry.reload:
+                    await page.reload()
+                attempt += 1
+
+    async def _replay_har(self, context, context_index):
+        replay_path = os.path.join(self.har_replay_dir, os.path.basename(self._har_path(context_index)))
+
+        async def _handle_unmatched(route):
+            request = route.request
+            self.unmatched_requests.append({
+                'context': context_index + 1,
+                'method': request.method,
+                'url': request.url,
+                'resource_type': request.resource_type,
+            })
+            if self.har_replay_not_found == 'fallback':
+                await route.continue_()
+            else:
+                await route.abort()
+
+        # HARに一致しなかったリクエストは、後から登録した route_from_har から順にこのハンドラへ渡される
+        await context.route('**/*', _handle_unmatched)
+        if not os.path.exists(replay_path):
+            print(f'再生するHARが見つかりません: {replay_path}', file=sys.stderr)
+            return
+        await context.route_from_har(replay_path, not_found='fallback')
+        print(f'HAR replay: {replay_path}')
+
+    def _write_har_replay_report(self, last_path=None):
+        if self.har_replay_dir is None:
+            return
+        dest_dir = last_path or self.last_path
+        os.makedirs(dest_dir, exist_ok=True)
+        report_path = os.path.join(dest_dir, 'har-replay-unmatched.json')
+        with open(report_path, 'w') as f:
+            json.dump({
+                'source': self.har_replay_dir,
+                'unmatched': self.unmatched_requests,
+            }, f, ensure_ascii=False, indent=1)
+        print(f'HAR replay: {len(self.unmatched_requests)} unmatched request(s) ({report_path})')
+        for request in self.unmatched_requests[:10]:
+            print(f"  {request['method']} {request['url']}")
+
+    async def close_latest_page(self, last_path=None):
+        if self.contexts is None or len(self.contexts) == 0:
+            raise Exception('No contexts')
+        current_context, current_pages = self.contexts[-1]
+        if len(self.contexts) <= 1 and len(current_pages) <= 1:
+            raise Exception('It is only possible to close when two or more contexts or pages are stacked')
+        os.makedirs(last_path or self.last_path, exist_ok=True)
+        last_page = current_pages[-1]
+        if last_page in current_pages[:-1] or any([last_page in p for _, p in self.contexts[:-1]]):
+            # まだインスタンスがページ一覧に存在する場合は、スタックから削除するだけ
+            assert len(current_pages) > 0, current_pages
+            self.contexts[-1] = (current_context, current_pages[:-1])
+            return
+        video_path = await last_page.video.path()
+        index = len(current_pages)
+        dest_video_path = os.path.join(last_path or self.last_path, f'video-{index}.webm')
+        shutil.copyfile(video_path, dest_video_path)
+        current_pages = current_pages[:-1]
+        self.contexts[-1] = (current_context, current_pages)
+        if self.screenshots is not None:
+            await self.screenshots.wait()
+        await last_page.close()
+        if len(current_pages) > 0:
+            return
+        self.contexts = self.contexts[:-1]
+        await current_context.close()
+
+    async def finish(self, screenshot=False, last_path=None):
+        await self._finish_contexts(screenshot=screenshot, last_path=last_path)
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        self._save_static_cache(last_path=last_path)
+        self._write_har_replay_report(last_path=last_path)
+        if self.selector_profiler is not None:
+            selector_profile.write_report(last_path or self.last_path, self.selector_profiler)
+        if self.transfer_recorder is not None:
+            transfer_benchmark.write_report(last_path or self.last_path, self.transfer_recorder)
+        if self.admin_recorder is not None:
+            admin_benchmark.write_report(last_path or self.last_path, self.admin_recorder)
+
+    def _save_static_cache(self, last_path=None):
+        if self.static_cache is None:
+            return
         try:
-            next_page = await f(current_pages[-1])
+            self.static_cache.save()
+            dest_dir = last_path or self.last_path
+            if dest_dir is not None:
+                os.makedirs(dest_dir, exist_ok=True)
+                self.static_cache.write_stats(os.path.join(dest_dir, 'static-cache.json'))
+            print(self.static_cache.format_stats())
         except:
-            if context_close_on_fail:
-                await finish_pw_context(screenshot=screenshot, last_path=last_path)
-                raise
-            if screenshot:
-                await _save_screenshot()
-            raise
-    if next_page is not None:
-        current_pages.append(next_page)
-    screenshot_path = os.path.join(temp_dir, 'screenshot.png')
-    await current_pages[-1].screenshot(path=screenshot_path)
-    return Image(screenshot_path)
+            print('静的アセットのキャッシュの保存に失敗しました。', file=sys.stderr)
+            traceback.print_exc()
 
-async def close_latest_page(last_path=None):
-    global current_contexts
-    if current_contexts is None or len(current_contexts) == 0:
-        raise Exception('No contexts')
-    current_context, current_pages = current_contexts[-1]
-    if len(current_contexts) <= 1 and len(current_pages) <= 1:
-        raise Exception('It is only possible to close when two or more contexts or pages are stacked')
-    os.makedirs(last_path or default_last_path, exist_ok=True)
-    last_page = current_pages[-1]
-    if last_page in current_pages[:-1] or any([last_page in p for _, p in current_contexts[:-1]]):
-        # まだインスタンスがページ一覧に存在する場合は、スタックから削除するだけ
-        assert len(current_pages) > 0, current_pages
-        current_contexts[-1] = (current_context, current_pages[:-1])
-        return
-    video_path = await last_page.video.path()
-    index = len(current_pages)
-    dest_video_path = os.path.join(last_path or default_last_path, f'video-{index}.webm')
-    shutil.copyfile(video_path, dest_video_path)
-    current_pages = current_pages[:-1]
-    current_contexts[-1] = (current_context, current_pages)
-    await last_page.close()
-    if len(current_pages) > 0:
-        return
-    current_contexts = current_contexts[:-1]
-    await current_context.close()
-
-async def init_pw_context(close_on_fail=True, last_path=None):
-    global playwright, current_session_id, default_last_path, current_browser, temp_dir, context_close_on_fail, current_contexts
-    if current_browser is not None:
-        await current_browser.close()
-        current_browser = None
-    if playwright is not None:
-        await playwright.stop()
-        playwright = None
-    playwright = await async_playwright().start()
-    current_session_id = datetime.now().strftime('%Y%m%d-%H%M%S')
-    default_last_path = last_path or os.path.join(os.path.expanduser('~/last-screenshots'), current_session_id)
-    temp_dir = tempfile.mkdtemp()
-    context_close_on_fail = close_on_fail
-    if current_contexts is not None:
-        for current_context in current_contexts:
+    async def stop(self):
+        """ブラウザを閉じ、ドライバを停止する"""
+        await self.finish()
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def save_screenshot(self, path):
+        if self.contexts is None or len(self.contexts) == 0:
+            raise Exception('No contexts')
+        _, current_pages = self.contexts[-1]
+        if current_pages is None or len(current_pages) == 0:
+            raise Exception('Unexpected state')
+        await current_pages[-1].screenshot(path=path)
+        return path
+
+    async def _save_screenshot(self, last_path=None):
+        if self.contexts is None or len(self.contexts) == 0:
+            raise Exception('No contexts')
+        if self.screenshots is not None:
+            await self.screenshots.wait()
+        _, current_pages = self.contexts[-1]
+        os.makedirs(last_path or self.last_path, exist_ok=True)
+        if current_pages is None or len(current_pages) == 0:
+            return
+        screenshot_path = os.path.join(self.temp_dir, 'last-screenshot.png')
+        await current_pages[-1].screenshot(path=screenshot_path)
+        dest_screenshot_path = os.path.join(last_path or self.last_path, 'last-screenshot.png')
+        shutil.copyfile(screenshot_path, dest_screenshot_path)
+        print(f'Screenshot: {dest_screenshot_path}')
+        events.emit('artifact', kind='screenshot', path=dest_screenshot_path)
+
+    async def _finish_contexts(self, screenshot=False, last_path=None):
+        if self.contexts is None or len(self.contexts) == 0:
+            return
+        if self.screenshots is not None:
+            await self.screenshots.wait()
+            print(self.screenshots.format_stats())
+        dest_dir = last_path or self.last_path
+        os.makedirs(dest_dir, exist_ok=True)
+        if screenshot:
+            _, current_pages = self.contexts[-1]
+            if current_pages is not None and len(current_pages) > 0:
+                try:
+                    await self._save_screenshot(last_path=last_path)
+                except:
+                    print('スクリーンショットの取得に失敗しました。', file=sys.stderr)
+                    traceback.print_exc()
+                    return
+        # 後から作成したコンテキストから順に閉じる
+        while len(self.contexts) > 0:
+            context_index = len(self.contexts) - 1
+            current_context, current_pages = self.contexts.pop()
             await current_context.close()
-    current_contexts = None
-    return (current_session_id, temp_dir)
+            for i, current_page in enumerate(current_pages):
+                index = i + 1
+                video_name = f'video-{index}.webm' if context_index == 0 else f'video-{context_index + 1}-{index}.webm'
+                try:
+                    video_path = await current_page.video.path()
+                    dest_video_path = os.path.join(dest_dir, video_name)
+                    shutil.copyfile(video_path, dest_video_path)
+                    print(f'Video: {dest_video_path}')
+                    events.emit('artifact', kind='video', path=dest_video_path)
+                except:
+                    print('スクリーンキャプチャ動画の取得に失敗しました。', file=sys.stderr)
+                    traceback.print_exc()
+                    return
+            har_path = self._har_path(context_index)
+            dest_har_path = os.path.join(dest_dir, os.path.basename(har_path))
+            if os.path.exists(har_path):
+                shutil.copyfile(har_path, dest_har_path)
+                print(f'HAR: {dest_har_path}')
+                events.emit('artifact', kind='har', path=dest_har_path)
+            else:
+                print('.harファイルの取得に失敗しました。', file=sys.stderr)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+default_session = Session()
+
+
+async def run_pw(f, last_path=None, screenshot=True, permissions=None, new_context=False, new_page=False, retry=None):
+    """
+    ステップ関数 f を実行し、スクリーンショットを返す。
+
+    retry に RetryPolicy (または試行回数) を指定すると、f が失敗したときに f のみを再実行する。
+    省略時は環境変数 GRDM_STEP_RETRIES (試行回数) と GRDM_STEP_RETRY_RELOAD に従う。
+    """
+    return await default_session.run(
+        f,
+        last_path=last_path,
+        screenshot=screenshot,
+        permissions=permissions,
+        new_context=new_context,
+        new_page=new_page,
+        retry=retry,
+    )
+
+async def close_latest_page(last_path=None):
+    await default_session.close_latest_page(last_path=last_path)
+
+def har_replay_dir_from_env(last_path):
+    """
+    環境変数 GRDM_HAR_REPLAY_FROM (前回の結果ディレクトリ) と GRDM_HAR_REPLAY_ROOT (今回の結果ディレクトリ) から、
+    last_path に対応する再生元のディレクトリを求める。子Notebookの結果は同じ相対パスの再生元に対応付ける。
+    """
+    replay_from = os.environ.get('GRDM_HAR_REPLAY_FROM')
+    if not replay_from:
+        return None
+    replay_root = os.environ.get('GRDM_HAR_REPLAY_ROOT')
+    if replay_root and last_path:
+        rel_path = os.path.relpath(os.path.abspath(last_path), os.path.abspath(replay_root))
+        if rel_path != os.curdir and not rel_path.startswith(os.pardir):
+            return os.path.join(replay_from, rel_path)
+    return replay_from
+
+async def init_pw_context(close_on_fail=True, last_path=None, static_cache_dir=None, block_analytics=None, har_replay_dir=None):
+    """
+    既定のセッションを開始する。
+
+    har_replay_dir を指定した場合(省略時は環境変数 GRDM_HAR_REPLAY_FROM から求める)、実際のRDMに接続せず、
+    前回の実行で記録されたHARを再生する。HARに記録されていないリクエストは、環境変数 GRDM_HAR_REPLAY_NOT_FOUND が
+    'fallback' の場合はネットワークに送られ、それ以外の場合は中断される。いずれも har-replay-unmatched.json に記録される。
+
+    static_cache_dir を指定した場合(省略時は環境変数 GRDM_STATIC_CACHE_DIR)、静的アセットをディスクにキャッシュする。
+    キャッシュの上限サイズは環境変数 GRDM_STATIC_CACHE_MAX_MB で指定できる。
+    block_analytics がTrueの場合(省略時は環境変数 GRDM_BLOCK_ANALYTICS)、外部のアクセス解析へのリクエストを遮断する。
+    ステップごとのスクリーンショットの形式・縮小・取得条件は、環境変数 GRDM_SCREENSHOT_* に従う(scripts/screenshots.py を参照)。
+    """
+    default_session.close_on_fail = close_on_fail
+    default_session.initial_last_path = last_path
+    default_session.har_replay_dir = har_replay_dir or har_replay_dir_from_env(last_path)
+    default_session.har_replay_not_found = os.environ.get('GRDM_HAR_REPLAY_NOT_FOUND', 'abort')
+    default_session.screenshot_options = ScreenshotOptions.from_env()
+    step_retries = int(os.environ.get('GRDM_STEP_RETRIES', '1'))
+    default_session.default_retry = RetryPolicy(
+        attempts=step_retries,
+        reload=os.environ.get('GRDM_STEP_RETRY_RELOAD', '').lower() in ('1', 'true', 'yes'),
+    ) if step_retries > 1 else None
+    static_cache_dir = static_cache_dir or os.environ.get('GRDM_STATIC_CACHE_DIR')
+    if block_analytics is None:
+        block_analytics = os.environ.get('GRDM_BLOCK_ANALYTICS', '').lower() in ('1', 'true', 'yes')
+    if static_cache_dir:
+        max_mb = os.environ.get('GRDM_STATIC_CACHE_MAX_MB')
+        default_session.static_cache = StaticAssetCache(
+            os.path.expanduser(static_cache_dir),
+            max_bytes=int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_STATIC_CACHE_MAX_BYTES,
+            block_analytics=block_analytics,
+        )
+    else:
+        default_session.static_cache = None
+    return await default_session.start()
 
 async def finish_pw_context(screenshot=False, last_path=None):
-    global current_browser
-    await _finish_pw_context(screenshot=screenshot, last_path=last_path)
-    if current_browser is not None:
-        await current_browser.close()
-        current_browser = None
+    await default_session.finish(screenshot=screenshot, last_path=last_path)
 
 async def save_screenshot(path):
-    if current_contexts is None or len(current_contexts) == 0:
-        raise Exception('No contexts')
-    _, current_pages = current_contexts[-1]
-    if current_pages is None or len(current_pages) == 0:
-        raise Exception('Unexpected state')
-    await current_pages[-1].screenshot(path=path)
-    return path
+    return await default_session.save_screenshot(path)
 
 async def _save_screenshot(last_path=None):
-    if current_contexts is None or len(current_contexts) == 0:
-        raise Exception('No contexts')
-    _, current_pages = current_contexts[-1]
-    os.makedirs(last_path or default_last_path, exist_ok=True)
-    if current_pages is None or len(current_pages) == 0:
-        return
-    screenshot_path = os.path.join(temp_dir, 'last-screenshot.png')
-    await current_pages[-1].screenshot(path=screenshot_path)
-    dest_screenshot_path = os.path.join(last_path or default_last_path, 'last-screenshot.png')
-    shutil.copyfile(screenshot_path, dest_screenshot_path)
-    print(f'Screenshot: {dest_screenshot_path}')
+    await default_session._save_screenshot(last_path=last_path)
 
 async def _finish_pw_context(screenshot=False, last_path=None):
-    global current_contexts
-    if current_contexts is None or len(current_contexts) == 0:
-        return
-    current_context, current_pages = current_contexts[-1]
-    os.makedirs(last_path or default_last_path, exist_ok=True)
-    timeout_on_screenshot = False
-    if screenshot and current_pages is not None and len(current_pages) > 0:
-        try:
-            await _save_screenshot(last_path=last_path)
-        except:
-            print('スクリーンショットの取得に失敗しました。', file=sys.stderr)
-            traceback.print_exc()
-            timeout_on_screenshot = True
-    if timeout_on_screenshot:
-        return
-    current_contexts = current_contexts[::-1]
-    await current_context.close()
-    for i, current_page in enumerate(current_pages):
-        index = i + 1
-        try:
-            video_path = await current_page.video.path()
-            dest_video_path = os.path.join(last_path or default_last_path, f'video-{index}.webm')
-            shutil.copyfile(video_path, dest_video_path)
-            print(f'Video: {dest_video_path}')
-        except:
-            print('スクリーンキャプチャ動画の取得に失敗しました。', file=sys.stderr)
-            traceback.print_exc()
-            timeout_on_screenshot = True
-    if timeout_on_screenshot:
-        return   
-    har_path = os.path.join(temp_dir, 'har.zip')
-    dest_har_path = os.path.join(last_path or default_last_path, 'har.zip')
-    if os.path.exists(har_path):
-        shutil.copyfile(har_path, dest_har_path)
-        print(f'HAR: {dest_har_path}')
-    else:
-        print('.harファイルの取得に失敗しました。', file=sys.stderr)
-    shutil.rmtree(temp_dir)
-    for page in current_pages:
-        await page.close()
-    if len(current_contexts) == 0:
-        return
-    await _finish_pw_context(screenshot=False, last_path=last_path)
\ No newline at end of file
+    await default_session._finish_contexts(screenshot=screenshot, last_path=last_path)
@@ -0,0 +1,283 @@
+# テスト用のプロジェクトを使い回すためのプロジェクトプール
+#
+# ストレージ・アドオンの構成(NIISTORAGE, S3, S3COMPAT, METADATA など)ごとに、
+# 「TEST-POOL-<構成>-<番号>-<スロット>」という名前のプロジェクトをあらかじめ用意しておき、
+# 実行のたびにUIでプロジェクトを作成・削除する代わりに、APIで初期状態に戻して貸し出す:
+#
+#   client = api.RDMClient(rdm_url, rdm_token)
+#   pool = project_pool.ProjectPool(client, size=2)
+#   with pool.lease('S3', ['dashboard', 'filetab', 'metadata', 'toomany']) as lease:
+#       pm.execute_notebook(..., parameters=dict(rdm_project_prefix=lease.prefix, delete_project=False))
+#
+# 初期状態に戻す処理(reset_project)では、NII Storageのファイル、Metadataアドオンのファイルのメタデータ、
+# 作成者以外のメンバー、既定以外のアドオン(ストレージの接続設定を含む)を削除する。
+# 外部ストレージ(S3など)のバケット内のオブジェクトは削除しない。
+#
+# 貸し出し中であることはプロジェクトのタグ「pool-lease:<所有者>:<期限(UNIX時刻)>」で示す。
+# 期限を過ぎたタグは無視するため、異常終了した実行のプロジェクトも期限後に再び貸し出される。
+#
+# コマンドラインからは run_tests.py と同じ設定ファイル(rdm_url, rdm_token)を使って状態の確認・貸し出しの解除ができる:
+#
+#   python -m scripts.project_pool ci.config.yaml status
+#   python -m scripts.project_pool ci.config.yaml release --key S3
+
+import argparse
+import os
+import socket
+import sys
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from scripts import api
+
+POOL_PREFIX = 'TEST-POOL'
+LEASE_TAG_PREFIX = 'pool-lease:'
+DEFAULT_LEASE_SECONDS = 4 * 60 * 60
+# 初期状態に戻す際に無効にしないアドオン
+DEFAULT_KEEP_ADDONS = ('osfstorage', 'wiki')
+# 貸し出しのタグを書き込んでから、他の実行による書き込みと競合していないかを確認するまでの待ち時間(秒)
+SETTLE_SECONDS = 2
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+def project_title(prefix, slot):
+    return prefix if slot == '' else f'{prefix}-{slot}'
+
+
+def parse_lease_tag(tag):
+    """タグ 'pool-lease:<所有者>:<期限>' を (所有者, 期限) に変換する。貸し出しのタグでない場合は None"""
+    if not tag.startswith(LEASE_TAG_PREFIX):
+        return None
+    owner, _, expires = tag[len(LEASE_TAG_PREFIX):].rpartition(':')
+    try:
+        return owner, float(expires)
+    except ValueError:
+        return None
+
+
+def active_leases(project, now=None):
+    """プロジェクトに付けられた、期限内の貸し出しの所有者のリスト"""
+    now = now if now is not None else time.time()
+    leases = [parse_lease_tag(tag) for tag in project['attributes'].get('tags') or []]
+    return [owner for owner, expires in filter(None, leases) if expires > now]
+
+
+def _without_lease_tags(tags):
+    return [tag for tag in tags or [] if parse_lease_tag(tag) is None]
+
+
+@dataclass
+class Lease:
+    """
+    貸し出したプロジェクトの組。
+
+    prefix: Notebookに rdm_project_prefix (または rdm_project_name)として渡す名前
+    projects: スロット -> プロジェクト(APIのノード)
+    """
+    key: str
+    index: int
+    prefix: str
+    owner: str
+    projects: dict = field(default_factory=dict)
+
+
+class ProjectPool:
+    """
+    構成ごとに size 組までのプロジェクトを用意し、初期状態に戻して貸し出す。
+
+    :param client: api.RDMClient
+    :param size: 構成ごとのプロジェクトの組の最大数(並行して実行できる数)
+    :param lease_seconds: 貸し出しの期限(秒)。解除されないまま期限を過ぎた組は再び貸し出される
+    :param workers: 初期状態に戻す際の並行数
+    """
+
+    def __init__(self, client, size=1, lease_seconds=DEFAULT_LEASE_SECONDS, prefix=POOL_PREFIX,
+                 keep_addons=DEFAULT_KEEP_ADDONS, workers=8):
+        self.client = client
+        self.size = size
+        self.lease_seconds = lease_seconds
+        self.prefix = prefix
+        self.keep_addons = set(keep_addons)
+        self.workers = workers
+        self.owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._user_id = None
+
+    def set_prefix(self, key, index):
+        return f'{self.prefix}-{key.upper()}-{index}'
+
+    def find_projects(self, key):
+        """構成 key のプールのプロジェクトを、タイトル -> プロジェクト で返す"""
+        title_prefix = f'{self.prefix}-{key.upper()}-'
+        return {
+            project['attributes']['title']: project
+            for project in self.client.list_projects(title=title_prefix)
+            if project['attributes']['title'].startswith(title_prefix)
+        }
+
+    def acquire(self, key, slots):
+        """
+        構成 key のプロジェクトの組を貸し出す。組のプロジェクトが存在しない場合は作成し、存在する場合は初期状態に戻す。
+
+        :param slots: 組に含めるプロジェクトの名前の接尾辞('' は接尾辞なし)
+        :return: Lease
+        :raises PoolExhaustedError: すべての組が貸し出し中の場合
+        """
+        projects = self.find_projects(key)
+        now = time.time()
+        for index in range(1, self.size + 1):
+            prefix = self.set_prefix(key, index)
+            members = {slot: projects.get(project_title(prefix, slot)) for slot in slots}
+            if any(active_leases(project, now) for project in members.values() if project is not None):
+                continue
+            lease = self._try_lease(key, index, prefix, members)
+            if lease is None:
+                continue
+            started = time.monotonic()
+            self.reset(lease)
+            print(f'Leased {prefix} ({len(slots)} project(s), reset in {time.monotonic() - started:.1f}s)')
+            return lease
+        raise PoolExhaustedError(f'All {self.size} project set(s) of {key} are leased')
+
+    def _try_lease(self, key, index, prefix, members):
+        expires = time.time() + self.lease_seconds
+        tag = f'{LEASE_TAG_PREFIX}{self.owner}:{expires:.0f}'
+        lease = Lease(key=key, index=index, prefix=prefix, owner=self.owner)
+        for slot, project in members.items():
+            if project is None:
+                lease.projects[slot] = self.client.create_project(project_title(prefix, slot), tags=[tag])
+                continue
+            tags = _without_lease_tags(project['attributes'].get('tags')) + [tag]
+            lease.projects[slot] = self.client.update_project(project['id'], tags=tags)
+        # タグは上書きされるため、同時に貸し出そうとした他の実行がいれば、いずれか一方のタグのみが残る
+        time.sleep(SETTLE_SECONDS)
+        for slot, project in lease.projects.items():
+            lease.projects[slot] = self.client.get_project(project['id'])
+            if active_leases(lease.projects[slot]) != [self.owner]:
+                print(f'{prefix} was leased by another run at the same time; trying the next set')
+                self.release(lease, only_own=True)
+                return None
+        return lease
+
+    def release(self, lease, only_own=True):
+        """貸し出しのタグを削除する。only_own が False の場合は他の実行のタグも削除する"""
+        for project in lease.projects.values():
+            tags = project['attributes'].get('tags') or []
+            if only_own:
+                remaining = [tag for tag in tags if (parse_lease_tag(tag) or (None,))[0] != lease.owner]
+            else:
+                remaining = _without_lease_tags(tags)
+            if remaining != tags:
+                self.client.update_project(project['id'], tags=remaining)
+
+    @contextmanager
+    def lease(self, key, slots):
+        lease = self.acquire(key, slots)
+        try:
+            yield lease
+        finally:
+            try:
+                self.release(lease)
+            except Exception:
+                print(f'Failed to release {lease.prefix}; it will be released when the lease expires', file=sys.stderr)
+                traceback.print_exc()
+
+    def reset(self, lease):
+        """組のすべてのプロジェクトを並行して初期状態に戻す"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for future in [executor.submit(self.reset_project, project['id']) for project in lease.projects.values()]:
+                future.result()
+
+    def reset_project(self, node_id):
+        """
+        プロジェクトを作成直後の状態に戻す。
+
+        Metadataアドオンのメタデータはファイルより先に削除する(ファイルの削除後はパスを指定して削除できないため)。
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            self._clear_metadata(node_id, executor)
+            files = self.client.list_files(node_id, 'osfstorage')
+            list(executor.map(self.client.delete_file, files))
+            if self._user_id is None:
+                self._user_id = self.client.me()['id']
+            # メンバーのIDは '<プロジェクトのID>-<ユーザーのID>' の形式
+            contributors = [contributor['id'].split('-')[-1] for contributor in self.client.list_contributors(node_id)]
+            list(executor.map(lambda user_id: self.client.remove_contributor(node_id, user_id),
+                              [user_id for user_id in contributors if user_id != self._user_id]))
+        for addon in self.client.list_addons(node_id):
+            if addon['id'] in self.keep_addons:
+                continue
+            self.client.remove_addon(node_id, addon['id'])
+
+    def _clear_metadata(self, node_id, executor):
+        try:
+            metadata = self.client.get_project_metadata(node_id)
+        except api.RDMAPIError as e:
+            if e.status in (400, 404):
+                # Metadataアドオンが有効でない
+                return
+            raise
+        files = ((metadata or {}).get('data') or {}).get('attributes', {}).get('files') or []
+        list(executor.map(lambda item: self.client.delete_file_metadata(node_id, item['path']), files))
+
+    def status(self, key=None):
+        """(タイトル, 貸し出し中の所有者のリスト) のリスト"""
+        title_prefix = f'{self.prefix}-{key.upper()}-' if key else f'{self.prefix}-'
+        now = time.time()
+        return sorted(
+            (project['attributes']['title'], active_leases(project, now))
+            for project in self.client.list_projects(title=title_prefix)
+            if project['attributes']['title'].startswith(title_prefix)
+        )
+
+
+def pool_from_config(config):
+    """run_tests.py の設定ファイルの内容から ProjectPool を作成する"""
+    client = api.RDMClient(
+        config.get('rdm_url', 'https://rdm.example.com/'),
+        config.get('rdm_token') or os.environ.get('GRDM_RDM_TOKEN'),
+        api_url=config.get('rdm_api_url_v2'),
+    )
+    return ProjectPool(
+        client,
+        size=config.get('project_pool_size', 1),
+        lease_seconds=config.get('project_pool_lease_minutes', DEFAULT_LEASE_SECONDS // 60) * 60,
+    )
+
+
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(description='Show or release the pooled test projects')
+    parser.add_argument('config', help='Path to configuration YAML file (same format as run_tests.py)')
+    parser.add_argument('command', choices=['status', 'release'])
+    parser.add_argument('--key', help='Pool key such as NIISTORAGE, S3, S3COMPAT or METADATA (default: all)')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.load(f.read(), yaml.SafeLoader)
+    pool = pool_from_config(config)
+
+    if args.command == 'status':
+        for title, owners in pool.status(args.key):
+            print(f'{title}\t{"leased by " + ", ".join(owners) if owners else "available"}')
+        return 0
+
+    title_prefix = f'{pool.prefix}-{args.key.upper()}-' if args.key else f'{pool.prefix}-'
+    projects = [
+        project for project in pool.client.list_projects(title=title_prefix)
+        if project['attributes']['title'].startswith(title_prefix)
+    ]
+    pool.release(Lease(key=args.key or '', index=0, prefix=title_prefix, owner='', projects=dict(enumerate(projects))), only_own=False)
+    print(f'Released {len(projects)} project(s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# テスト実行中のリソース使用量を一定間隔で記録するためのサンプラ
+#
+# バックグラウンドスレッドで、自プロセス以下のプロセスツリー(papermillのカーネル、Chromium、Playwrightのドライバ)の
+# CPU使用率・RSS・オープン中のファイルディスクリプタ数と、指定したディレクトリのディスク使用量を記録する。
+# プロセスの情報は /proc から取得するため、Linux以外ではディスク使用量のみが記録される。
+#
+#   sampler = ResourceSampler({'work_dir': work_dir, 'result_dir': result_dir}, interval=5)
+#   sampler.start('result/xxx/resource-usage.csv', track_dir='result/xxx')
+#   ...
+#   peaks = sampler.stop()
+#   print(format_peaks(peaks))
+
+import csv
+import os
+import shutil
+import threading
+import time
+import traceback
+from datetime import datetime
+
+DEFAULT_INTERVAL = 5.0
+
+PROCESS_GROUPS = ['runner', 'kernel', 'chromium', 'driver', 'other']
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_MB = 1024 * 1024
+
+
+def _read_proc_stat(pid):
+    """/proc/<pid>/stat から (ppid, CPU時間(秒), RSS(バイト)) を取得する"""
+    with open(f'/proc/{pid}/stat', 'r') as f:
+        stat = f.read()
+    # comm は括弧で囲まれ、空白や括弧を含みうるため最後の ')' 以降を分割する
+    fields = stat[stat.rindex(')') + 2:].split()
+    ppid = int(fields[1])
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    rss = int(fields[21]) * _PAGE_SIZE
+    return ppid, cpu_seconds, rss
+
+
+def _read_cmdline(pid):
+    with open(f'/proc/{pid}/cmdline', 'rb') as f:
+        return f.read().replace(b'\0', b' ').decode('utf-8', errors='replace')
+
+
+def _classify(pid, cmdline):
+    if pid == os.getpid():
+        return 'runner'
+    if 'ipykernel' in cmdline:
+        return 'kernel'
+    if 'chrome' in cmdline or 'chromium' in cmdline or 'headless_shell' in cmdline:
+        return 'chromium'
+    if 'playwright' in cmdline:
+        return 'driver'
+    return 'other'
+
+
+def _count_fds(pid):
+    try:
+        return len(os.listdir(f'/proc/{pid}/fd'))
+    except OSError:
+        return 0
+
+
+def _scan_process_tree(root_pid):
+    """root_pid 以下のプロセスの {pid: (ppid, CPU時間, RSS)} を返す"""
+    processes = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            processes[int(name)] = _read_proc_stat(name)
+        except (OSError, ValueError, IndexError):
+            # 走査中に終了したプロセス
+            continue
+    children = {}
+    for pid, (ppid, _, _) in processes.items():
+        children.setdefault(ppid, []).append(pid)
+    tree = {}
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid not in processes:
+            continue
+        tree[pid] = processes[pid]
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _is_within(path, parent):
+    return os.path.join(os.path.abspath(path), '').startswith(os.path.join(os.path.abspath(parent), ''))
+
+
+def _scan_dir(path, track_dir=None):
+    """
+    ディレクトリ以下の合計サイズと、最後に更新された .ipynb ファイルを返す。
+
+    track_dir を指定した場合は、その中の .ipynb ファイルのみを対象とする。
+    """
+    track_prefix = os.path.join(os.path.abspath(track_dir), '') if track_dir else None
+    total = 0
+    latest_notebook = None
+    latest_mtime = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            total += stat.st_size
+            if entry.name.endswith('.ipynb') and stat.st_mtime > latest_mtime and (
+                    track_prefix is None or os.path.abspath(entry.path).startswith(track_prefix)):
+                latest_mtime = stat.st_mtime
+                latest_notebook = entry.path
+    return total, latest_notebook
+
+
+class ResourceSampler:
+    """
+    リソース使用量を interval 秒ごとに記録する。
+
+    start() から stop() までの記録を1つのタイムライン(CSV)として保存し、stop() でピーク値を返す。
+    track_dir を指定すると、その中で最後に更新されたNotebookを実行中のNotebookとして記録する。
+    """
+
+    def __init__(self, dirs, interval=DEFAULT_INTERVAL, root_pid=None):
+        self.dirs = dirs
+        self.interval = interval
+        self.root_pid = root_pid or os.getpid()
+        self.columns = [
+            'time', 'elapsed', 'notebook', 'cpu_percent', 'processes', 'open_fds', 'rss_total_mb',
+        ] + [f'rss_{group}_mb' for group in PROCESS_GROUPS] + [
+            f'{name}_mb' for name in dirs
+        ] + ['fs_used_mb', 'fs_free_mb']
+        self.samples = []
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._cpu_times = {}
+        self._last_sampled = None
+        self._proc_available = os.path.isdir('/proc')
+
+    def start(self, timeline_path, track_dir=None):
+        if self._thread is not None:
+            raise RuntimeError('Sampler is already running')
+        self.timeline_path = timeline_path
+        self.track_dir = track_dir
+        self.samples = []
+        self._started = time.monotonic()
+        self._stop_event.clear()
+        self._file = open(timeline_path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns)
+        self._writer.writeheader()
+        # 開始時点のCPU時間を記録しておき、最初のサンプルから使用率を計算できるようにする
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """記録を終了し、ピーク値を返す"""
+        if self._thread is None:
+            return None
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._sample()
+        self._file.close()
+        return self.peaks()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        try:
+            sample = self._collect()
+        except Exception:
+            traceback.print_exc()
+            return
+        self.samples.append(sample)
+        self._writer.writerow(sample)
+        self._file.flush()
+
+    def _collect(self):
+        now = time.monotonic()
+        sample = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'elapsed': round(now - self._started, 1),
+            'notebook': None,
+        }
+        if self._proc_available:
+            sample.update(self._collect_processes(now))
+        latest_notebook = None
+        tracked = False
+        for name, path in self.dirs.items():
+            if not path or not os.path.isdir(path):
+                sample[f'{name}_mb'] = 0
+                continue
+            # track_dir を含むディレクトリの走査で実行中のNotebookも求め、track_dir を再度走査しない
+            track_dir = self.track_dir if self.track_dir and not tracked and _is_within(self.track_dir, path) else None
+            size, notebook = _scan_dir(path, track_dir=track_dir)
+            if track_dir is not None:
+                tracked = True
+                latest_notebook = notebook
+            sample[f'{name}_mb'] = round(size / _MB, 1)
+        if self.track_dir and not tracked and os.path.isdir(self.track_dir):
+            _, latest_notebook = _scan_dir(self.track_dir)
+        if latest_notebook is not None:
+            sample['notebook'] = os.path.relpath(latest_notebook, self.track_dir)
+        usage = shutil.disk_usage(self.track_dir or os.getcwd())
+        sample['fs_used_mb'] = round(usage.used / _MB, 1)
+        sample['fs_free_mb'] = round(usage.free / _MB, 1)
+        return sample
+
+    def _collect_processes(self, now):
+        tree = _scan_process_tree(self.root_pid)
+        rss = {group: 0 for group in PROCESS_GROUPS}
+        cpu_delta = 0.0
+        open_fds = 0
+        cpu_times = {}
+        for pid, (_, cpu_seconds, pid_rss) in tree.items():
+            try:
+                group = _classify(pid, _read_cmdline(pid))
+            except OSError:
+                continue
+            rss[group] += pid_rss
+            open_fds += _count_fds(pid)
+            cpu_times[pid] = cpu_seconds
+            # 前回のサンプル以降に起動したプロセスは、起動からのCPU時間をすべて計上する
+            cpu_delta += cpu_seconds - self._cpu_times.get(pid, 0.0)
+        wall = now - self._last_sampled if self._last_sampled is not None else None
+        self._cpu_times = cpu_times
+        self._last_sampled = now
+        result = {
+            'cpu_percent': round(100 * cpu_delta / wall, 1) if wall else None,
+            'processes': len(tree),
+            'open_fds': open_fds,
+            'rss_total_mb': round(sum(rss.values()) / _MB, 1),
+        }
+        for group in PROCESS_GROUPS:
+            result[f'rss_{group}_mb'] = round(rss[group] / _MB, 1)
+        return result
+
+    def peaks(self):
+        """各列の最大値(空き容量は最小値)と、そのときに実行中だったNotebookを返す"""
+        peaks = {'samples': len(self.samples), 'duration': self.samples[-1]['elapsed'] if self.samples else 0}
+        for column in self.columns[3:]:
+            values = [s for s in self.samples if s.get(column) is not None]
+            if len(values) == 0:
+                peaks[column] = None
+                continue
+            pick = min if column == 'fs_free_mb' else max
+            peak = pick(values, key=lambda s: s[column])
+            peaks[column] = peak[column]
+            peaks[f'{column}_at'] = peak['notebook']
+        return peaks
+
+
+def format_peaks(peaks):
+    def value(column, unit):
+        if peaks.get(column) is None:
+            return '-'
+        return f'{peaks[column]}{unit}'
+    text = (
+        f"  Peak resources: CPU {value('cpu_percent', '%')}, RSS {value('rss_total_mb', ' MB')} "
+        f"(kernel {value('rss_kernel_mb', ' MB')}, chromium {value('rss_chromium_mb', ' MB')}), "
+        f"open fds {value('open_fds', '')}, min disk free {value('fs_free_mb', ' MB')}"
+    )
+    if peaks.get('rss_total_mb_at'):
+        text += f"\n  Peak RSS at: {peaks['rss_total_mb_at']}"
+    return text
+
+
+def write_peak_summary(path, rows):
+    """Notebookごとのピーク値を1つのCSVに保存する"""
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
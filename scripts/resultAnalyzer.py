@@ -1,11 +1,15 @@
-import nbformat
-from nbformat import NotebookNode
+from __future__ import annotations
+
 import re
 from pathlib import Path
 from base64 import b64decode
 from dataclasses import dataclass
 from typing import Iterator
 from itertools import islice
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from nbformat import NotebookNode
 
 def is_markdown_cell(cell):
     return cell['cell_type'] == 'markdown'
@@ -22,14 +26,23 @@ def has_header2(markdown_cell):
 def has_outputs(cell):
     return 'outputs' in cell
 
+# run_pw が出力するスクリーンショットのMIMEタイプと拡張子(scripts/screenshots.py を参照)
+SCREENSHOT_MIME_TYPES = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/webp': '.webp'}
+
+def screenshot_mime_type(output):
+    if 'data' not in output:
+        return None
+    return next((mime_type for mime_type in SCREENSHOT_MIME_TYPES if mime_type in output['data']), None)
+
 def has_screenshots(output):
-    return 'data' in output and 'image/png' in output['data']
+    return screenshot_mime_type(output) is not None
 
 def is_step_sequence_header(markdown_cell):
     m = re.match(r'#\s+(.+)', source_first_line(markdown_cell))
     return bool(m) and m.group(1) != '報告書出力'
 
 def iter_step_sequences(notebook_file):
+    import nbformat
     notebook = nbformat.read(notebook_file, as_version=nbformat.NO_CONVERT)
     cells = notebook['cells']
     current_header = None
@@ -75,8 +88,8 @@ def iter_step_result(cells: Iterator[NotebookNode]) -> Iterator[tuple[NotebookNo
     if current_header is not None:
         yield current_header, buffer
 
-def save_screenshot_from_cell(suffix, screenshot_base64, save_dir):
-    filename = save_dir.joinpath(f'screenshot-{suffix}.png')
+def save_screenshot_from_cell(suffix, screenshot_base64, save_dir, mime_type='image/png'):
+    filename = save_dir.joinpath(f'screenshot-{suffix}{SCREENSHOT_MIME_TYPES[mime_type]}')
     with open(filename, 'wb') as f:
         f.write(b64decode(screenshot_base64))
     return filename
@@ -84,8 +97,6 @@ def save_screenshot_from_cell(suffix, screenshot_base64, save_dir):
 # The existance of `cell['outputs']` is assumed.
 def extract_images_from_cell(step_index, cell, work_dir):
     return [
-        save_screenshot_from_cell(f'{step_index}-{i}', img, work_dir)
-        for i, img in enumerate([
-            out['data']['image/png'] for out in cell['outputs'] if has_screenshots(out)
-        ])
+        save_screenshot_from_cell(f'{step_index}-{i}', out['data'][screenshot_mime_type(out)], work_dir, screenshot_mime_type(out))
+        for i, out in enumerate([out for out in cell['outputs'] if has_screenshots(out)])
     ]
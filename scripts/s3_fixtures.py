@@ -0,0 +1,146 @@
+# S3・S3互換ストレージのテスト用バケットに、テストの前提となるオブジェクトを作成するためのユーティリティ関数群
+#
+# 「ファイル数が多い場合の表示」のテストでは、バケットに 0001 〜 1500 の1500個のオブジェクトが必要となる。
+# 1つのboto3クライアント(接続プールを共有する)をスレッドプールから使い、存在しないキーのみを並行して作成する:
+#
+#   s3 = s3_fixtures.make_client(s3_access_key_2, s3_secret_access_key_2, s3_default_region_2)
+#   result = s3_fixtures.seed_keys(s3, s3_test_bucket_name_2, s3_fixtures.fixture_keys(1500))
+#   print(result.format())
+#
+# endpoint_url を指定すると、MinIO などのS3互換ストレージやmotoのサーバーモードに対して実行できる。
+# コマンドラインからは run_tests.py と同じ設定ファイルを使って実行できる:
+#
+#   python -m scripts.s3_fixtures ci.config.yaml --storage s3 --account 2 --count 1500
+#   python -m scripts.s3_fixtures ci.config.yaml --storage s3 --account 2 --endpoint-url http://localhost:9000
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+DEFAULT_WORKERS = 32
+
+
+def fixture_keys(count, start=1, width=4):
+    """'0001', '0002', ... の形式のキーを count 個返す"""
+    return ['{0:0{1}d}'.format(i, width) for i in range(start, start + count)]
+
+
+def make_client(access_key, secret_access_key, region=None, endpoint_url=None, workers=DEFAULT_WORKERS):
+    """スレッド間で共有するboto3のS3クライアントを作成する。接続プールの大きさはワーカー数に合わせる"""
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        's3',
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_access_key,
+        region_name=region,
+        endpoint_url=endpoint_url,
+        config=Config(max_pool_connections=workers, retries={'max_attempts': 5, 'mode': 'adaptive'}),
+    )
+
+
+@dataclass
+class SeedResult:
+    bucket: str
+    requested: int
+    existing: int
+    created: int
+    list_seconds: float
+    put_seconds: float
+
+    @property
+    def objects_per_sec(self):
+        return self.created / self.put_seconds if self.created > 0 and self.put_seconds > 0 else None
+
+    def format(self):
+        rate = f'{self.objects_per_sec:.1f} objects/s' if self.objects_per_sec is not None else '-'
+        return (
+            f'{self.bucket}: {self.requested} key(s), {self.existing} existing, {self.created} created '
+            f'(list {self.list_seconds:.1f}s, put {self.put_seconds:.1f}s, {rate})'
+        )
+
+
+def list_keys(s3, bucket, prefix=''):
+    """バケット内の prefix で始まるキーの集合"""
+    keys = set()
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys.update(obj['Key'] for obj in page.get('Contents', []))
+    return keys
+
+
+def seed_keys(s3, bucket, keys, body=b'', workers=DEFAULT_WORKERS):
+    """
+    バケットに keys のオブジェクトを作成する。既に存在するキーは作成しない。
+
+    :param s3: boto3のS3クライアント。スレッドプールのすべてのワーカーで共有する
+    :param body: オブジェクトの内容
+    :return: SeedResult
+    """
+    started = time.monotonic()
+    prefix = _common_prefix(keys)
+    existing = list_keys(s3, bucket, prefix=prefix)
+    missing = [key for key in keys if key not in existing]
+    list_seconds = time.monotonic() - started
+
+    started = time.monotonic()
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda key: s3.put_object(Bucket=bucket, Key=key, Body=body), missing))
+    return SeedResult(
+        bucket=bucket,
+        requested=len(keys),
+        existing=len(keys) - len(missing),
+        created=len(missing),
+        list_seconds=list_seconds,
+        put_seconds=time.monotonic() - started,
+    )
+
+
+def _common_prefix(keys):
+    if not keys:
+        return ''
+    first, last = min(keys), max(keys)
+    i = 0
+    while i < min(len(first), len(last)) and first[i] == last[i]:
+        i += 1
+    return first[:i]
+
+
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(description='Create the fixture objects used by the S3 tests')
+    parser.add_argument('config', help='Path to configuration YAML file (same format as run_tests.py)')
+    parser.add_argument('--storage', default='s3', help='Storage ID such as s3 or s3compat (default: %(default)s)')
+    parser.add_argument('--account', type=int, default=2, help='Account number of the test bucket (default: %(default)s)')
+    parser.add_argument('--count', type=int, default=1500, help='Number of keys (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent requests (default: %(default)s)')
+    parser.add_argument('--bucket', help='Bucket name (default: <storage>_test_bucket_name_<account>)')
+    parser.add_argument('--endpoint-url', help='Endpoint URL such as a local MinIO (default: <storage>_endpoint_url_<account>)')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.load(f.read(), yaml.SafeLoader)
+    prefix = f'{args.storage}_'
+    suffix = f'_{args.account}'
+    s3 = make_client(
+        config.get(f'{prefix}access_key{suffix}'),
+        config.get(f'{prefix}secret_access_key{suffix}'),
+        region=config.get(f'{prefix}default_region{suffix}'),
+        endpoint_url=args.endpoint_url or config.get(f'{prefix}endpoint_url{suffix}'),
+        workers=args.workers,
+    )
+    bucket = args.bucket or config.get(f'{prefix}test_bucket_name{suffix}')
+    if not bucket:
+        print(f'{prefix}test_bucket_name{suffix} is not set', file=sys.stderr)
+        return 1
+    result = seed_keys(s3, bucket, fixture_keys(args.count), workers=args.workers)
+    print(result.format())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Sanitize Jupyter notebooks before commit in a single pass.
+
+This is the only implementation of the notebook cleaning rules, which were
+previously split across clean_notebook_metadata.py, replace_rdm_url.py and
+clean_output.py. Each notebook is loaded and written only once:
+
+- remove lc_server_signature.history from notebook and cell metadata
+- replace rdm.nii.ac.jp URLs and email addresses in markdown and parameters cells
+- clear outputs of cells containing rdm.nii.ac.jp URLs, email addresses or AWS access keys
+
+The cleaned notebooks are identical to the ones the three former scripts
+produced when run one after another.
+
+Notebooks known to be clean are remembered in a cache keyed by the SHA-256 of
+their content and RULESET_VERSION, so unchanged notebooks are not parsed again.
+
+Usage:
+    python sanitize_notebooks.py --check <notebook.ipynb> [notebook2.ipynb ...]
+    python sanitize_notebooks.py --fix <notebook.ipynb> [notebook2.ipynb ...]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Bump this whenever a rule changes in a way that affects the cleaned output
+RULESET_VERSION = 1
+
+RDM_NII_HOST = 'rdm.nii.ac.jp'
+RDM_URL_PATTERN = re.compile(r'https?://([^/]*\.)?(rdm\.nii\.ac\.jp)')
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# AWS access key pattern: 20 characters starting with AKIA, ABIA, ACCA, or ASIA
+AWS_ACCESS_KEY_PREFIXES = ('AKIA', 'ABIA', 'ACCA', 'ASIA')
+AWS_ACCESS_KEY_PATTERN = re.compile(r'\b(?:AKIA|ABIA|ACCA|ASIA)[A-Z0-9]{16}\b')
+SENSITIVE_OUTPUT_PATTERN = re.compile('|'.join([
+    r'rdm\.nii\.ac\.jp',
+    EMAIL_PATTERN.pattern,
+    AWS_ACCESS_KEY_PATTERN.pattern,
+]))
+
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'sanitize_notebooks.json')
+# Entries of notebooks not seen for a long time are dropped beyond this count
+MAX_CACHE_ENTRIES = 1000
+
+# MIME types whose payloads are base64 encoded binary data
+BINARY_MIME_TYPES = ('application/pdf',)
+TEXT_IMAGE_MIME_TYPES = ('image/svg+xml',)
+
+
+def is_binary_mime_type(mime_type):
+    """Check if output data of the MIME type is base64 encoded binary."""
+    if mime_type in TEXT_IMAGE_MIME_TYPES:
+        return False
+    return mime_type.startswith('image/') or mime_type in BINARY_MIME_TYPES
+
+
+def _text_contains_sensitive(text, binary=False):
+    # The URL and email rules need '.' or '@', which never appear in base64,
+    # so binary payloads only have to be checked for AWS access keys
+    if binary and '@' not in text and '.' not in text:
+        if not any(prefix in text for prefix in AWS_ACCESS_KEY_PREFIXES):
+            return False
+        return bool(AWS_ACCESS_KEY_PATTERN.search(text))
+    return bool(SENSITIVE_OUTPUT_PATTERN.search(text))
+
+
+def contains_sensitive(content, binary=False):
+    """Check if content contains rdm.nii.ac.jp URL, email address or AWS access token."""
+    if isinstance(content, str):
+        return _text_contains_sensitive(content, binary=binary)
+    elif isinstance(content, list):
+        return any(contains_sensitive(item, binary=binary) for item in content)
+    elif isinstance(content, dict):
+        return any(contains_sensitive(v, binary=binary) for v in content.values())
+    else:
+        return False
+
+
+def output_contains_sensitive(output):
+    """Check a cell output, skipping the expensive rules for binary MIME payloads."""
+    if not isinstance(output, dict):
+        return contains_sensitive(output)
+    for key, value in output.items():
+        if key == 'data' and isinstance(value, dict):
+            if any(
+                contains_sensitive(payload, binary=is_binary_mime_type(mime_type))
+                for mime_type, payload in value.items()
+            ):
+                return True
+        elif contains_sensitive(value):
+            return True
+    return False
+
+
+def _replace_email(match):
+    email = match.group(0)
+    if email.endswith('@example.com'):
+        return email
+    # Extract username part and create example email
+    username = email.split('@')[0]
+    return f"{username}@example.com"
+
+
+def replace_sensitive_text(text):
+    """Replace rdm.nii.ac.jp URLs with rdm.example.com, then emails with example.com ones."""
+    if RDM_NII_HOST in text:
+        # Replace URLs while preserving subdomains
+        text = RDM_URL_PATTERN.sub(r'https://\1rdm.example.com', text)
+    if '@' in text:
+        text = EMAIL_PATTERN.sub(_replace_email, text)
+    return text
+
+
+def replace_sensitive_source(content):
+    if isinstance(content, str):
+        return replace_sensitive_text(content)
+    elif isinstance(content, list):
+        return [replace_sensitive_source(item) for item in content]
+    else:
+        return content
+
+
+def _remove_signature_history(metadata, meme_key):
+    if meme_key not in metadata:
+        return False
+    if 'lc_server_signature' not in metadata[meme_key]:
+        return False
+    if 'history' not in metadata[meme_key]['lc_server_signature']:
+        return False
+    del metadata[meme_key]['lc_server_signature']['history']
+    return True
+
+
+def _is_sanitized_source_cell(cell):
+    is_markdown = cell.get('cell_type') == 'markdown'
+    is_parameters_code = (
+        cell.get('cell_type') == 'code' and
+        'metadata' in cell and
+        'tags' in cell['metadata'] and
+        'parameters' in cell['metadata']['tags']
+    )
+    return is_markdown or is_parameters_code
+
+
+def sanitize_notebook(notebook):
+    """
+    Apply all rules to a loaded notebook in place.
+
+    :param notebook: notebook JSON object
+    :return: dict with the number of changes made by each rule
+    """
+    stats = {
+        'history_removed': 0,
+        'sources_replaced': 0,
+        'outputs_cleared': 0,
+    }
+
+    if 'metadata' in notebook:
+        if _remove_signature_history(notebook['metadata'], 'lc_notebook_meme'):
+            stats['history_removed'] += 1
+
+    for cell in notebook.get('cells', []):
+        if 'metadata' in cell:
+            if _remove_signature_history(cell['metadata'], 'lc_cell_meme'):
+                stats['history_removed'] += 1
+
+        if 'source' in cell and _is_sanitized_source_cell(cell):
+            original = cell['source']
+            cell['source'] = replace_sensitive_source(original)
+            if original != cell['source']:
+                stats['sources_replaced'] += 1
+
+        if 'outputs' in cell and len(cell['outputs']) > 0:
+            if any(output_contains_sensitive(output) for output in cell['outputs']):
+                cell['outputs'] = []
+                stats['outputs_cleared'] += 1
+    return stats
+
+
+def sanitize_file(notebook_path, fix=False):
+    """
+    Sanitize a notebook file.
+
+    :param notebook_path: path of the notebook
+    :param fix: write the cleaned notebook back (True) or only report what would change (False)
+    :return: dict with the path, the number of changes by each rule and whether the notebook was modified
+    """
+    with open(notebook_path, 'r', encoding='utf-8') as f:
+        notebook = json.load(f)
+
+    result = sanitize_notebook(notebook)
+    result['path'] = str(notebook_path)
+    result['modified'] = any(result[key] > 0 for key in ('history_removed', 'sources_replaced', 'outputs_cleared'))
+
+    if result['modified'] and fix:
+        with open(notebook_path, 'w', encoding='utf-8') as f:
+            json.dump(notebook, f, indent=1, ensure_ascii=False)
+    return result
+
+
+def file_sha256(path):
+    """Calculate the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CleanNotebookCache:
+    """
+    Persistent set of content hashes of notebooks known to be clean.
+
+    The whole cache is discarded when RULESET_VERSION differs from the one it was written with.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable cache {self.path}: {e}")
+            return
+        if data.get('ruleset_version') != RULESET_VERSION:
+            return
+        self.entries = data.get('clean', {})
+
+    def save(self):
+        entries = sorted(self.entries.items(), key=lambda item: item[1]['last_seen'], reverse=True)
+        data = {
+            'ruleset_version': RULESET_VERSION,
+            'clean': dict(entries[:MAX_CACHE_ENTRIES]),
+        }
+        cache_dir = os.path.dirname(self.path) or '.'
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write atomically so that concurrent hook runs never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def lookup(self, sha256, size):
+        """Check if the content is known to be clean, counting hits and misses."""
+        if sha256 in self.entries:
+            self.entries[sha256]['last_seen'] = time.time()
+            self.hits += 1
+            self.hit_bytes += size
+            return True
+        self.misses += 1
+        self.miss_bytes += size
+        return False
+
+    def add(self, sha256, size):
+        self.entries[sha256] = {'size': size, 'last_seen': time.time()}
+
+    def summary(self):
+        total = self.hits + self.misses
+        total_bytes = self.hit_bytes + self.miss_bytes
+        ratio = self.hit_bytes / total_bytes * 100 if total_bytes > 0 else 0
+        return (
+            f"Cache: {self.hits} hit(s), {self.misses} miss(es) of {total} notebook(s); "
+            f"skipped {self.hit_bytes / 1024 / 1024:.1f} MB of {total_bytes / 1024 / 1024:.1f} MB ({ratio:.0f}%)"
+        )
+
+
+def _sanitize_file_task(args):
+    notebook_path, fix = args
+    result = sanitize_file(notebook_path, fix=fix)
+    if not result['modified'] or fix:
+        # Content on disk is clean now, hash it for the cache
+        result['sha256'] = file_sha256(notebook_path)
+        result['size'] = os.path.getsize(notebook_path)
+    return result
+
+
+def sanitize_files(notebook_paths, fix=False, jobs=None):
+    """Sanitize notebook files in parallel, yielding results in the given order."""
+    tasks = [(path, fix) for path in notebook_paths]
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _sanitize_file_task(task)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_sanitize_file_task, tasks)
+
+
+def format_changes(result):
+    changes = []
+    if result['history_removed']:
+        changes.append(f"removed {result['history_removed']} lc_server_signature.history")
+    if result['sources_replaced']:
+        changes.append(f"replaced URLs/emails in {result['sources_replaced']} cells")
+    if result['outputs_cleared']:
+        changes.append(f"cleaned outputs from {result['outputs_cleared']} cells containing sensitive information")
+    return ', '.join(changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Remove sensitive metadata, URLs, emails and outputs from Jupyter notebooks'
+    )
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
+        '--check',
+        action='store_true',
+        help='Report notebooks that need cleaning without writing them (exit status 1 if any)'
+    )
+    mode.add_argument(
+        '--fix',
+        action='store_true',
+        help='Write cleaned notebooks in place'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of notebooks processed in parallel (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--cache',
+        default=DEFAULT_CACHE_PATH,
+        help=f'Path of the cache of notebooks known to be clean (default: {DEFAULT_CACHE_PATH})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Scan all notebooks without reading or updating the cache'
+    )
+    parser.add_argument(
+        'notebooks',
+        nargs='+',
+        help='Notebook files to sanitize'
+    )
+    args = parser.parse_args()
+
+    notebook_paths = []
+    for filepath in args.notebooks:
+        path = Path(filepath)
+        if path.suffix == '.ipynb' and path.exists():
+            notebook_paths.append(path)
+        else:
+            print(f"Warning: {filepath} is not a valid notebook file or doesn't exist")
+
+    cache = None
+    if not args.no_cache:
+        cache = CleanNotebookCache(args.cache)
+        cache.load()
+        uncached_paths = []
+        for path in notebook_paths:
+            if cache.lookup(file_sha256(path), path.stat().st_size):
+                print(f"No changes needed (cached): {path}")
+            else:
+                uncached_paths.append(path)
+        notebook_paths_to_scan = uncached_paths
+    else:
+        notebook_paths_to_scan = notebook_paths
+
+    modified_count = 0
+    for result in sanitize_files(notebook_paths_to_scan, fix=args.fix, jobs=args.jobs):
+        if cache is not None and 'sha256' in result:
+            cache.add(result['sha256'], result['size'])
+        if not result['modified']:
+            print(f"No changes needed: {result['path']}")
+            continue
+        modified_count += 1
+        action = 'Updated' if args.fix else 'Needs cleaning'
+        print(f"{action}: {result['path']} ({format_changes(result)})")
+
+    if cache is not None:
+        cache.save()
+        print(cache.summary())
+
+    if args.fix:
+        print(f"\nCleaned {modified_count} notebook(s)")
+        return 0
+    print(f"\n{modified_count} of {len(notebook_paths)} notebook(s) need cleaning")
+    return 1 if modified_count > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
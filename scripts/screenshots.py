@@ -0,0 +1,294 @@
+# run_pw のステップごとのスクリーンショットを取得するためのユーティリティ関数群
+#
+# 既定では従来どおり表示領域全体をPNGで取得し、取得が完了してからステップを終了する。
+# 以下の環境変数で取得方法を変更できる:
+#
+#   GRDM_SCREENSHOT_FORMAT            png(既定), jpeg, webp
+#   GRDM_SCREENSHOT_QUALITY           jpeg・webpの品質(0-100、既定は80)
+#   GRDM_SCREENSHOT_MAX_DIMENSION     幅・高さの最大値(ピクセル)。超える場合はブラウザ側で縮小して取得する
+#   GRDM_SCREENSHOT_ONLY_ON_CHANGE    1 の場合、前回のスクリーンショットから見た目が変化した場合のみ取得する
+#   GRDM_SCREENSHOT_CHANGE_THRESHOLD  変化とみなす知覚ハッシュのハミング距離(既定は1)
+#   GRDM_SCREENSHOT_BACKGROUND        1 の場合、取得を開始した時点でステップを終了し、エンコードと
+#                                     Notebookへの出力を次のステップと並行して行う
+#
+# 見た目の変化は、縮小したサムネイルから求めた差分ハッシュ(dHash)で判定する。
+# 失敗時に保存する last-screenshot.png は、これらの設定によらず常にPNGで取得する。
+
+import asyncio
+import base64
+import os
+import struct
+import sys
+import traceback
+import weakref
+import zlib
+from dataclasses import dataclass
+
+FORMATS = ('png', 'jpeg', 'webp')
+
+# 知覚ハッシュを求めるサムネイルの長辺(ピクセル)と、ハッシュの一辺のビット数
+THUMBNAIL_DIMENSION = 64
+HASH_SIZE = 16
+
+# ページごとのCDPセッション
+_cdp_sessions = weakref.WeakKeyDictionary()
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+@dataclass
+class ScreenshotOptions:
+    """
+    run_pw のステップごとのスクリーンショットの取得方法。
+
+    format: 画像の形式('png', 'jpeg', 'webp')
+    quality: jpeg・webpの品質(0-100)
+    max_dimension: 幅・高さの最大値(ピクセル)。Noneの場合は縮小しない
+    only_on_change: 前回のスクリーンショットから見た目が変化した場合のみ取得するか
+    change_threshold: 変化とみなす知覚ハッシュのハミング距離
+    background: 取得を待たずにステップを終了するか
+    """
+    format: str = 'png'
+    quality: int = 80
+    max_dimension: int = None
+    only_on_change: bool = False
+    change_threshold: int = 1
+    background: bool = False
+
+    @classmethod
+    def from_env(cls):
+        max_dimension = os.environ.get('GRDM_SCREENSHOT_MAX_DIMENSION')
+        options = cls(
+            format=os.environ.get('GRDM_SCREENSHOT_FORMAT', 'png').lower(),
+            quality=int(os.environ.get('GRDM_SCREENSHOT_QUALITY', '80')),
+            max_dimension=int(max_dimension) if max_dimension else None,
+            only_on_change=_env_flag('GRDM_SCREENSHOT_ONLY_ON_CHANGE'),
+            change_threshold=int(os.environ.get('GRDM_SCREENSHOT_CHANGE_THRESHOLD', '1')),
+            background=_env_flag('GRDM_SCREENSHOT_BACKGROUND'),
+        )
+        if options.format not in FORMATS:
+            raise ValueError(f'Unsupported screenshot format: {options.format} (expected one of {FORMATS})')
+        return options
+
+    def is_default(self):
+        return self == ScreenshotOptions()
+
+
+class Screenshot:
+    """Notebookに出力するスクリーンショット。IPython.display.Image が扱えない webp も出力できる"""
+
+    def __init__(self, data, format='png'):
+        self.data = data
+        self.format = format
+
+    @property
+    def mime_type(self):
+        return f'image/{self.format}'
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+        return {
+            self.mime_type: base64.b64encode(self.data).decode('ascii'),
+            'text/plain': f'<Screenshot {self.format} {len(self.data)} bytes>',
+        }
+
+
+async def _cdp_session(page):
+    cdp = _cdp_sessions.get(page)
+    if cdp is None:
+        cdp = await page.context.new_cdp_session(page)
+        _cdp_sessions[page] = cdp
+    return cdp
+
+
+async def capture(page, format='png', quality=None, max_dimension=None):
+    """表示領域のスクリーンショットを取得し、画像のバイト列を返す"""
+    return await (await start_capture(page, format=format, quality=quality, max_dimension=max_dimension))
+
+
+async def start_capture(page, format='png', quality=None, max_dimension=None):
+    """
+    スクリーンショットの取得を要求し、画像のバイト列を返す Future を返す。要求はこの関数から戻る前にブラウザに送られる。
+
+    Chromiumでは Page.captureScreenshot により、縮小とエンコードをブラウザ側で行う。
+    CDPが利用できない場合は page.screenshot で取得する(webpはjpegとなり、縮小は行わない)。
+    """
+    try:
+        cdp = await _cdp_session(page)
+        metrics = await cdp.send('Page.getLayoutMetrics')
+    except Exception:
+        _cdp_sessions.pop(page, None)
+        if page.is_closed():
+            raise
+        kwargs = {'type': 'png' if format == 'png' else 'jpeg'}
+        if kwargs['type'] == 'jpeg' and quality is not None:
+            kwargs['quality'] = quality
+        request = asyncio.ensure_future(page.screenshot(**kwargs))
+        await asyncio.sleep(0)
+        return request
+    viewport = metrics['cssVisualViewport']
+    width, height = viewport['clientWidth'], viewport['clientHeight']
+    params = {'format': format, 'optimizeForSpeed': True}
+    if format != 'png' and quality is not None:
+        params['quality'] = quality
+    if max_dimension is not None and max(width, height) > max_dimension:
+        params['clip'] = {
+            'x': viewport['pageX'],
+            'y': viewport['pageY'],
+            'width': width,
+            'height': height,
+            'scale': max_dimension / max(width, height),
+        }
+    request = asyncio.ensure_future(cdp.send('Page.captureScreenshot', params))
+    # タスクを開始させ、要求をブラウザに送る
+    await asyncio.sleep(0)
+    return asyncio.ensure_future(_decode_capture(request))
+
+
+async def _decode_capture(request):
+    result = await request
+    return base64.b64decode(result['data'])
+
+
+def _decode_png_gray(data):
+    """8ビット・インターレースなしのPNGを、グレースケールの (幅, 高さ, 画素のリスト) に変換する"""
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('Not a PNG image')
+    pos = 8
+    idat = []
+    width = height = channels = None
+    while pos < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b'IHDR':
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+            channels = {0: 1, 2: 3, 4: 2, 6: 4}.get(color_type)
+            if bit_depth != 8 or channels is None or interlace != 0:
+                raise ValueError(f'Unsupported PNG: bit depth {bit_depth}, color type {color_type}')
+        elif chunk_type == b'IDAT':
+            idat.append(chunk)
+        elif chunk_type == b'IEND':
+            break
+    raw = zlib.decompress(b''.join(idat))
+    stride = width * channels
+    previous = bytearray(stride)
+    pixels = []
+    for y in range(height):
+        offset = y * (stride + 1)
+        filter_type = raw[offset]
+        row = bytearray(raw[offset + 1:offset + 1 + stride])
+        for i in range(stride):
+            a = row[i - channels] if i >= channels else 0
+            b = previous[i]
+            c = previous[i - channels] if i >= channels else 0
+            if filter_type == 1:
+                row[i] = (row[i] + a) & 0xFF
+            elif filter_type == 2:
+                row[i] = (row[i] + b) & 0xFF
+            elif filter_type == 3:
+                row[i] = (row[i] + ((a + b) >> 1)) & 0xFF
+            elif filter_type == 4:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predictor = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                row[i] = (row[i] + predictor) & 0xFF
+        for x in range(width):
+            px = row[x * channels:x * channels + min(channels, 3)]
+            pixels.append(sum(px) // len(px) if channels >= 3 else px[0])
+        previous = row
+    return width, height, pixels
+
+
+def perceptual_hash(png_data, hash_size=HASH_SIZE):
+    """PNG画像の差分ハッシュ(dHash)を整数で返す"""
+    width, height, pixels = _decode_png_gray(png_data)
+    columns = hash_size + 1
+    # 各ブロックの平均輝度に縮小する
+    grid = []
+    for gy in range(hash_size):
+        y0, y1 = gy * height // hash_size, max((gy + 1) * height // hash_size, gy * height // hash_size + 1)
+        for gx in range(columns):
+            x0, x1 = gx * width // columns, max((gx + 1) * width // columns, gx * width // columns + 1)
+            block = [pixels[y * width + x] for y in range(y0, min(y1, height)) for x in range(x0, min(x1, width))]
+            grid.append(sum(block) / len(block) if block else 0)
+    bits = 0
+    for gy in range(hash_size):
+        for gx in range(hash_size):
+            left = grid[gy * columns + gx]
+            right = grid[gy * columns + gx + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return bits
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class StepScreenshots:
+    """ScreenshotOptions に従ってステップごとのスクリーンショットを取得する"""
+
+    def __init__(self, options):
+        self.options = options
+        self.last_hash = None
+        self.pending = None
+        self.captured = 0
+        self.skipped = 0
+
+    async def _has_changed(self, page):
+        thumbnail = await capture(page, 'png', max_dimension=THUMBNAIL_DIMENSION)
+        try:
+            current = perceptual_hash(thumbnail)
+        except ValueError:
+            # 対応していない形式の場合は変化したものとみなす
+            self.last_hash = None
+            return True
+        changed = self.last_hash is None or hamming_distance(current, self.last_hash) >= self.options.change_threshold
+        if changed:
+            self.last_hash = current
+        return changed
+
+    async def capture_step(self, page):
+        """
+        ステップの終了時のスクリーンショットを取得する。
+
+        :return: Notebookに出力する Screenshot。見た目が変化していない場合、またはバックグラウンドで取得する場合は None
+        """
+        await self.wait()
+        if self.options.only_on_change and not await self._has_changed(page):
+            self.skipped += 1
+            print('Screenshot: skipped (no visible change)')
+            return None
+        self.captured += 1
+        request = await start_capture(
+            page,
+            format=self.options.format,
+            quality=self.options.quality,
+            max_dimension=self.options.max_dimension,
+        )
+        if not self.options.background:
+            return Screenshot(await request, self.options.format)
+        from IPython.display import display
+        handle = display({'text/plain': 'Screenshot: pending'}, raw=True, display_id=True)
+        self.pending = asyncio.ensure_future(self._update(request, handle))
+        return None
+
+    async def _update(self, request, handle):
+        screenshot = Screenshot(await request, self.options.format)
+        if handle is not None:
+            handle.update(screenshot)
+
+    async def wait(self):
+        """バックグラウンドで取得中のスクリーンショットの完了を待つ"""
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return
+        try:
+            await pending
+        except Exception:
+            print('スクリーンショットの取得に失敗しました。', file=sys.stderr)
+            traceback.print_exc()
+
+    def format_stats(self):
+        return f'Screenshots: {self.captured} captured, {self.skipped} skipped (no visible change)'
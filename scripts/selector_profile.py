@@ -0,0 +1,348 @@
+# grdm のロケータの解決時間と一致数を計測するためのユーティリティ関数群
+#
+# 環境変数 GRDM_PROFILE_SELECTORS=1 を指定するか、enable() を呼ぶと有効になる。
+# grdm のロケータが生成されたとき(操作や expect で使われる直前)に、その時点のページ上で解決し、
+# 解決時間と一致数を記録する。計測はセッション(Session)の run_pw のステップごとにまとめられる。
+# 記録した結果は finish_pw_context 時に結果ディレクトリへ保存される:
+#
+#   selector-profile.jsonl          ロケータごとの計測結果
+#   selector-profile-summary.csv    ロケータの種類・方式ごとの集計
+#   selector-dom-<step>.html        ロケータが使われた時点のDOMスナップショット
+#
+# DOMスナップショットに対して xpath 方式と scoped 方式を比較するには、以下のように実行する:
+#
+#   python -m scripts.selector_profile result/selector-dom-3.html --profile result/selector-profile.jsonl
+
+import argparse
+import asyncio
+import contextvars
+import csv
+import json
+import os
+import statistics
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+
+summary_columns = ['kind', 'strategy', 'calls', 'max_count', 'p50_ms', 'p95_ms', 'max_ms']
+benchmark_columns = ['kind', 'args', 'strategy', 'count', 'p50_ms', 'min_ms', 'max_ms', 'mismatch']
+
+_profiler = None
+# Session が use() で設定する、実行中のセッションの記録先
+_session_profiler = contextvars.ContextVar('selector_profile_session_profiler')
+
+
+class SelectorProfiler:
+    """ロケータが生成されたときにページ上で計測し、run_pw のステップごとにまとめる"""
+
+    def __init__(self, repeat=5, snapshot=True):
+        self.repeat = repeat
+        self.snapshot = snapshot
+        self.pending = {}
+        self.tasks = []
+        self.samples = []
+        self.snapshots = {}
+        self.step_snapshots = {}
+        self.step = 1
+
+    def record(self, page, kind, args, kwargs, strategy, locator):
+        key = (id(page), kind, json.dumps(list(args)), json.dumps(kwargs, sort_keys=True), strategy)
+        if key in self.pending:
+            self.pending[key]['uses'] += 1
+            return
+        entry = {
+            'page': page,
+            'kind': kind,
+            'args': list(args),
+            'kwargs': kwargs,
+            'strategy': strategy,
+            'locator': locator,
+            'uses': 1,
+        }
+        self.pending[key] = entry
+        # ロケータは生成の直後に使われるため、ここで計測を開始し、使われた時点のDOMで解決する
+        try:
+            self.tasks.append(asyncio.ensure_future(self._measure(entry, self.step)))
+        except RuntimeError:
+            print(f"Failed to profile locator outside the event loop: {kind} {list(args)}", file=sys.stderr)
+
+    async def _measure(self, entry, step):
+        page = entry['page']
+        if page.is_closed():
+            return
+        try:
+            count, durations, baseline = await measure_locator(page, entry['locator'], self.repeat)
+            snapshot_name = await self._save_snapshot(page, step) if self.snapshot else None
+        except Exception:
+            print(f"Failed to profile locator: {entry['kind']} {entry['args']}", file=sys.stderr)
+            traceback.print_exc()
+            return
+        entry['sample'] = {
+            'step': step,
+            'url': page.url,
+            'kind': entry['kind'],
+            'args': entry['args'],
+            'kwargs': entry['kwargs'],
+            'strategy': entry['strategy'],
+            'uses': entry['uses'],
+            'count': count,
+            'duration_ms': statistics.median(durations),
+            'roundtrip_ms': baseline,
+            'snapshot': snapshot_name,
+        }
+        self.samples.append(entry['sample'])
+
+    async def _save_snapshot(self, page, step):
+        html = await page.content()
+        # 同じステップで同じDOMを計測した場合は、スナップショットを共有する
+        names = self.step_snapshots.setdefault(step, {})
+        if html not in names:
+            names[html] = f'selector-dom-{step}.html' if len(names) == 0 \
+                else f'selector-dom-{step}-{len(names) + 1}.html'
+            self.snapshots[names[html]] = html
+        return names[html]
+
+    async def measure_pending(self):
+        """ステップ中に開始した計測の完了を待ち、次のステップに進める"""
+        tasks = self.tasks
+        pending = list(self.pending.values())
+        self.tasks = []
+        self.pending = {}
+        if len(tasks) == 0:
+            return
+        step = self.step
+        self.step += 1
+        await asyncio.gather(*tasks)
+        self.step_snapshots.pop(step, None)
+        for entry in pending:
+            # 計測の開始後に同じロケータが再び使われた回数も含める
+            if 'sample' in entry:
+                entry['sample']['uses'] = entry['uses']
+
+    def summary(self):
+        groups = {}
+        for sample in self.samples:
+            groups.setdefault((sample['kind'], sample['strategy']), []).append(sample)
+        rows = []
+        for (kind, strategy), samples in groups.items():
+            durations = sorted(s['duration_ms'] for s in samples)
+            rows.append({
+                'kind': kind,
+                'strategy': strategy,
+                'calls': sum(s['uses'] for s in samples),
+                'max_count': max(s['count'] for s in samples),
+                'p50_ms': _percentile(durations, 50),
+                'p95_ms': _percentile(durations, 95),
+                'max_ms': durations[-1],
+            })
+        return sorted(rows, key=lambda row: -row['p95_ms'])
+
+    def write_report(self, result_dir):
+        if len(self.samples) == 0:
+            return None
+        os.makedirs(result_dir, exist_ok=True)
+        profile_path = os.path.join(result_dir, 'selector-profile.jsonl')
+        with open(profile_path, 'w') as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+        with open(os.path.join(result_dir, 'selector-profile-summary.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=summary_columns)
+            writer.writeheader()
+            writer.writerows(self.summary())
+        for name, html in self.snapshots.items():
+            with open(os.path.join(result_dir, name), 'w') as f:
+                f.write(html)
+        self.samples = []
+        self.snapshots = {}
+        return profile_path
+
+
+def _percentile(sorted_values, p):
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def measure_locator(page, locator, repeat):
+    """
+    ロケータの一致数と解決時間(ミリ秒)を計測する。
+
+    :return: (一致数, 各回の解決時間のリスト, ページとの往復時間の中央値)。解決時間は往復時間を差し引いた値
+    """
+    roundtrips = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await page.evaluate('0')
+        roundtrips.append((time.perf_counter() - start) * 1000)
+    durations = []
+    count = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = await locator.count()
+        durations.append((time.perf_counter() - start) * 1000)
+    baseline = statistics.median(roundtrips)
+    return count, [max(0.0, d - baseline) for d in durations], baseline
+
+
+def enable(repeat=5, snapshot=True):
+    global _profiler
+    _profiler = SelectorProfiler(repeat=repeat, snapshot=snapshot)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def is_enabled():
+    return _profiler is not None
+
+
+def new_profiler():
+    """有効な場合は、セッションごとの記録先を enable() と同じ設定で新しく作成する"""
+    if _profiler is None:
+        return None
+    return SelectorProfiler(repeat=_profiler.repeat, snapshot=_profiler.snapshot)
+
+
+@contextmanager
+def use(profiler):
+    """囲んだ範囲で生成されたロケータの記録先を profiler にする。None の場合は計測しない"""
+    token = _session_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _session_profiler.reset(token)
+
+
+def _current():
+    return _session_profiler.get(_profiler)
+
+
+def record(page, kind, args, kwargs, strategy, locator):
+    profiler = _current()
+    if profiler is None:
+        return
+    profiler.record(page, kind, args, kwargs, strategy, locator)
+
+
+async def measure_pending():
+    profiler = _current()
+    if profiler is None:
+        return
+    await profiler.measure_pending()
+
+
+def write_report(result_dir, profiler=None):
+    profiler = profiler or _current()
+    if profiler is None:
+        return None
+    profile_path = profiler.write_report(result_dir)
+    if profile_path is not None:
+        print(f'Selector profile: {profile_path}')
+    return profile_path
+
+
+async def benchmark_snapshot(html_path, cases, repeat=20, strategies=None, headless=True):
+    """
+    DOMスナップショットに対して、各ロケータを方式ごとに解決し、一致数と解決時間を比較する。
+
+    :param html_path: selector-dom-*.html のパス
+    :param cases: (kind, args, kwargs) のリスト
+    :param repeat: 計測の繰り返し回数
+    :param strategies: 比較する方式(省略時は grdm.LOCATOR_STRATEGIES)
+    :return: benchmark_columns をキーとする辞書のリスト
+    """
+    from playwright.async_api import async_playwright
+    from scripts import grdm
+
+    strategies = strategies or grdm.LOCATOR_STRATEGIES
+    with open(html_path, 'r') as f:
+        html = f.read()
+    rows = []
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=headless, args=["--no-sandbox", "--disable-dev-shm-usage"])
+        try:
+            # スナップショットのスクリプトやリソースは読み込まない
+            context = await browser.new_context(java_script_enabled=False)
+            await context.route('**/*', lambda route: route.abort())
+            page = await context.new_page()
+            await page.set_content(html)
+            for kind, args, kwargs in cases:
+                case_rows = []
+                for strategy in strategies:
+                    locator = grdm.get_select_locator(page, kind, *args, strategy=strategy, **kwargs)
+                    count, durations, _ = await measure_locator(page, locator, repeat)
+                    case_rows.append({
+                        'kind': kind,
+                        'args': json.dumps(list(args) + ([kwargs] if kwargs else []), ensure_ascii=False),
+                        'strategy': strategy,
+                        'count': count,
+                        'p50_ms': statistics.median(durations),
+                        'min_ms': min(durations),
+                        'max_ms': max(durations),
+                    })
+                mismatch = len(set(row['count'] for row in case_rows)) > 1
+                for row in case_rows:
+                    row['mismatch'] = mismatch
+                rows.extend(case_rows)
+        finally:
+            await browser.close()
+    return rows
+
+
+def _load_cases(profile_path, snapshot_name):
+    cases = []
+    seen = set()
+    with open(profile_path, 'r') as f:
+        for line in f:
+            sample = json.loads(line)
+            if snapshot_name is not None and sample.get('snapshot') != snapshot_name:
+                continue
+            key = (sample['kind'], json.dumps(sample['args']), json.dumps(sample['kwargs'], sort_keys=True))
+            if key in seen:
+                continue
+            seen.add(key)
+            cases.append((sample['kind'], sample['args'], sample['kwargs']))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark grdm locator strategies against a recorded DOM snapshot'
+    )
+    parser.add_argument('snapshot', help='DOM snapshot (selector-dom-*.html)')
+    parser.add_argument('--profile', help='selector-profile.jsonl recorded with the snapshot; its locators are replayed')
+    parser.add_argument('--all-steps', action='store_true', help='Replay locators of all steps, not only those captured with the snapshot')
+    parser.add_argument('--case', nargs='+', action='append', metavar=('KIND', 'ARG'), default=[],
+                        help='Locator to benchmark, e.g. --case storage_title "NII Storage"')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of measurements per locator')
+    parser.add_argument('--csv', help='Write the results to the CSV file')
+    args = parser.parse_args()
+
+    disable()
+    cases = [(case[0], case[1:], {}) for case in args.case]
+    if args.profile is not None:
+        snapshot_name = None if args.all_steps else os.path.basename(args.snapshot)
+        cases.extend(_load_cases(args.profile, snapshot_name))
+    if len(cases) == 0:
+        parser.error('No locators to benchmark; specify --profile or --case')
+
+    rows = asyncio.run(benchmark_snapshot(args.snapshot, cases, repeat=args.repeat))
+    print('\t'.join(benchmark_columns))
+    for row in rows:
+        print('\t'.join(f'{row[c]:.3f}' if isinstance(row[c], float) else str(row[c]) for c in benchmark_columns))
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=benchmark_columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    return 1 if any(row['mismatch'] for row in rows) else 0
+
+
+if os.environ.get('GRDM_PROFILE_SELECTORS', '').lower() in ('1', 'true', 'yes'):
+    enable()
+
+if __name__ == '__main__':
+    sys.exit(main())
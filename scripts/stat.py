@@ -1,10 +1,11 @@
 import json
-import pandas as pd
 import re
 
 header_pattern = re.compile(r'#+\s+(\S.*)$')
 
 def get_notebook_stats(notebook_path):
+    # pandas は読み込みに時間がかかるため、利用するときに読み込む
+    import pandas as pd
     with open(notebook_path, 'r') as f:
         notebook = json.load(f)
     cells = notebook['cells']
@@ -0,0 +1,214 @@
+# RDMの静的アセットをディスク上にキャッシュし、ページ表示ごとの再ダウンロードを避けるためのルートハンドラ
+#
+# コンテキスト・実行をまたいで共有されるキャッシュで、以下のように利用する:
+#
+#   cache = StaticAssetCache(os.path.expanduser('~/.cache/rdm-e2e-static'), block_analytics=True)
+#   await cache.attach(context)
+#   ...
+#   cache.save()
+#   print(cache.format_stats())
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import traceback
+from urllib.parse import urlsplit
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Ember bundles (/ember_osf_web/assets/)、/static/ 以下(アドオンのアイコンやMFRのアセットを含む)、Webフォント
+STATIC_ASSET_PATTERN = re.compile(
+    r'^https?://(?:'
+    r'[^/]+/(?:[^?#]*/)?(?:static|assets|fonts)/[^?#]+'
+    r'|fonts\.(?:googleapis|gstatic)\.com/.*'
+    r')'
+)
+# ファイル名にハッシュを含む、またはクエリでバージョン指定されたURLは内容が変わらないとみなす
+VERSIONED_ASSET_PATTERN = re.compile(r'([.-][0-9a-f]{8,}\.[a-z0-9]+$)|(\?.+)')
+
+DEFAULT_ANALYTICS_HOSTS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'hotjar.com',
+    'newrelic.com',
+    'nr-data.net',
+]
+
+# キャッシュから応答するときに引き継がないヘッダ
+_EXCLUDED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie', 'date'}
+
+
+def is_versioned_asset(url):
+    parts = urlsplit(url)
+    if parts.query:
+        return True
+    return bool(VERSIONED_ASSET_PATTERN.search(parts.path))
+
+
+def _analytics_pattern(hosts):
+    escaped = '|'.join(re.escape(host) for host in hosts)
+    return re.compile(rf'^https?://(?:[^/]*\.)?(?:{escaped})(?::\d+)?/')
+
+
+class StaticAssetCache:
+    """
+    URLごとの静的アセットをディスクにキャッシュする。
+
+    本体は内容のSHA-256をファイル名として保存し、インデックスにURL、ETag/Last-Modified、最終利用時刻を記録する。
+    バージョン付きのURLはキャッシュから直接応答し、それ以外はETag/Last-Modifiedで再検証する。
+    合計サイズが max_bytes を超えた場合は、最終利用時刻の古いものから削除する。
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, block_analytics=False, analytics_hosts=None):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.max_bytes = max_bytes
+        self.block_analytics = block_analytics
+        self.analytics_pattern = _analytics_pattern(analytics_hosts or DEFAULT_ANALYTICS_HOSTS)
+        self.index = {}
+        self.stats = {
+            'hits': 0,
+            'revalidated': 0,
+            'misses': 0,
+            'blocked': 0,
+            'bytes_saved': 0,
+            'bytes_fetched': 0,
+        }
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            print(f'Ignoring unreadable static asset cache index: {self.index_path}')
+            traceback.print_exc()
+            self.index = {}
+
+    def save(self):
+        self._evict()
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(temp_path, self.index_path)
+
+    async def attach(self, context):
+        """コンテキストにルートハンドラを登録する"""
+        await context.route(STATIC_ASSET_PATTERN, self._handle_static_asset)
+        if self.block_analytics:
+            await context.route(self.analytics_pattern, self._handle_analytics)
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256)
+
+    def _cached_entry(self, url):
+        entry = self.index.get(url)
+        if entry is None or not os.path.exists(self._blob_path(entry['sha256'])):
+            return None
+        return entry
+
+    async def _fulfill_from_cache(self, route, entry):
+        entry['last_access'] = time.time()
+        with open(self._blob_path(entry['sha256']), 'rb') as f:
+            body = f.read()
+        self.stats['bytes_saved'] += len(body)
+        await route.fulfill(status=200, headers=entry['headers'], body=body)
+
+    def _store(self, url, headers, body):
+        sha256 = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(sha256)
+        if not os.path.exists(blob_path):
+            fd, temp_path = tempfile.mkstemp(dir=self.blob_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(temp_path, blob_path)
+        self.index[url] = {
+            'sha256': sha256,
+            'size': len(body),
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'headers': {k: v for k, v in headers.items() if k.lower() not in _EXCLUDED_HEADERS},
+            'last_access': time.time(),
+        }
+
+    async def _handle_static_asset(self, route):
+        request = route.request
+        if request.method != 'GET':
+            await route.fallback()
+            return
+        url = request.url
+        entry = self._cached_entry(url)
+        if entry is not None and is_versioned_asset(url):
+            self.stats['hits'] += 1
+            await self._fulfill_from_cache(route, entry)
+            return
+
+        headers = dict(request.headers)
+        if entry is not None:
+            if entry.get('etag'):
+                headers['if-none-match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['if-modified-since'] = entry['last_modified']
+        try:
+            response = await route.fetch(headers=headers)
+        except Exception:
+            # 取得に失敗した場合は通常の経路に任せる
+            await route.fallback()
+            return
+
+        if response.status == 304 and entry is not None:
+            self.stats['revalidated'] += 1
+            await self._fulfill_from_cache(route, entry)
+            return
+
+        body = await response.body()
+        self.stats['misses'] += 1
+        self.stats['bytes_fetched'] += len(body)
+        if response.status == 200:
+            self._store(url, response.headers, body)
+        await route.fulfill(response=response, body=body)
+
+    async def _handle_analytics(self, route):
+        self.stats['blocked'] += 1
+        await route.abort('blockedbyclient')
+
+    def _evict(self):
+        blob_sizes = {}
+        for entry in self.index.values():
+            blob_sizes[entry['sha256']] = entry['size']
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return
+        # 最終利用時刻の古いURLから削除し、参照されなくなった本体を消す
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            del self.index[url]
+            sha256 = entry['sha256']
+            if any(e['sha256'] == sha256 for e in self.index.values()):
+                continue
+            total -= blob_sizes[sha256]
+            blob_path = self._blob_path(sha256)
+            if os.path.exists(blob_path):
+                os.remove(blob_path)
+
+    def format_stats(self):
+        stats = self.stats
+        return (
+            f"Static asset cache: {stats['hits']} hit(s), {stats['revalidated']} revalidated, "
+            f"{stats['misses']} miss(es), {stats['blocked']} blocked; "
+            f"saved {stats['bytes_saved'] / 1024 / 1024:.1f} MB, "
+            f"fetched {stats['bytes_fetched'] / 1024 / 1024:.1f} MB"
+        )
+
+    def write_stats(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.stats, f, indent=1)
@@ -0,0 +1,364 @@
+# ストレージへのアップロード・ダウンロードの所要時間とスループットを計測するためのユーティリティ関数群
+#
+# 環境変数 GRDM_BENCHMARK_TRANSFERS=1 を指定するか、enable() を呼ぶと有効になる。
+# measure() で囲んだ操作について、Playwrightのネットワークイベントから
+# WaterButlerへのリクエスト開始 → WaterButlerの応答 → ファイル一覧(Treebeard)への表示 の時刻を記録する:
+#
+#   async with transfer_benchmark.measure(page, 'upload', filepath=filepath, storage=target_storage_name):
+#       await grdm.upload_file(page, filepath)
+#       await expect(grdm.get_select_file_title_locator(page, filename)).to_be_visible(timeout=transition_timeout)
+#
+# 記録した結果は finish_pw_context 時に結果ディレクトリの transfers.jsonl に追記される。
+# run_pw のステップ内の計測はセッション(Session)ごとに記録され、各セッションの結果ディレクトリに保存される。
+# 過去の実行と比較するには、以下のように実行する:
+#
+#   python -m scripts.transfer_benchmark result --fail-on-regression 30
+
+import argparse
+import contextvars
+import csv
+import glob
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import parse_qs, urlsplit
+
+comparison_columns = [
+    'kind', 'size', 'storage', 'runs', 'latest_mbps', 'baseline_mbps', 'change_pct',
+    'latest_seconds', 'baseline_seconds',
+]
+
+# WaterButler API: /v1/resources/<node>/providers/<provider>/<path>
+WATERBUTLER_PATTERN = re.compile(r'/v1/resources/([^/]+)/providers/([^/]+)/')
+
+_recorder = None
+# Session が use() で設定する、実行中のセッションの記録先
+_session_recorder = contextvars.ContextVar('transfer_benchmark_session_recorder')
+
+
+class TransferRecorder:
+    """measure() で囲んだ転送ごとの計測結果を記録する"""
+
+    def __init__(self):
+        self.samples = []
+
+    @asynccontextmanager
+    async def measure(self, page, kind, filepath=None, name=None, nbytes=None, storage=None):
+        name = name or (os.path.basename(filepath) if filepath else None)
+        transfer = {
+            'kind': kind,
+            'storage': storage,
+            'name': name,
+            'bytes': nbytes if nbytes is not None else (os.path.getsize(filepath) if filepath else None),
+        }
+        requests = []
+
+        def _on_request(request):
+            if not _is_transfer_request(request, kind, name):
+                return
+            requests.append({'request': request, 'start': time.time(), 'response': None})
+
+        def _on_response(response):
+            for entry in requests:
+                if entry['request'] is response.request and entry['response'] is None:
+                    entry['response'] = time.time()
+                    entry['status'] = response.status
+
+        page.on('request', _on_request)
+        page.on('response', _on_response)
+        started = time.time()
+        try:
+            yield transfer
+        finally:
+            page.remove_listener('request', _on_request)
+            page.remove_listener('response', _on_response)
+        finished = time.time()
+
+        entry = requests[0] if len(requests) > 0 else None
+        request_start = _timing_start(entry) if entry is not None else started
+        response = _timing_response(entry, request_start) if entry is not None else None
+        m = WATERBUTLER_PATTERN.search(entry['request'].url) if entry is not None else None
+        transfer.update({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'url': page.url,
+            'provider': m.group(2) if m else None,
+            'status': entry.get('status') if entry is not None else None,
+            'request_seconds': response - request_start if response is not None else None,
+            # アップロードはファイル一覧への表示、ダウンロードは保存の完了までの時間
+            'total_seconds': finished - request_start,
+        })
+        transfer_seconds = transfer['request_seconds'] if kind == 'upload' else transfer['total_seconds']
+        transfer['bytes_per_sec'] = transfer['bytes'] / transfer_seconds \
+            if transfer['bytes'] and transfer_seconds else None
+        self.samples.append(transfer)
+        print(format_sample(transfer))
+
+    def write_report(self, result_dir):
+        if len(self.samples) == 0:
+            return None
+        os.makedirs(result_dir, exist_ok=True)
+        path = os.path.join(result_dir, 'transfers.jsonl')
+        # 1つのNotebookの中で finish_pw_context が複数回呼ばれることがあるため追記する
+        with open(path, 'a') as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+        self.samples = []
+        return path
+
+
+def _is_transfer_request(request, kind, name):
+    if WATERBUTLER_PATTERN.search(request.url) is None:
+        return False
+    query = parse_qs(urlsplit(request.url).query, keep_blank_values=True)
+    if kind == 'upload':
+        if request.method != 'PUT':
+            return False
+        return name is None or name in query.get('name', []) or request.url.split('?')[0].endswith(name)
+    if kind == 'download_zip':
+        return request.method == 'GET' and 'zip' in query
+    return request.method == 'GET'
+
+
+def _timing_start(entry):
+    """ブラウザが記録したリクエストの開始時刻(取得できない場合はイベントの受信時刻)"""
+    try:
+        timing = entry['request'].timing
+        if timing.get('startTime', -1) > 0:
+            return timing['startTime'] / 1000
+    except Exception:
+        pass
+    return entry['start']
+
+
+def _timing_response(entry, request_start):
+    try:
+        timing = entry['request'].timing
+        if timing.get('startTime', -1) > 0 and timing.get('responseStart', -1) >= 0:
+            return request_start + timing['responseStart'] / 1000
+    except Exception:
+        pass
+    return entry['response']
+
+
+def format_size(nbytes):
+    if nbytes is None:
+        return '-'
+    for unit, size in [('GB', 1024 ** 3), ('MB', 1024 ** 2), ('kB', 1024)]:
+        if nbytes >= size * 0.95:
+            return f'{round(nbytes / size)}{unit}'
+    return f'{nbytes}B'
+
+
+def format_sample(sample):
+    rate = f"{sample['bytes_per_sec'] / 1024 / 1024:.2f} MB/s" if sample['bytes_per_sec'] else '-'
+    request = f"{sample['request_seconds']:.1f}s" if sample['request_seconds'] is not None else '-'
+    return (
+        f"Transfer: {sample['kind']} {format_size(sample['bytes'])} to {sample['storage'] or sample['provider']}: "
+        f"{rate}, request {request}, total {sample['total_seconds']:.1f}s"
+    )
+
+
+def enable():
+    global _recorder
+    _recorder = TransferRecorder()
+    return _recorder
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def is_enabled():
+    return _recorder is not None
+
+
+def new_recorder():
+    """有効な場合は、セッションごとの記録先を新しく作成する"""
+    if _recorder is None:
+        return None
+    return TransferRecorder()
+
+
+@contextmanager
+def use(recorder):
+    """囲んだ範囲の measure() の記録先を recorder にする。None の場合は計測しない"""
+    token = _session_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _session_recorder.reset(token)
+
+
+def _current():
+    return _session_recorder.get(_recorder)
+
+
+@asynccontextmanager
+async def measure(page, kind, filepath=None, name=None, nbytes=None, storage=None):
+    """
+    囲んだ操作の転送を計測する。無効な場合は何もしない。
+
+    :param page: 操作するページ
+    :param kind: 'upload' または 'download_zip'
+    :param filepath: アップロードするファイルのパス(サイズとファイル名の取得に使用)
+    :param name: WaterButlerへのリクエストを特定するファイル名
+    :param nbytes: 転送量。ダウンロードの場合は保存後に yield された辞書の 'bytes' に設定してもよい
+    :param storage: ストレージの表示名
+    """
+    recorder = _current()
+    if recorder is None:
+        yield {}
+        return
+    async with recorder.measure(page, kind, filepath=filepath, name=name, nbytes=nbytes, storage=storage) as transfer:
+        yield transfer
+
+
+def write_report(result_dir, recorder=None):
+    recorder = recorder or _current()
+    if recorder is None or result_dir is None:
+        return None
+    path = recorder.write_report(result_dir)
+    if path is not None:
+        print(f'Transfer benchmark: {path}')
+    return path
+
+
+def load_runs(history_root):
+    """history_root 以下の結果ツリー(result-*)ごとの計測結果を、古い順に (実行ID, サンプルのリスト) で返す"""
+    runs = []
+    for tree in sorted(glob.glob(os.path.join(history_root, 'result-*'))):
+        samples = []
+        for path in glob.glob(os.path.join(tree, '**', 'transfers.jsonl'), recursive=True):
+            with open(path, 'r') as f:
+                samples.extend(json.loads(line) for line in f if line.strip())
+        if len(samples) > 0:
+            runs.append((os.path.basename(tree), samples))
+    return runs
+
+
+def _group(samples):
+    groups = {}
+    for sample in samples:
+        key = (sample['kind'], format_size(sample.get('bytes')), sample.get('storage') or sample.get('provider'))
+        groups.setdefault(key, []).append(sample)
+    return groups
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if len(values) > 0 else None
+
+
+def compare_runs(runs):
+    """最新の実行を、それ以前の実行の中央値と比較する"""
+    if len(runs) == 0:
+        return []
+    _, latest = runs[-1]
+    previous = {}
+    for _, samples in runs[:-1]:
+        for key, group in _group(samples).items():
+            previous.setdefault(key, []).append(group)
+    rows = []
+    for key, group in sorted(_group(latest).items(), key=lambda item: [str(k) for k in item[0]]):
+        kind, size, storage = key
+        latest_rate = _median(s.get('bytes_per_sec') for s in group)
+        latest_seconds = _median(s.get('total_seconds') for s in group)
+        baseline_groups = previous.get(key, [])
+        baseline_rate = _median(_median(s.get('bytes_per_sec') for s in g) for g in baseline_groups)
+        baseline_seconds = _median(_median(s.get('total_seconds') for s in g) for g in baseline_groups)
+        change = (latest_rate - baseline_rate) / baseline_rate * 100 \
+            if latest_rate is not None and baseline_rate else None
+        rows.append({
+            'kind': kind,
+            'size': size,
+            'storage': storage,
+            'runs': len(baseline_groups) + 1,
+            'latest_mbps': latest_rate / 1024 / 1024 if latest_rate is not None else None,
+            'baseline_mbps': baseline_rate / 1024 / 1024 if baseline_rate is not None else None,
+            'change_pct': change,
+            'latest_seconds': latest_seconds,
+            'baseline_seconds': baseline_seconds,
+        })
+    return rows
+
+
+def provider_table(samples):
+    """1回の実行について、転送の種類・サイズごとにストレージを列とした表(MB/s)を返す"""
+    groups = _group(samples)
+    storages = sorted(set(storage for _, _, storage in groups.keys()), key=str)
+    rows = []
+    for kind, size in sorted(set((kind, size) for kind, size, _ in groups.keys())):
+        row = {'kind': kind, 'size': size}
+        for storage in storages:
+            rate = _median(s.get('bytes_per_sec') for s in groups.get((kind, size, storage), []))
+            row[storage] = rate / 1024 / 1024 if rate is not None else None
+        rows.append(row)
+    return storages, rows
+
+
+def _format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
+
+
+def print_comparison(history_root, out=None):
+    out = out or sys.stdout
+    runs = load_runs(history_root)
+    if len(runs) == 0:
+        print(f'No transfer benchmark results under {history_root}', file=out)
+        return []
+    run_id, latest = runs[-1]
+    storages, rows = provider_table(latest)
+    print(f'\nTransfer throughput (MB/s) of {run_id}', file=out)
+    print('\t'.join(['kind', 'size'] + [str(s) for s in storages]), file=out)
+    for row in rows:
+        print('\t'.join([row['kind'], row['size']] + [_format_value(row[s]) for s in storages]), file=out)
+    comparison = compare_runs(runs)
+    print(f'\nCompared with {len(runs) - 1} previous run(s)', file=out)
+    print('\t'.join(comparison_columns), file=out)
+    for row in comparison:
+        print('\t'.join(_format_value(row[c]) for c in comparison_columns), file=out)
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare upload/download throughput per storage provider across result trees'
+    )
+    parser.add_argument('history_root', nargs='?', default='result', help='Directory containing result trees (result-*)')
+    parser.add_argument('--csv', help='Write the comparison to the CSV file')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PCT',
+                        help='Exit with 1 if the latest throughput is more than PCT%% below the previous runs')
+    args = parser.parse_args()
+
+    comparison = print_comparison(args.history_root)
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=comparison_columns)
+            writer.writeheader()
+            writer.writerows(comparison)
+    if args.fail_on_regression is not None:
+        regressions = [
+            row for row in comparison
+            if row['change_pct'] is not None and row['change_pct'] < -args.fail_on_regression
+        ]
+        for row in regressions:
+            print(f"Regression: {row['kind']} {row['size']} on {row['storage']}: {row['change_pct']:.1f}%", file=sys.stderr)
+        if len(regressions) > 0:
+            return 1
+    return 0
+
+
+if os.environ.get('GRDM_BENCHMARK_TRANSFERS', '').lower() in ('1', 'true', 'yes'):
+    enable()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,20 @@
 # エクセルファイルやそのシートについて、本プロジェクト特有の処理
 
+from functools import lru_cache
 from string import ascii_uppercase
 from itertools import product
-import openpyxl
-from openpyxl.styles import Alignment
-from openpyxl.styles import PatternFill
 
-header_bgcolor = PatternFill(start_color='AED6F1', fill_type='solid')
+# openpyxl はワークブックを作成するときに読み込む
+
+@lru_cache(maxsize=None)
+def _header_bgcolor():
+    from openpyxl.styles import PatternFill
+    return PatternFill(start_color='AED6F1', fill_type='solid')
+
+def __getattr__(name):
+    if name == 'header_bgcolor':
+        return _header_bgcolor()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 def workbook_column_names():
     length = 1
@@ -34,6 +42,7 @@ summary_columns = [
 ]
 
 def create_result_workbook():
+    import openpyxl
     wb = openpyxl.Workbook()
     summary_sheet = wb.worksheets[0]
     summary_sheet.title = 'サマリ'
@@ -41,7 +50,7 @@ def create_result_workbook():
     for colname, (_, header_text) in zip(workbook_column_names(), summary_columns):
         summary_sheet.column_dimensions[colname].width = column_width
         summary_sheet[f'{colname}1'] = header_text
-        summary_sheet[f'{colname}1'].fill = header_bgcolor
+        summary_sheet[f'{colname}1'].fill = _header_bgcolor()
     return wb
 
 case_result_sheet_headers = {
@@ -84,10 +93,11 @@ case_result_sheet_headers = {
 }
 
 def add_case_result_sheet(wb, step_seq_result):
+    from openpyxl.styles import Alignment
     sheet = wb.create_sheet(step_seq_result['step_seq_id'])
     for colname, (_, header_text) in zip(workbook_column_names(), case_result_sheet_headers['formal']):
         sheet[f'{colname}1'] = header_text
-        sheet[f'{colname}1'].fill = header_bgcolor
+        sheet[f'{colname}1'].fill = _header_bgcolor()
     sheet['A2'] = step_seq_result['step_seq_id']
     sheet['B2'] = step_seq_result['サブシステム名']
     sheet['C2'] = step_seq_result['機能分類']
@@ -98,7 +108,7 @@ def add_case_result_sheet(wb, step_seq_result):
 
     for colname, (_, header_text) in zip(workbook_column_names(), case_result_sheet_headers['semantical']):
         sheet[f'{colname}4'] = header_text
-        sheet[f'{colname}4'].fill = header_bgcolor
+        sheet[f'{colname}4'].fill = _header_bgcolor()
     sheet['A5'] = step_seq_result['概要'] if '概要' in step_seq_result else step_seq_result['title']
     sheet['A5'].alignment = Alignment(wrap_text=True)
     sheet.merge_cells('A4:B4')
@@ -117,14 +127,14 @@ def add_case_result_sheet(wb, step_seq_result):
     for cell in sheet['A5:J5'][0]:
         cell.alignment = Alignment(wrap_text=True, vertical='top')
     sheet['A6'] = '確認環境'
-    sheet['A6'].fill = header_bgcolor
+    sheet['A6'].fill = _header_bgcolor()
     sheet['B6'] = 'Ubuntu'
     sheet['C6'] = 'Chrome(Playwright)'
     sheet['D6'] = 'ja-JP'
 
     for colname, (_, header_text) in zip(workbook_column_names(), case_result_sheet_headers['steps']):
         sheet[f'{colname}8'] = header_text
-        sheet[f'{colname}8'].fill = header_bgcolor
+        sheet[f'{colname}8'].fill = _header_bgcolor()
 
     cell_standard_width = sheet.column_dimensions['A'].width
     sheet.column_dimensions['B'].width = cell_standard_width * 4
@@ -0,0 +1,227 @@
+# テストで使用する一時ディレクトリ(作業ディレクトリ)を管理するためのユーティリティ関数群
+#
+# 作業ディレクトリはすべて GRDM_WORKSPACE_ROOT (既定は <tempdir>/grdm-e2e) 以下に作成され、
+# 所有するプロセスのPIDなどを記録したマーカーファイルを持つ。
+# run_tests.py は Notebook ごとに作業ディレクトリを作成して環境変数 GRDM_WORKSPACE_DIR で渡し、
+# Notebook の成功・失敗・SIGTERM のいずれの場合も実行後に削除する。Notebook では以下のように利用する:
+#
+#   from scripts import workspace
+#   work_dir = workspace.mkdtemp()
+#   workspace.ensure_space(130 * 1024 * 1024, work_dir)
+#   !dd if=/dev/urandom of={filepath} bs=130M count=1
+#
+# 所有するプロセスが終了しているのに残っている作業ディレクトリは、前回の異常終了の残骸として
+# find_leftovers() / report_leftovers() で検出できる。手動で実行したNotebookの作業ディレクトリは
+# 結果の保存先として使われるため、保持するものとして記録し、検出の対象としない。
+
+import json
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager
+
+MARKER_NAME = '.grdm-workspace.json'
+
+_MB = 1024 * 1024
+_active_workspaces = []
+
+
+class WorkspaceQuotaError(OSError):
+    """作業ディレクトリの容量制限、またはファイルシステムの空き容量を超える書き込みが要求された"""
+
+
+def default_root():
+    return os.environ.get('GRDM_WORKSPACE_ROOT') or os.path.join(tempfile.gettempdir(), 'grdm-e2e')
+
+
+def get_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _read_marker(path):
+    try:
+        with open(os.path.join(path, MARKER_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Workspace:
+    """
+    所有者を記録した作業ディレクトリ。
+
+    scope() で Notebook ごとのサブディレクトリを払い出し、スコープを抜けるときに削除する。
+    quota_bytes を指定すると、ensure_space() でディレクトリ全体の使用量を制限する。
+    keep=True の場合は、所有するプロセスの終了後も find_leftovers() の対象としない。
+    """
+
+    def __init__(self, label='run', root=None, quota_bytes=None, keep=False):
+        self.root = root or default_root()
+        os.makedirs(self.root, exist_ok=True)
+        self.label = label
+        self.quota_bytes = quota_bytes
+        self.path = tempfile.mkdtemp(prefix=f'{label}-', dir=self.root)
+        with open(os.path.join(self.path, MARKER_NAME), 'w') as f:
+            json.dump({
+                'pid': os.getpid(),
+                'host': socket.gethostname(),
+                'label': label,
+                'created': time.time(),
+                'quota_bytes': quota_bytes,
+                'keep': keep,
+            }, f)
+        _active_workspaces.append(self)
+
+    @contextmanager
+    def scope(self, name):
+        """name のサブディレクトリを作成し、GRDM_WORKSPACE_DIR に設定する。終了時に削除する"""
+        scope_dir = tempfile.mkdtemp(prefix=f'{name}-', dir=self.path)
+        previous = os.environ.get('GRDM_WORKSPACE_DIR')
+        os.environ['GRDM_WORKSPACE_DIR'] = scope_dir
+        try:
+            yield scope_dir
+        finally:
+            if previous is None:
+                os.environ.pop('GRDM_WORKSPACE_DIR', None)
+            else:
+                os.environ['GRDM_WORKSPACE_DIR'] = previous
+            size = get_size(scope_dir)
+            shutil.rmtree(scope_dir, ignore_errors=True)
+            if size > 0:
+                print(f'  Workspace: removed {size / _MB:.1f} MB')
+
+    def usage(self):
+        return get_size(self.path)
+
+    def cleanup(self):
+        if self in _active_workspaces:
+            _active_workspaces.remove(self)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _find_workspace(path):
+    """path を含む作業ディレクトリ(マーカーファイルを持つディレクトリ)を返す"""
+    current = os.path.abspath(path)
+    while True:
+        if os.path.exists(os.path.join(current, MARKER_NAME)):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def mkdtemp(prefix=None):
+    """
+    作業ディレクトリを作成する。
+
+    run_tests.py から実行された場合は、実行後に削除される GRDM_WORKSPACE_DIR の中に作成する。
+    それ以外の場合は、結果の保存先として使われることがあるため自動では削除しない。
+    """
+    parent = os.environ.get('GRDM_WORKSPACE_DIR')
+    if parent and os.path.isdir(parent):
+        return tempfile.mkdtemp(prefix=prefix, dir=parent)
+    workspace = Workspace(label=(prefix or 'kernel').rstrip('-_'), keep=True)
+    # 手動で実行したNotebookの作業ディレクトリはプロセス終了時に削除しない
+    _active_workspaces.remove(workspace)
+    return workspace.path
+
+
+def ensure_space(nbytes, path):
+    """
+    path に nbytes を書き込む前に、作業ディレクトリの容量制限とファイルシステムの空き容量を確認する。
+
+    :raises WorkspaceQuotaError: 書き込むと容量制限または空き容量を超える場合
+    """
+    workspace_path = _find_workspace(path)
+    marker = _read_marker(workspace_path) if workspace_path is not None else None
+    quota_bytes = marker.get('quota_bytes') if marker is not None else None
+    if quota_bytes is not None:
+        used = get_size(workspace_path)
+        if used + nbytes > quota_bytes:
+            raise WorkspaceQuotaError(
+                f'Workspace quota exceeded: {used / _MB:.1f} MB used + {nbytes / _MB:.1f} MB requested '
+                f'> {quota_bytes / _MB:.1f} MB ({workspace_path})'
+            )
+    free = shutil.disk_usage(path).free
+    if nbytes > free:
+        raise WorkspaceQuotaError(
+            f'Not enough disk space: {nbytes / _MB:.1f} MB requested, {free / _MB:.1f} MB free ({path})'
+        )
+
+
+def find_leftovers(root=None):
+    """所有するプロセスが終了しているのに残っている作業ディレクトリ(保持するものを除く)の (パス, サイズ, マーカー) のリストを返す"""
+    root = root or default_root()
+    if not os.path.isdir(root):
+        return []
+    hostname = socket.gethostname()
+    leftovers = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        marker = _read_marker(entry.path)
+        if marker is not None and marker.get('keep'):
+            continue
+        if marker is not None and marker.get('host') == hostname and _is_alive(marker.get('pid', -1)):
+            continue
+        leftovers.append((entry.path, get_size(entry.path), marker))
+    return leftovers
+
+
+def report_leftovers(root=None, remove=False):
+    """前回までの実行で残った作業ディレクトリを表示し、remove=True の場合は削除する"""
+    leftovers = find_leftovers(root)
+    if len(leftovers) == 0:
+        return leftovers
+    total = sum(size for _, size, _ in leftovers)
+    print(f'Leftover workspaces from previous runs: {len(leftovers)} ({total / _MB:.1f} MB)')
+    for path, size, marker in leftovers:
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(marker['created'])) \
+            if marker is not None and 'created' in marker else 'unknown'
+        print(f'  {path}: {size / _MB:.1f} MB (created {created})')
+        if remove:
+            shutil.rmtree(path, ignore_errors=True)
+    if remove:
+        print(f'  Removed {total / _MB:.1f} MB')
+    return leftovers
+
+
+def cleanup_all():
+    for workspace in list(_active_workspaces):
+        try:
+            workspace.cleanup()
+        except Exception:
+            traceback.print_exc()
+
+
+def install_signal_handlers(signals=(signal.SIGTERM, signal.SIGHUP)):
+    """シグナルを受けたときに作業ディレクトリを削除してから、既定の動作(終了)を行う"""
+    def _handler(signum, frame):
+        print(f'\nReceived signal {signum}; removing workspaces')
+        cleanup_all()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+    for signum in signals:
+        signal.signal(signum, _handler)